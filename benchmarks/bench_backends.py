@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_snapshot import memory_status
+from benchmarks.synthetic import write_bookings_csv
+
+QUERIES = [
+    {'group_by': 'hotel,booking_month', 'metric': 'sum:revenue', 'filter_by': 'is_canceled:0'},
+    {'group_by': 'country', 'filter_by': 'is_canceled:0', 'sort': '-count', 'limit': 5},
+    {'group_by': 'booking_year,hotel', 'metric': 'mean:length_of_stay,mean:adr'},
+    {'group_by': 'meal', 'filter_by': 'hotel:Resort Hotel,is_canceled:0'},
+    {'metric': 'count,sum:is_canceled,mean:adr'},
+]
+
+
+def measure(backend: str, csv_path: str, db_path: str) -> dict:
+    from dataset.aggregate import parse_query
+    from dataset.reports import REPORTS
+
+    start = time.perf_counter()
+    if backend == 'pandas':
+        from dataset.cache import DatasetCache
+        from dataset.enrich import load_bookings
+
+        source = DatasetCache(csv_path, loader=lambda path, version: load_bookings(path))
+    else:
+        from sqlalchemy import create_engine
+
+        from db.analytics import FactsSource
+
+        source = FactsSource(create_engine(f'sqlite:///{db_path}'), check_interval=60)
+    snapshot = source.get()
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for report in REPORTS.values():
+        report(snapshot.aggregate)
+    reports_time = time.perf_counter() - start
+
+    latencies = []
+    for query in QUERIES:
+        start = time.perf_counter()
+        snapshot.aggregate(parse_query(**query))
+        latencies.append(time.perf_counter() - start)
+    return {'load_s': round(load_time, 3), 'reports_s': round(reports_time, 3),
+            'query_ms': round(statistics.median(latencies) * 1000, 1), **memory_status()}
+
+
+def run(backend: str, csv_path: str, db_path: str) -> dict:
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_backends', '--measure', backend, csv_path,
+                             db_path], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare memory and latency of the pandas and SQL analytics backends')
+    parser.add_argument('--rows', type=int, nargs='+', default=[120_000, 1_000_000])
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'bookings_bench'))
+    parser.add_argument('--measure', nargs=3, metavar=('BACKEND', 'CSV', 'DB'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        sys.exit()
+
+    from sqlalchemy import create_engine
+
+    from db.ingest import ingest_csv
+
+    os.makedirs(args.workdir, exist_ok=True)
+    print(f"{'rows':>10} {'backend':>8} {'load, s':>8} {'reports, s':>10} {'query, ms':>9} {'peak RSS, MB':>12}")
+    for rows in args.rows:
+        csv_path = os.path.join(args.workdir, f'bookings_{rows}.csv')
+        db_path = os.path.join(args.workdir, f'bookings_{rows}.db')
+        if not os.path.exists(csv_path):
+            write_bookings_csv(csv_path, rows)
+        engine = create_engine(f'sqlite:///{db_path}')
+        ingest_csv(csv_path, engine=engine)
+        engine.dispose()
+
+        for backend in ('pandas', 'sql'):
+            result = run(backend, csv_path, db_path)
+            print(f"{rows:>10} {backend:>8} {result['load_s']:>8} {result['reports_s']:>10} {result['query_ms']:>9} "
+                  f"{result['VmHWM']:>12}")
@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import random
+import time
+
+from db import queries
+from db.database import SessionLocal, run_in_db
+
+QUERIES = {
+    'lookup': lambda db, rnd: queries.get_booking(db, rnd.randrange(100_000)),
+    'search': lambda db, rnd: queries.search_bookings(db, rnd.choice(['Anna', 'Baker', 'Frank']), None,
+                                                      rnd.randrange(1, 10), 50),
+}
+
+
+async def loop_lag(stop: asyncio.Event) -> float:
+    # How late a 5ms timer fires tells whether the event loop stayed free for other requests
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        worst = max(worst, time.perf_counter() - start - 0.005)
+    return worst
+
+
+async def client(mode: str, query, calls: int, seed: int):
+    rnd = random.Random(seed)
+    for _ in range(calls):
+        if mode == 'blocking':
+            with SessionLocal() as db:
+                query(db, rnd)
+        else:
+            await run_in_db(query, rnd)
+
+
+async def drive(mode: str, query, clients: int, calls: int) -> tuple[float, float]:
+    stop = asyncio.Event()
+    lag = asyncio.create_task(loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(client(mode, query, calls, seed) for seed in range(clients)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return clients * calls / elapsed, await lag
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Throughput of ORM queries under concurrent clients (uses DB_URI)')
+    parser.add_argument('--query', choices=QUERIES, default='search')
+    parser.add_argument('--clients', type=int, nargs='+', default=[50, 100, 200])
+    parser.add_argument('--calls', type=int, default=20, help='queries per client')
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'mode':>9} {'queries/s':>10} {'max loop lag, ms':>17}")
+    for clients in args.clients:
+        for mode in ('blocking', 'executor'):
+            throughput, lag = asyncio.run(drive(mode, QUERIES[args.query], clients, args.calls))
+            print(f'{clients:>8} {mode:>9} {throughput:>10.0f} {lag * 1000:>17.1f}')
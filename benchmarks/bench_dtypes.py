@@ -0,0 +1,52 @@
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.bench_backends import QUERIES
+from benchmarks.bench_enrich import best_of
+from benchmarks.synthetic import write_bookings_csv
+from dataset.aggregate import aggregate, parse_query
+from dataset.enrich import enrich_bookings, load_bookings
+from dataset.reports import REPORTS
+
+
+def load_untyped(path: str) -> pd.DataFrame:
+    # The frame as it was loaded before: every column, strings as Python objects, integers in 64 bits
+    return enrich_bookings(pd.read_csv(path))
+
+
+def run_groupbys(df: pd.DataFrame):
+    for report in REPORTS.values():
+        report(lambda query: aggregate(df, query))
+    for query in QUERIES:
+        aggregate(df, parse_query(**query))
+
+
+def measure(load, path: str, repeat: int) -> dict:
+    start = time.perf_counter()
+    df = load(path)
+    load_time = time.perf_counter() - start
+    return {'load_s': load_time, 'memory_mb': df.memory_usage(deep=True).sum() / 2 ** 20,
+            'groupby_s': best_of(run_groupbys, df, repeat)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Memory and groupby time of the object and the compact frame')
+    parser.add_argument('--rows', type=int, nargs='+', default=[120_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'bookings_bench'))
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    print(f"{'rows':>10} {'frame':>8} {'load, s':>8} {'memory, MB':>10} {'groupbys, s':>11}")
+    for rows in args.rows:
+        csv_path = os.path.join(args.workdir, f'bookings_{rows}.csv')
+        if not os.path.exists(csv_path):
+            write_bookings_csv(csv_path, rows)
+        for name, load in (('objects', load_untyped), ('compact', load_bookings)):
+            result = measure(load, csv_path, args.repeat)
+            print(f"{rows:>10} {name:>8} {result['load_s']:>8.2f} {result['memory_mb']:>10.0f} "
+                  f"{result['groupby_s']:>11.3f}")
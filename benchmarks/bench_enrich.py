@@ -0,0 +1,45 @@
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_bookings
+from dataset.enrich import enrich_bookings
+
+
+def string_parse_enrich(df: pd.DataFrame) -> pd.DataFrame:
+    # The per-request path the endpoints used before the enrichment stage
+    df = df.copy()
+    df['arrive_date'] = pd.to_datetime(df['arrival_date_year'].astype(str) + '-' + df['arrival_date_month'] + '-' + df[
+        'arrival_date_day_of_month'].astype(str))
+    booking_date = df['arrive_date'] - pd.to_timedelta(df['lead_time'], unit='D')
+    df['booking_date_month'] = booking_date.dt.month_name()
+    df['booking_date_year'] = booking_date.dt.year
+    df['length_of_stay'] = df['stays_in_weekend_nights'] + df['stays_in_week_nights']
+    df['revenue'] = df['length_of_stay'] * df['adr']
+    df['total_guest'] = df['adults'] + df['children'] + df['babies']
+    df['arrival_day_name'] = df['arrive_date'].dt.day_name()
+    return df
+
+
+def best_of(func, df: pd.DataFrame, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare string-parse and vectorized date enrichment')
+    parser.add_argument('--rows', type=int, nargs='+', default=[120_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'string parse, s':>16} {'vectorized, s':>14} {'speedup':>8}")
+    for rows in args.rows:
+        df = generate_bookings(rows)
+        old = best_of(string_parse_enrich, df, args.repeat)
+        new = best_of(enrich_bookings, df, args.repeat)
+        print(f'{rows:>10} {old:>16.4f} {new:>14.4f} {old / new:>7.1f}x')
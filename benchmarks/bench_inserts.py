@@ -0,0 +1,209 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from base64 import b64encode
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from benchmarks.bench_routes import CREDENTIALS, RESULTS_DIR, commit, free_port, start_server
+from benchmarks.bench_startup import wait_for
+from benchmarks.synthetic import generate_bookings, write_bookings_csv
+
+# Sustained insert streams through POST /bookings while the maintained aggregates are read. For every batch size,
+# writers post batches of synthetic bookings back to back for a fixed time and a reader keeps asking for the
+# top countries, the cancellation counts per hotel and the stats report, which have to take in each new batch.
+# Reported: rows and requests per second of the writers, insert and read latency percentiles, and the time until
+# the total count includes every inserted row. Each run starts from a copy of the freshly ingested database.
+# Results are written as JSON named after the commit, two runs are compared with --diff.
+
+READS = ['/bookings/aggregate?' + urlencode(query) for query in (
+    {'group_by': 'country', 'sort': '-count', 'limit': 10},
+    {'group_by': 'hotel', 'metric': 'count,sum:is_canceled'},
+    {'group_by': 'hotel,booking_month,meal', 'metric': 'count,sum:revenue,mean:adr'},
+)] + ['/bookings/stats']
+TOTAL = '/bookings/aggregate?metric=count'
+
+
+def auth_headers() -> dict:
+    return {'Authorization': 'Basic ' + b64encode(':'.join(CREDENTIALS).encode()).decode()}
+
+
+def payloads(batch: int, count: int, seed: int) -> list[bytes]:
+    # Bodies of the field names of the API, missing values as null
+    df = generate_bookings(batch * count, seed=seed).rename(columns={'phone-number': 'phone_number'})
+    rows = json.loads(df.to_json(orient='records'))
+    bodies = [rows[start] if batch == 1 else rows[start:start + batch] for start in range(0, len(rows), batch)]
+    return [json.dumps(body).encode() for body in bodies]
+
+
+def percentiles(latencies: list[float]) -> dict:
+    if not latencies:
+        return {'p50_ms': 0.0, 'p99_ms': 0.0}
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {'p50_ms': round(cuts[49] * 1000, 2), 'p99_ms': round(cuts[98] * 1000, 2)}
+
+
+def writer(port: int, bodies: list[bytes], deadline: float, results: list):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    headers = {**auth_headers(), 'Content-Type': 'application/json'}
+    latencies, errors, sent = [], 0, 0
+    for body in bodies:
+        if time.perf_counter() >= deadline:
+            break
+        start = time.perf_counter()
+        connection.request('POST', '/bookings', body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status == 201:
+            sent += 1
+        else:
+            errors += 1
+    connection.close()
+    results.append((latencies, errors, sent))
+
+
+def reader(port: int, stop: threading.Event, latencies: list):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        connection.request('GET', READS[i % len(READS)], headers=auth_headers())
+        connection.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    connection.close()
+
+
+def total(port: int) -> int:
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    connection.request('GET', TOTAL, headers=auth_headers())
+    count = json.loads(connection.getresponse().read())[0]['count']
+    connection.close()
+    return count
+
+
+def stream(port: int, batch: int, args) -> dict:
+    # Enough bodies that no writer runs out before the time is up at a generous rate
+    per_writer = max(int(args.seconds * 2000 / batch), 10)
+    bodies = [payloads(batch, per_writer, seed=1_000_000 * (n + 1) + batch) for n in range(args.concurrency)]
+    before = total(port)
+
+    results, read_latencies, stop = [], [], threading.Event()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=writer, args=(port, writer_bodies, start + args.seconds, results))
+               for writer_bodies in bodies]
+    read_thread = threading.Thread(target=reader, args=(port, stop, read_latencies))
+    for thread in [*threads, read_thread]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    read_thread.join()
+
+    inserted = sum(sent for _, _, sent in results) * batch
+    # Until the maintained aggregates count every inserted row
+    visible_start = time.perf_counter()
+    while total(port) < before + inserted and time.perf_counter() - visible_start < 60:
+        time.sleep(0.01)
+    latencies = [latency for writer_latencies, _, _ in results for latency in writer_latencies]
+    return {'requests': len(latencies), 'rows': inserted, 'errors': sum(errors for _, errors, _ in results),
+            'rows_per_second': round(inserted / elapsed, 1), 'requests_per_second': round(len(latencies) / elapsed, 1),
+            **percentiles(latencies), 'reads': len(read_latencies),
+            **{f'read_{key}': value for key, value in percentiles(read_latencies).items()},
+            'visible_s': round(time.perf_counter() - visible_start, 3)}
+
+
+def run_dataset(rows: int, args) -> dict:
+    from sqlalchemy import create_engine
+
+    from dataset.cache import file_digest
+    from dataset.enrich import load_bookings, load_pii
+    from dataset.snapshot import write_snapshot
+    from db.ingest import ingest_csv
+
+    csv_path = os.path.join(args.workdir, f'bookings_{rows}.csv')
+    db_path = os.path.join(args.workdir, f'bookings_{rows}.db')
+    snapshot_path = os.path.join(args.workdir, f'bookings_{rows}.snapshot')
+    if not os.path.exists(csv_path):
+        write_bookings_csv(csv_path, rows)
+    engine = create_engine(f'sqlite:///{db_path}')
+    ingest_csv(csv_path, engine=engine)
+    engine.dispose()
+    if args.backend == 'pandas' and not os.path.exists(snapshot_path):
+        write_snapshot(load_bookings(csv_path), snapshot_path, file_digest(csv_path), lazy=load_pii(csv_path))
+
+    result = {}
+    for batch in args.batch:
+        # The inserts of a run stay in its copy, every run starts from the rows of the file
+        run_db = os.path.join(args.workdir, f'inserts_{rows}.db')
+        shutil.copyfile(db_path, run_db)
+        port = free_port()
+        server = start_server(csv_path, run_db, snapshot_path, args.backend, port)
+        try:
+            wait_for(port, '/health/ready', server, time.perf_counter(), 600)
+            stats = result[str(batch)] = stream(port, batch, args)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{rows:>10} {batch:>6} {stats['rows_per_second']:>10} {stats['requests_per_second']:>8} "
+              f"{stats['p50_ms']:>8} {stats['p99_ms']:>8} {stats['read_p50_ms']:>8} {stats['read_p99_ms']:>8} "
+              f"{stats['visible_s']:>8} {stats['errors']:>6}", flush=True)
+    return result
+
+
+def diff(base: dict, new: dict):
+    print(f"{base['commit']} -> {new['commit']}")
+    keys = ('rows_per_second', 'p50_ms', 'p99_ms', 'read_p50_ms', 'read_p99_ms')
+    print(f"{'rows':>10} {'batch':>6} " + ' '.join(f'{key:>15}' for key in keys))
+    for rows, dataset in new['datasets'].items():
+        for batch, stats in dataset.items():
+            before = base['datasets'].get(rows, {}).get(batch)
+            if before is None:
+                continue
+            changes = [f"{(stats[key] - before[key]) / before[key] * 100 if before[key] else 0.0:>+14.1f}%"
+                       for key in keys]
+            print(f"{rows:>10} {batch:>6} {' '.join(changes)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Throughput of sustained POST /bookings streams and the latency '
+                                                 'of the aggregates read meanwhile')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 10, 100, 1000], help='bookings per request')
+    parser.add_argument('--seconds', type=float, default=10, help='length of the stream per batch size')
+    parser.add_argument('--concurrency', type=int, default=4, help='writers posting at the same time')
+    parser.add_argument('--backend', choices=('pandas', 'sql'), default='pandas')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'bookings_bench'))
+    parser.add_argument('--output', help=f'results file, by default in {RESULTS_DIR} named after the commit')
+    parser.add_argument('--diff', nargs=2, metavar=('BASE', 'NEW'), help='compare two results files and exit')
+    args = parser.parse_args()
+
+    if args.diff:
+        with open(args.diff[0]) as base, open(args.diff[1]) as new:
+            diff(json.load(base), json.load(new))
+        sys.exit()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = {'commit': commit(), 'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+               'python': platform.python_version(), 'cpus': os.cpu_count(), 'backend': args.backend,
+               'seconds': args.seconds, 'concurrency': args.concurrency, 'datasets': {}}
+    print(f"{'rows':>10} {'batch':>6} {'rows/s':>10} {'req/s':>8} {'p50, ms':>8} {'p99, ms':>8} {'read p50':>8} "
+          f"{'read p99':>8} {'visible':>8} {'errors':>6}")
+    for rows in args.rows:
+        results['datasets'][str(rows)] = run_dataset(rows, args)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}-inserts-{args.backend}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f'Results written to {output}')
@@ -0,0 +1,238 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from benchmarks.bench_backends import QUERIES
+from benchmarks.synthetic import write_bookings_csv
+from dataset.reports import REPORTS
+
+# Load test of every route of the app, endpoints.endpoints.router and the health probes. The app runs under uvicorn
+# in its own process against a synthetic dataset, clients on keep-alive connections hit each route in turn.
+# Results are written as JSON named after the commit, so two runs can be compared with --diff.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+CREDENTIALS = ('bench', 'bench')
+
+# Requests cycled through for routes with parameters, a route missing here with required ones stops the run
+ROUTE_REQUESTS = {
+    '/bookings': ['/bookings', '/bookings?limit=500', '/bookings?cursor=50000&limit=100'],
+    '/bookings/search': ['/bookings/search?guest_name=Anna%20Baker', '/bookings/search?booking_date=2016-05-01',
+                         '/bookings/search?length_of_stay=3', '/bookings/search?guest_name=Frank&length_of_stay=4'],
+    '/bookings/aggregate': ['/bookings/aggregate?' + urlencode(query) for query in QUERIES],
+    '/bookings/nationality': ['/bookings/nationality?country=GBR', '/bookings/nationality?country=PRT&limit=100',
+                              '/bookings/nationality?country=DEU&cursor=1000'],
+    '/bookings/reports': ['/bookings/reports?name=stats,analysis,total_revenue',
+                          '/bookings/reports?name=' + ','.join(REPORTS)],
+    '/bookings/{booking_id}': [f'/bookings/{booking_id}' for booking_id in (17, 4242, 31337, 77777, 99999)],
+}
+
+
+def route_requests(port: int) -> dict[str, list[str]]:
+    # The routes are taken from the OpenAPI schema of the running app, new ones are driven without changes here
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('GET', '/openapi.json')
+    schema = json.loads(connection.getresponse().read())
+
+    routes = {}
+    for path, operations in schema['paths'].items():
+        required = [param['name'] for param in operations.get('get', {}).get('parameters', []) if param['required']]
+        if path in ROUTE_REQUESTS:
+            routes[path] = ROUTE_REQUESTS[path]
+        elif required:
+            raise SystemExit(f'No sample requests for {path}, add them to ROUTE_REQUESTS')
+        elif 'get' in operations:
+            routes[path] = [path]
+    return routes
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(csv_path: str, db_path: str, snapshot_path: str, backend: str, port: int) -> subprocess.Popen:
+    env = {**os.environ, 'DB_URI': f'sqlite:///{db_path}', 'DATASET_PATH': csv_path, 'DATASET_SNAPSHOT': snapshot_path,
+           'ANALYTICS_BACKEND': backend, 'AUTH_LOGIN': CREDENTIALS[0], 'AUTH_PASSWORD': CREDENTIALS[1],
+           'SERVER_HOST': '127.0.0.1', 'SERVER_PORT': str(port)}
+    env.setdefault('API_DESCRIPTION', 'benchmark')
+    env.setdefault('API_VERSION', 'benchmark')
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+                               '--log-level', 'warning'], cwd=ROOT, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'The server exited with {server.returncode}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/health/live')
+            if connection.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit('The server did not start in 60 s')
+
+
+def peak_rss(pid: int) -> int:
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) // 1024
+    return 0
+
+
+def reset_peak_rss(pid: int):
+    # Writing 5 to clear_refs resets VmHWM to the current RSS, so every route gets its own peak
+    try:
+        with open(f'/proc/{pid}/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def client(port: int, urls: list[str], count: int, offset: int, headers: dict) -> tuple[list[float], int]:
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    latencies, errors = [], 0
+    for i in range(count):
+        start = time.perf_counter()
+        connection.request('GET', urls[(offset + i) % len(urls)], headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        # Empty searches and unknown ids answer 404 by design
+        errors += response.status >= 400 and response.status != 404
+    connection.close()
+    return latencies, errors
+
+
+def drive(port: int, urls: list[str], concurrency: int, requests: int, headers: dict) -> dict:
+    per_client = max(requests // concurrency, 1)
+    with ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda n: client(port, urls, per_client, n, headers), range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {'requests': len(latencies), 'errors': sum(errors for _, errors in results),
+            'p50_ms': round(percentiles[49] * 1000, 2), 'p95_ms': round(percentiles[94] * 1000, 2),
+            'p99_ms': round(percentiles[98] * 1000, 2), 'rps': round(len(latencies) / elapsed, 1)}
+
+
+def run_dataset(rows: int, args) -> dict:
+    from sqlalchemy import create_engine
+
+    from dataset.cache import file_digest
+    from dataset.enrich import load_bookings, load_pii
+    from dataset.snapshot import write_snapshot
+    from db.ingest import ingest_csv
+
+    csv_path = os.path.join(args.workdir, f'bookings_{rows}.csv')
+    db_path = os.path.join(args.workdir, f'bookings_{rows}.db')
+    snapshot_path = os.path.join(args.workdir, f'bookings_{rows}.snapshot')
+    if not os.path.exists(csv_path):
+        write_bookings_csv(csv_path, rows)
+    engine = create_engine(f'sqlite:///{db_path}')
+    ingest_csv(csv_path, engine=engine)
+    engine.dispose()
+    if args.backend == 'pandas' and not os.path.exists(snapshot_path):
+        write_snapshot(load_bookings(csv_path), snapshot_path, file_digest(csv_path), lazy=load_pii(csv_path))
+
+    headers = {'Authorization': 'Basic ' + b64encode(':'.join(CREDENTIALS).encode()).decode(),
+               'Accept': args.accept, 'Accept-Encoding': args.accept_encoding}
+    port = free_port()
+    server = start_server(csv_path, db_path, snapshot_path, args.backend, port)
+    try:
+        routes = route_requests(port)
+        # The first request of a route loads the dataset or computes the reports, it is reported on its own
+        cold = {}
+        for path, urls in routes.items():
+            cold[path] = round(client(port, urls, 1, 0, headers)[0][0] * 1000, 2)
+        result = {'rss_after_warmup_mb': peak_rss(server.pid), 'routes': {}}
+
+        for path, urls in routes.items():
+            reset_peak_rss(server.pid)
+            stats = drive(port, urls, args.concurrency, args.requests, headers)
+            result['routes'][path] = {**stats, 'cold_ms': cold[path], 'peak_rss_mb': peak_rss(server.pid)}
+            print(f"{rows:>10} {path:<45} {stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} "
+                  f"{stats['rps']:>8} {result['routes'][path]['peak_rss_mb']:>8} {stats['errors']:>6}", flush=True)
+        result['peak_rss_mb'] = max(route['peak_rss_mb'] for route in result['routes'].values())
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT, check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def diff(base: dict, new: dict):
+    # Relative change of the new run against the base, per dataset size and route
+    print(f"{base['commit']} -> {new['commit']}")
+    print(f"{'rows':>10} {'route':<45} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'RSS':>8}")
+    for rows, dataset in new['datasets'].items():
+        for path, route in dataset['routes'].items():
+            before = base['datasets'].get(rows, {}).get('routes', {}).get(path)
+            if before is None:
+                continue
+            changes = [f"{(route[key] - before[key]) / before[key] * 100 if before[key] else 0.0:>+7.1f}%"
+                       for key in ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'peak_rss_mb')]
+            print(f"{rows:>10} {path:<45} {' '.join(changes)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Latency percentiles, throughput and peak RSS of every route')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--backend', choices=('pandas', 'sql'), default='pandas')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=400, help='requests per route')
+    parser.add_argument('--accept', default='application/json')
+    parser.add_argument('--accept-encoding', default='identity')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'bookings_bench'))
+    parser.add_argument('--output', help=f'results file, by default in {RESULTS_DIR} named after the commit')
+    parser.add_argument('--compare', metavar='BASE', help='results file to compare this run with')
+    parser.add_argument('--diff', nargs=2, metavar=('BASE', 'NEW'), help='compare two results files and exit')
+    args = parser.parse_args()
+
+    if args.diff:
+        with open(args.diff[0]) as base, open(args.diff[1]) as new:
+            diff(json.load(base), json.load(new))
+        sys.exit()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = {'commit': commit(), 'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+               'python': platform.python_version(), 'cpus': os.cpu_count(), 'backend': args.backend,
+               'concurrency': args.concurrency, 'accept': args.accept, 'accept_encoding': args.accept_encoding,
+               'datasets': {}}
+    print(f"{'rows':>10} {'route':<45} {'p50, ms':>8} {'p95, ms':>8} {'p99, ms':>8} {'req/s':>8} {'RSS, MB':>8} "
+          f"{'errors':>6}")
+    for rows in args.rows:
+        results['datasets'][str(rows)] = run_dataset(rows, args)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}-{args.backend}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f'Results written to {output}')
+
+    if args.compare:
+        with open(args.compare) as base:
+            diff(json.load(base), results)
@@ -0,0 +1,82 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from benchmarks.synthetic import generate_bookings
+from db import queries
+from db.models import Bookings
+from db.search import create_search_indexes
+from dataset.enrich import enrich_bookings
+
+SEARCHES = [
+    {'guest_name': 'Anna'},
+    {'guest_name': 'Victoria Young'},
+    {'guest_name': 'Zelda'},
+    {'booking_date': '2016-03-14'},
+    {'length_of_stay': 12},
+    {'booking_date': '2016-03-14', 'length_of_stay': 3},
+    {'guest_name': 'Baker', 'length_of_stay': 7},
+    {'guest_name': 'Victoria Young', 'length_of_stay': 15},
+]
+
+
+def build_database(path: str, rows: int):
+    engine = create_engine(f'sqlite:///{path}')
+    df = enrich_bookings(generate_bookings(rows))
+    df = df.assign(id=df.index, guest_name=df['name'], daily_rate=df['adr'], booking_date=df['booking_date'].dt.date)
+    with engine.begin() as connection:
+        # Same columns as the model but without its indexes, the search index is added after the scan runs
+        connection.execute(text('CREATE TABLE bookings (id INTEGER PRIMARY KEY, booking_date DATE, '
+                                'length_of_stay INTEGER, guest_name VARCHAR, daily_rate FLOAT)'))
+        df[['id', 'booking_date', 'length_of_stay', 'guest_name', 'daily_rate']].to_sql(
+            'bookings', con=connection, if_exists='append', index=False, chunksize=100_000)
+    return engine
+
+
+def scan_statement(guest_name=None, booking_date=None, length_of_stay=None):
+    # The search as it was before the indexes: LIKE over bookings.guest_name
+    statement = select(Bookings)
+    if guest_name:
+        statement = statement.where(Bookings.guest_name.contains(guest_name))
+    if booking_date:
+        statement = statement.where(Bookings.booking_date == booking_date)
+    if length_of_stay:
+        statement = statement.where(Bookings.length_of_stay == length_of_stay)
+    return statement
+
+
+def timed(engine, build, search: dict, repeat: int) -> tuple[float, list[str]]:
+    timings = []
+    with Session(engine) as db:
+        params = {'guest_name': None, 'booking_date': None, 'length_of_stay': None, **search}
+        statement = build(**params).limit(50)
+        sql = str(statement.compile(engine, compile_kwargs={'literal_binds': True}))
+        plan = [row[-1] for row in db.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+        for _ in range(repeat):
+            start = time.perf_counter()
+            db.execute(statement).all()
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings), plan
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query plans and latency of /bookings/search with and without indexes')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = build_database(os.path.join(workdir, 'search.db'), args.rows)
+        results = [timed(engine, scan_statement, search, args.repeat) for search in SEARCHES]
+
+        with engine.begin() as connection:
+            create_search_indexes(connection)
+        for search, (scan, scan_plan) in zip(SEARCHES, results):
+            indexed, plan = timed(engine, queries.search_statement, search, args.repeat)
+            print(f'{search}\n  scan    {scan * 1000:9.2f} ms  {" | ".join(scan_plan)}'
+                  f'\n  indexed {indexed * 1000:9.2f} ms  {" | ".join(plan)}')
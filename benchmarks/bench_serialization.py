@@ -0,0 +1,84 @@
+import argparse
+import os
+import tempfile
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from benchmarks.synthetic import generate_bookings, write_bookings_csv
+from dataset.enrich import enrich_bookings
+from db import queries
+from db.ingest import ingest_csv
+from endpoints.endpoints import all_bookings_rows
+from endpoints.responses import frame_response, orjson, rows_response
+from endpoints.shemas import AllBookings, GetBookings
+
+
+def fastapi_body(model: type, content: list) -> bytes:
+    # What FastAPI does with a returned list of models: validate against response_model, dump, json.dumps
+    adapter = TypeAdapter(List[model])
+    return JSONResponse(adapter.dump_python(adapter.validate_python(content), mode='json')).body
+
+
+def orm_models(engine, rows: int) -> bytes:
+    # The listing endpoints before: ORM entities, then a GetBookings per row
+    with Session(engine) as db:
+        result = db.scalars(queries.list_statement().limit(rows)).all()
+    return fastapi_body(GetBookings, [GetBookings(**r.__dict__) for r in result])
+
+
+def orm_rows(engine, rows: int) -> bytes:
+    with Session(engine) as db:
+        result = queries.list_bookings(db, rows)
+    return rows_response(result).body
+
+
+def frame_models(df, rows: int) -> bytes:
+    # The nationality endpoint before: an AllBookings per row from itertuples
+    result = all_bookings_rows(df.head(rows))
+    return fastapi_body(AllBookings, [AllBookings(**row._asdict()) for row in result.itertuples(index=False)])
+
+
+def frame_columns(df, rows: int) -> bytes:
+    return frame_response(all_bookings_rows(df.head(rows))).body
+
+
+def best_of(func, source, rows: int, repeat: int) -> tuple[float, int]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func(source, rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(body)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare per-row Pydantic models and direct JSON encoding '
+                                                 'of large list responses')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    size = max(args.rows)
+    # Nationality pages never contain rows without a country
+    df = enrich_bookings(generate_bookings(size * 2)).dropna(subset=['country'])
+    with tempfile.TemporaryDirectory() as tmp:
+        csv = os.path.join(tmp, 'bookings.csv')
+        write_bookings_csv(csv, size)
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bookings.db')}")
+        ingest_csv(csv, engine=engine)
+
+        print(f"encoder: {'orjson' if orjson else 'json'}")
+        print(f"{'source':>8} {'rows':>8} {'models, ms':>11} {'direct, ms':>11} {'speedup':>8} {'bytes':>10}")
+        for rows in args.rows:
+            for source, old, new, data in [('orm', orm_models, orm_rows, engine),
+                                           ('frame', frame_models, frame_columns, df)]:
+                old_time, _ = best_of(old, data, rows, args.repeat)
+                new_time, length = best_of(new, data, rows, args.repeat)
+                print(f'{source:>8} {rows:>8} {old_time * 1000:>11.1f} {new_time * 1000:>11.1f} '
+                      f'{old_time / new_time:>7.1f}x {length:>10}')
+        engine.dispose()
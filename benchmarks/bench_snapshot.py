@@ -0,0 +1,75 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import write_bookings_csv
+
+
+def memory_status() -> dict:
+    # RssAnon is private to the process, RssFile are page cache pages other workers can share
+    status = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmHWM', 'RssAnon', 'RssFile'):
+                status[key] = int(value.split()[0]) // 1024
+    return status
+
+
+def measure(source: str, path: str) -> dict:
+    from dataset.aggregate import aggregate
+    from dataset.enrich import load_bookings
+    from dataset.reports import REPORTS
+    from dataset.snapshot import read_snapshot
+
+    start = time.perf_counter()
+    df = load_bookings(path) if source == 'csv' else read_snapshot(path)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for report in REPORTS.values():
+        report(lambda query: aggregate(df, query))
+    reports_time = time.perf_counter() - start
+    return {'load_s': round(load_time, 3), 'reports_s': round(reports_time, 3), **memory_status()}
+
+
+def run(source: str, path: str) -> dict:
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_snapshot', '--measure', source, path],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare CSV and memory-mapped snapshot load time and memory')
+    parser.add_argument('--rows', type=int, nargs='+', default=[120_000, 1_000_000, 10_000_000])
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'bookings_bench'))
+    parser.add_argument('--measure', nargs=2, metavar=('SOURCE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        sys.exit()
+
+    from dataset.cache import file_digest
+    from dataset.enrich import load_bookings, load_pii
+    from dataset.snapshot import write_snapshot
+
+    os.makedirs(args.workdir, exist_ok=True)
+    print(f"{'rows':>10} {'source':>8} {'load, s':>8} {'reports, s':>10} {'peak RSS, MB':>12} "
+          f"{'private, MB':>11} {'shared, MB':>10}")
+    for rows in args.rows:
+        csv_path = os.path.join(args.workdir, f'bookings_{rows}.csv')
+        snapshot_path = os.path.join(args.workdir, f'bookings_{rows}.snapshot')
+        if not os.path.exists(csv_path):
+            write_bookings_csv(csv_path, rows)
+        if not os.path.exists(snapshot_path):
+            write_snapshot(load_bookings(csv_path), snapshot_path, file_digest(csv_path), lazy=load_pii(csv_path))
+
+        for source, path in (('csv', csv_path), ('snapshot', snapshot_path)):
+            result = run(source, path)
+            print(f"{rows:>10} {source:>8} {result['load_s']:>8} {result['reports_s']:>10} {result['VmHWM']:>12} "
+                  f"{result['RssAnon']:>11} {result['RssFile']:>10}")
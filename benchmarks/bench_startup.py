@@ -0,0 +1,160 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from base64 import b64encode
+from datetime import datetime, timezone
+
+from benchmarks.bench_routes import CREDENTIALS, RESULTS_DIR, ROOT, commit, free_port
+from benchmarks.synthetic import write_bookings_csv
+
+# Cold start of the app: the import time of main (in total and by top-level package, from python -X importtime) and
+# the time from launching uvicorn to the first answer of the liveness probe, of an ORM lookup, of the readiness
+# probe (the data is loaded) and of a report. The database is ingested beforehand, as after a container restart.
+# Results are written as JSON named after the commit, two runs are compared with --diff.
+
+STAGES = ('live_s', 'lookup_s', 'ready_s', 'report_s')
+
+
+def server_env(csv_path: str, db_path: str, port: int) -> dict:
+    env = {**os.environ, 'DB_URI': f'sqlite:///{db_path}', 'DATASET_PATH': csv_path,
+           'DATASET_SNAPSHOT': csv_path + '.snapshot', 'AUTH_LOGIN': CREDENTIALS[0], 'AUTH_PASSWORD': CREDENTIALS[1],
+           'SERVER_HOST': '127.0.0.1', 'SERVER_PORT': str(port)}
+    env.setdefault('API_DESCRIPTION', 'benchmark')
+    env.setdefault('API_VERSION', 'benchmark')
+    return env
+
+
+def import_times(env: dict, top: int) -> dict:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    packages = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        # The own time of every module adds up per top-level package, wherever in the tree it was imported
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(own) / 1e6
+    slowest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return {'wall_s': round(wall, 3), 'import_s': round(sum(packages.values()), 3),
+            'packages': {name: round(seconds, 3) for name, seconds in slowest}}
+
+
+def request(port: int, path: str) -> int:
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    auth = 'Basic ' + b64encode(':'.join(CREDENTIALS).encode()).decode()
+    connection.request('GET', path, headers={'Authorization': auth})
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return response.status
+
+
+def wait_for(port: int, path: str, server: subprocess.Popen, start: float, timeout: float) -> float:
+    while time.perf_counter() - start < timeout:
+        if server.poll() is not None:
+            raise SystemExit(f'The server exited with {server.returncode}')
+        try:
+            if request(port, path) in (200, 404):
+                return round(time.perf_counter() - start, 3)
+        except OSError:
+            pass
+        time.sleep(0.01)
+    raise SystemExit(f'{path} did not answer in {timeout} s')
+
+
+def first_responses(env: dict, port: int, timeout: float) -> dict:
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+                               '--log-level', 'warning'], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    try:
+        return {'live_s': wait_for(port, '/health/live', server, start, timeout),
+                'lookup_s': wait_for(port, '/bookings/17', server, start, timeout),
+                'ready_s': wait_for(port, '/health/ready', server, start, timeout),
+                'report_s': wait_for(port, '/bookings/stats', server, start, timeout)}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run_dataset(rows: int, args) -> dict:
+    from sqlalchemy import create_engine
+
+    from db.ingest import ingest_csv
+
+    csv_path = os.path.join(args.workdir, f'bookings_{rows}.csv')
+    db_path = os.path.join(args.workdir, f'bookings_{rows}.db')
+    if not os.path.exists(csv_path):
+        write_bookings_csv(csv_path, rows)
+    engine = create_engine(f'sqlite:///{db_path}')
+    ingest_csv(csv_path, engine=engine)
+    engine.dispose()
+
+    runs = []
+    for _ in range(args.repeat):
+        port = free_port()
+        runs.append(first_responses(server_env(csv_path, db_path, port), port, args.timeout))
+    result = {stage: statistics.median(run[stage] for run in runs) for stage in STAGES}
+    print(f"{rows:>10} {result['live_s']:>8.2f} {result['lookup_s']:>9.2f} {result['ready_s']:>8.2f} "
+          f"{result['report_s']:>9.2f}")
+    return result
+
+
+def diff(base: dict, new: dict):
+    print(f"{base['commit']} -> {new['commit']}")
+    for key in ('wall_s', 'import_s'):
+        before, after = base['imports'][key], new['imports'][key]
+        print(f"{key:<12} {before:>8.3f} {after:>8.3f} {(after - before) / before * 100 if before else 0.0:>+7.1f}%")
+    for rows, dataset in new['datasets'].items():
+        before = base['datasets'].get(rows)
+        if before is None:
+            continue
+        changes = [f"{(dataset[stage] - before[stage]) / before[stage] * 100 if before[stage] else 0.0:>+7.1f}%"
+                   for stage in STAGES]
+        print(f"{rows:>10} {' '.join(changes)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import time of the app and time to its first responses')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10, help='slowest top-level packages to report')
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'bookings_bench'))
+    parser.add_argument('--output', help=f'results file, by default in {RESULTS_DIR} named after the commit')
+    parser.add_argument('--diff', nargs=2, metavar=('BASE', 'NEW'), help='compare two results files and exit')
+    args = parser.parse_args()
+
+    if args.diff:
+        with open(args.diff[0]) as base, open(args.diff[1]) as new:
+            diff(json.load(base), json.load(new))
+        sys.exit()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    env = server_env(os.path.join(args.workdir, 'import.csv'), os.path.join(args.workdir, 'import.db'), 0)
+    results = {'commit': commit(), 'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+               'python': platform.python_version(), 'cpus': os.cpu_count(), 'imports': import_times(env, args.top),
+               'datasets': {}}
+    print(f"import main: {results['imports']['wall_s']:.2f} s wall, {results['imports']['import_s']:.2f} s imports")
+    for package, seconds in results['imports']['packages'].items():
+        print(f'  {package:<20} {seconds:>6.3f} s')
+
+    print(f"{'rows':>10} {'live, s':>8} {'lookup, s':>9} {'ready, s':>8} {'report, s':>9}")
+    for rows in args.rows:
+        results['datasets'][str(rows)] = run_dataset(rows, args)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}-startup.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f'Results written to {output}')
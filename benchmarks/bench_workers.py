@@ -0,0 +1,84 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from benchmarks.bench_routes import client, drive, free_port, start_server
+from benchmarks.synthetic import write_bookings_csv
+
+# Uncached aggregations (every limit is a new query) keep the analytics busy while lookups by id measure how
+# responsive the API process stays, with the pandas work in the API process or in ANALYTICS_WORKERS processes.
+
+AGGREGATE = {'group_by': 'country,booking_month', 'metric': 'sum:revenue,mean:adr', 'filter': 'is_canceled:0'}
+LOOKUPS = [f'/bookings/{booking_id}' for booking_id in range(1, 1000, 37)]
+
+
+def measure(workers: int, csv_path: str, db_path: str, snapshot_path: str, seconds: float, clients: int) -> dict:
+    os.environ['ANALYTICS_WORKERS'] = str(workers)
+    port = free_port()
+    server = start_server(csv_path, db_path, snapshot_path, 'pandas', port)
+    try:
+        headers = {'Accept-Encoding': 'identity'}
+        # Waits for the dataset to be loaded, in the workers or here
+        client(port, ['/bookings/aggregate?group_by=hotel'], 1, 0, headers)
+
+        done = threading.Event()
+        analytics = [0]
+
+        def analytics_client(number: int):
+            limit = 1_000_000 * (number + 1)
+            while not done.is_set():
+                limit += 1
+                client(port, ['/bookings/aggregate?' + urlencode({**AGGREGATE, 'limit': limit})], 1, 0, headers)
+                analytics[0] += 1
+
+        threads = [threading.Thread(target=analytics_client, args=(n,)) for n in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        lookups = drive(port, LOOKUPS, 4, int(seconds * 100), headers)
+        done.set()
+        for thread in threads:
+            thread.join()
+        return {'lookup_p50_ms': lookups['p50_ms'], 'lookup_p99_ms': lookups['p99_ms'],
+                'aggregations_per_s': round(analytics[0] / (time.perf_counter() - start), 1)}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lookup latency and analytics throughput with and without workers')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, os.cpu_count()])
+    parser.add_argument('--clients', type=int, default=4, help='concurrent analytics clients')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'bookings_bench'))
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+
+    from dataset.cache import file_digest
+    from dataset.enrich import load_bookings, load_pii
+    from dataset.snapshot import write_snapshot
+    from db.ingest import ingest_csv
+
+    os.makedirs(args.workdir, exist_ok=True)
+    csv_path = os.path.join(args.workdir, f'bookings_{args.rows}.csv')
+    db_path = os.path.join(args.workdir, f'bookings_{args.rows}.db')
+    snapshot_path = os.path.join(args.workdir, f'bookings_{args.rows}.snapshot')
+    if not os.path.exists(csv_path):
+        write_bookings_csv(csv_path, args.rows)
+    engine = create_engine(f'sqlite:///{db_path}')
+    ingest_csv(csv_path, engine=engine)
+    engine.dispose()
+    if not os.path.exists(snapshot_path):
+        write_snapshot(load_bookings(csv_path), snapshot_path, file_digest(csv_path), lazy=load_pii(csv_path))
+
+    print(f"{'workers':>8} {'lookup p50, ms':>14} {'lookup p99, ms':>14} {'aggregations/s':>14}")
+    for workers in args.workers:
+        result = measure(workers, csv_path, db_path, snapshot_path, args.seconds, args.clients)
+        print(f"{workers:>8} {result['lookup_p50_ms']:>14} {result['lookup_p99_ms']:>14} "
+              f"{result['aggregations_per_s']:>14}")
@@ -0,0 +1,107 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from dataset.enrich import MONTH_NAMES
+
+# Category shares roughly follow the public hotel booking dataset
+HOTELS = {'City Hotel': 0.66, 'Resort Hotel': 0.34}
+MEALS = {'BB': 0.77, 'HB': 0.12, 'SC': 0.09, 'Undefined': 0.01, 'FB': 0.01}
+MARKET_SEGMENTS = {'Online TA': 0.47, 'Offline TA/TO': 0.2, 'Groups': 0.17, 'Direct': 0.11, 'Corporate': 0.04,
+                   'Complementary': 0.01}
+DISTRIBUTION_CHANNELS = {'TA/TO': 0.82, 'Direct': 0.12, 'Corporate': 0.055, 'GDS': 0.005}
+DEPOSIT_TYPES = {'No Deposit': 0.876, 'Non Refund': 0.122, 'Refundable': 0.002}
+CUSTOMER_TYPES = {'Transient': 0.75, 'Transient-Party': 0.21, 'Contract': 0.035, 'Group': 0.005}
+ROOM_TYPES = {'A': 0.72, 'D': 0.16, 'E': 0.055, 'F': 0.025, 'G': 0.017, 'B': 0.01, 'C': 0.008, 'H': 0.005}
+TOP_COUNTRIES = {'PRT': 0.41, 'GBR': 0.10, 'FRA': 0.087, 'ESP': 0.072, 'DEU': 0.061, 'ITA': 0.032, 'IRL': 0.028,
+                 'BEL': 0.02, 'BRA': 0.019, 'NLD': 0.018, 'USA': 0.018, 'CHE': 0.015, 'CN': 0.011, 'AUT': 0.011}
+FIRST_NAMES = ['Anna', 'Brian', 'Carla', 'David', 'Elena', 'Frank', 'Grace', 'Henry', 'Irene', 'Jason', 'Karen',
+               'Laura', 'Michael', 'Nicole', 'Oscar', 'Paula', 'Robert', 'Sarah', 'Thomas', 'Victoria']
+LAST_NAMES = ['Baker', 'Smith', 'Jones', 'Moore', 'Taylor', 'Brown', 'Clark', 'Davis', 'Evans', 'Garcia', 'Harris',
+              'Johnson', 'King', 'Lewis', 'Martin', 'Nelson', 'Parker', 'Robinson', 'Walker', 'Young']
+
+
+def _choice(rng: np.random.Generator, weights: dict, size: int) -> np.ndarray:
+    p = np.array(list(weights.values()), dtype=float)
+    return rng.choice(np.array(list(weights)), size=size, p=p / p.sum())
+
+
+def _countries(rng: np.random.Generator, size: int) -> np.ndarray:
+    # A long tail of ~160 rare three-letter codes next to the few dominant ones, plus missing values
+    tail = [a + b + c for a, b, c in zip('ABCDEFGHIJKLMNOPQRSTUVWXYZ' * 7, 'AEIOUY' * 30, 'RSTLNM' * 30)][:160]
+    weights = dict(TOP_COUNTRIES)
+    rest = 1 - sum(weights.values())
+    weights.update({code: rest / len(tail) for code in tail})
+    countries = _choice(rng, weights, size).astype(object)
+    countries[rng.random(size) < 0.004] = None
+    return countries
+
+
+def generate_bookings(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    year = rng.choice([2015, 2016, 2017], size=rows, p=[0.18, 0.48, 0.34])
+    month = rng.integers(1, 13, size=rows)
+    day = rng.integers(1, 29, size=rows)
+    arrive = pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': day}))
+    is_canceled = (rng.random(rows) < 0.37).astype(int)
+    reserved = _choice(rng, ROOM_TYPES, rows)
+    first = rng.integers(0, len(FIRST_NAMES), size=rows)
+    last = rng.integers(0, len(LAST_NAMES), size=rows)
+    ids = np.arange(rows)
+
+    return pd.DataFrame({
+        'hotel': _choice(rng, HOTELS, rows),
+        'is_canceled': is_canceled,
+        'lead_time': np.minimum(rng.exponential(104, size=rows).astype(int), 737),
+        'arrival_date_year': year,
+        'arrival_date_month': np.array(MONTH_NAMES)[month - 1],
+        'arrival_date_week_number': arrive.dt.isocalendar().week.to_numpy().astype(int),
+        'arrival_date_day_of_month': day,
+        'stays_in_weekend_nights': rng.poisson(0.93, size=rows),
+        'stays_in_week_nights': rng.poisson(2.5, size=rows),
+        'adults': rng.choice([1, 2, 3], size=rows, p=[0.19, 0.75, 0.06]),
+        'children': np.where(rng.random(rows) < 0.0001, np.nan, rng.choice([0, 1, 2], size=rows, p=[0.93, 0.04, 0.03])),
+        'babies': rng.choice([0, 1], size=rows, p=[0.992, 0.008]),
+        'meal': _choice(rng, MEALS, rows),
+        'country': _countries(rng, rows),
+        'market_segment': _choice(rng, MARKET_SEGMENTS, rows),
+        'distribution_channel': _choice(rng, DISTRIBUTION_CHANNELS, rows),
+        'is_repeated_guest': (rng.random(rows) < 0.03).astype(int),
+        'previous_cancellations': rng.choice([0, 1, 2], size=rows, p=[0.945, 0.05, 0.005]),
+        'previous_bookings_not_canceled': rng.choice([0, 1, 2], size=rows, p=[0.97, 0.02, 0.01]),
+        'reserved_room_type': reserved,
+        'assigned_room_type': np.where(rng.random(rows) < 0.12, _choice(rng, ROOM_TYPES, rows), reserved),
+        'booking_changes': rng.choice([0, 1, 2], size=rows, p=[0.85, 0.11, 0.04]),
+        'deposit_type': _choice(rng, DEPOSIT_TYPES, rows),
+        'agent': np.where(rng.random(rows) < 0.14, np.nan, rng.integers(1, 536, size=rows).astype(float)),
+        'company': np.where(rng.random(rows) < 0.94, np.nan, rng.integers(6, 544, size=rows).astype(float)),
+        'days_in_waiting_list': np.where(rng.random(rows) < 0.97, 0, rng.integers(1, 392, size=rows)),
+        'customer_type': _choice(rng, CUSTOMER_TYPES, rows),
+        'adr': rng.gamma(4, 25, size=rows).round(2),
+        'required_car_parking_spaces': (rng.random(rows) < 0.06).astype(int),
+        'total_of_special_requests': rng.choice([0, 1, 2, 3], size=rows, p=[0.59, 0.28, 0.11, 0.02]),
+        'reservation_status': np.where(is_canceled == 1, 'Canceled', 'Check-Out'),
+        'reservation_status_date': (arrive + pd.to_timedelta(rng.integers(0, 10, size=rows), unit='D')).dt.strftime(
+            '%Y-%m-%d'),
+        'name': np.char.add(np.char.add(np.array(FIRST_NAMES)[first], ' '), np.array(LAST_NAMES)[last]),
+        'email': np.char.add(np.char.add(np.array(LAST_NAMES)[last], ids.astype(str)), '@example.com'),
+        'phone-number': np.char.add('669-792-', np.char.zfill((ids % 10000).astype(str), 4)),
+        'credit_card': np.char.add('************', np.char.zfill((ids % 10000).astype(str), 4)),
+    })
+
+
+def write_bookings_csv(path: str, rows: int, seed: int = 0, chunk_rows: int = 500_000):
+    # Written in chunks so 10M-row files do not need the whole frame in memory
+    for start in range(0, rows, chunk_rows):
+        chunk = generate_bookings(min(chunk_rows, rows - start), seed=seed + start)
+        chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic hotel_booking_data.csv')
+    parser.add_argument('rows', type=int)
+    parser.add_argument('--output', default='hotel_booking_data.csv')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_bookings_csv(args.output, args.rows, seed=args.seed)
@@ -8,7 +8,31 @@ AUTH_LOGIN = os.environ.get("AUTH_LOGIN")
 AUTH_PASSWORD = os.environ.get("AUTH_PASSWORD")
 DB_PORT = os.environ.get("DB_PORT")
 DB_URI = os.environ.get("DB_URI")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 20))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_STREAM_CONCURRENCY = int(os.environ.get("DB_STREAM_CONCURRENCY", 4))
+DB_HEALTH_INTERVAL = float(os.environ.get("DB_HEALTH_INTERVAL", 5))
+DB_FAILURE_THRESHOLD = int(os.environ.get("DB_FAILURE_THRESHOLD", 3))
+DB_RESET_TIMEOUT = float(os.environ.get("DB_RESET_TIMEOUT", 30))
+INGEST_CHUNKSIZE = int(os.environ.get("INGEST_CHUNKSIZE", 50000))
 SERVER_HOST = os.environ.get("SERVER_HOST")
 SERVER_PORT = int(os.environ.get("SERVER_PORT"))
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", os.cpu_count() or 1))
+SERVER_GRACEFUL_TIMEOUT = float(os.environ.get("SERVER_GRACEFUL_TIMEOUT", 30))
 API_DESCRIPTION = os.environ.get("API_DESCRIPTION")
 API_VERSION = os.environ.get("API_VERSION")
+DATASET_PATH = os.environ.get("DATASET_PATH", "hotel_booking_data.csv")
+DATASET_SNAPSHOT = os.environ.get("DATASET_SNAPSHOT", "hotel_booking_data.snapshot")
+ANALYTICS_BACKEND = os.environ.get("ANALYTICS_BACKEND", "pandas")
+ANALYTICS_WORKERS = int(os.environ.get("ANALYTICS_WORKERS", 0))
+AGGREGATE_CACHE_SIZE = int(os.environ.get("AGGREGATE_CACHE_SIZE", 256))
+ANALYTICS_CONCURRENCY = int(os.environ.get("ANALYTICS_CONCURRENCY", 4))
+ANALYTICS_QUEUE_SIZE = int(os.environ.get("ANALYTICS_QUEUE_SIZE", 64))
+ANALYTICS_KEY_CONCURRENCY = int(os.environ.get("ANALYTICS_KEY_CONCURRENCY", 2))
+ANALYTICS_KEY_QUEUE_SIZE = int(os.environ.get("ANALYTICS_KEY_QUEUE_SIZE", 16))
+FACTS_CHECK_INTERVAL = float(os.environ.get("FACTS_CHECK_INTERVAL", 5))
+HTTP_CACHE_MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE", 60))
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1000))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
@@ -0,0 +1,260 @@
+from dataclasses import dataclass, replace
+from datetime import date
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from dataset.index import INDEX_SELECTIVITY
+
+# One filter -> groupby -> metrics query over the enriched bookings. aggregate() answers it from the frame,
+# db.analytics from the booking_facts table. Queries are parsed into a normalized, hashable form so that equivalent
+# spellings (aliases, filter order, "0" vs "0.0") share one cache entry.
+
+CATEGORIES = ('hotel', 'arrival_date_month', 'meal', 'country', 'market_segment', 'distribution_channel',
+              'reserved_room_type', 'assigned_room_type', 'deposit_type', 'customer_type', 'reservation_status',
+              'booking_date_month', 'arrival_day_name')
+NUMBERS = ('is_canceled', 'lead_time', 'arrival_date_year', 'arrival_date_week_number', 'arrival_date_day_of_month',
+           'stays_in_weekend_nights', 'stays_in_week_nights', 'adults', 'children', 'babies', 'is_repeated_guest',
+           'previous_cancellations', 'previous_bookings_not_canceled', 'booking_changes', 'agent', 'company',
+           'days_in_waiting_list', 'adr', 'required_car_parking_spaces', 'total_of_special_requests',
+           'booking_date_year', 'length_of_stay', 'revenue', 'total_guest')
+ALIASES = {
+    'booking_month': 'booking_date_month',
+    'booking_year': 'booking_date_year',
+    'arrival_month': 'arrival_date_month',
+    'arrival_year': 'arrival_date_year',
+    'arrival_day': 'arrival_day_name',
+}
+FUNCTIONS = ('count', 'sum', 'mean', 'min', 'max')
+
+Value = Union[str, int, float]
+
+
+@dataclass(frozen=True)
+class AggregateQuery:
+    group_by: tuple[str, ...] = ()
+    metrics: tuple[tuple[str, Optional[str]], ...] = (('count', None),)
+    filters: tuple[tuple[str, tuple[Value, ...]], ...] = ()
+    sort: Optional[tuple[str, bool]] = None
+    limit: Optional[int] = None
+    # Inclusive booking date bounds, either can be open
+    period: Optional[tuple[Optional[date], Optional[date]]] = None
+
+    @property
+    def metric_names(self) -> list[str]:
+        return [func if column is None else f'{func}_{column}' for func, column in self.metrics]
+
+
+def _split(values: Union[None, str, Iterable[str]]) -> list[str]:
+    if values is None:
+        return []
+    if isinstance(values, str):
+        values = [values]
+    return [part.strip() for value in values for part in value.split(',') if part.strip()]
+
+
+def _column(name: str) -> str:
+    column = ALIASES.get(name, name)
+    if column not in CATEGORIES and column not in NUMBERS:
+        raise ValueError(f'Unknown column: {name}')
+    return column
+
+
+def _value(column: str, value: str) -> Value:
+    if column in CATEGORIES:
+        return value
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f'{column} must be compared with a number, got {value}')
+    return int(number) if number.is_integer() else number
+
+
+def parse_period(date_from: Optional[date], date_to: Optional[date]) -> Optional[tuple[Optional[date], Optional[date]]]:
+    if date_from is None and date_to is None:
+        return None
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise ValueError(f'The period starts after it ends: {date_from} > {date_to}')
+    return date_from, date_to
+
+
+def parse_query(group_by=None, metric=None, filter_by=None, sort: Optional[str] = None,
+                limit: Optional[int] = None, period=None) -> AggregateQuery:
+    # Every argument but limit and period takes a comma-separated string or a list of them, e.g.
+    # group_by='hotel,booking_month', metric='sum:revenue', filter_by=['is_canceled:0', 'hotel:Resort Hotel'].
+    # Repeating a filter column matches any of its values. period is what parse_period returns.
+    columns = tuple(dict.fromkeys(_column(name) for name in _split(group_by)))
+
+    metrics = []
+    for spec in _split(metric) or ['count']:
+        func, _, name = spec.partition(':')
+        if func not in FUNCTIONS:
+            raise ValueError(f'Unknown metric: {func}, expected one of {", ".join(FUNCTIONS)}')
+        if func == 'count':
+            metrics.append((func, None))
+            continue
+        column = _column(name) if name else None
+        if column not in NUMBERS:
+            raise ValueError(f'{spec} needs a numeric column')
+        metrics.append((func, column))
+
+    filters = {}
+    for spec in _split(filter_by):
+        name, separator, value = spec.partition(':')
+        if not separator:
+            raise ValueError(f'Filters look like column:value, got {spec}')
+        column = _column(name.strip())
+        filters.setdefault(column, set()).add(_value(column, value.strip()))
+
+    query = AggregateQuery(group_by=columns, metrics=tuple(dict.fromkeys(metrics)),
+                           filters=tuple((column, tuple(sorted(values, key=str))) for column, values in
+                                         sorted(filters.items())),
+                           limit=limit, period=period)
+    if sort:
+        name = sort.lstrip('-')
+        name = name if name in query.metric_names else _column(name)
+        if name not in query.group_by and name not in query.metric_names:
+            raise ValueError(f'Cannot sort by {name}, it is not in the result')
+        query = replace(query, sort=(name, sort.startswith('-')))
+    return query
+
+
+def _filter_mask(df: pd.DataFrame, filters: tuple, masks: Optional[dict]) -> Optional[pd.Series]:
+    if masks is not None and filters in masks:
+        return masks[filters]
+    mask = None
+    for column, values in filters:
+        key = ((column, values),)
+        match = masks.get(key) if masks is not None else None
+        if match is None:
+            # isin() hashes every value, a single one is a plain vectorized comparison
+            match = df[column] == values[0] if len(values) == 1 else df[column].isin(values)
+            if masks is not None:
+                masks[key] = match
+        mask = match if mask is None else mask & match
+    if masks is not None:
+        masks[filters] = mask
+    return mask
+
+
+def _indexed_rows(df: pd.DataFrame, filters: tuple, indexes: dict) -> Optional[tuple[np.ndarray, tuple]]:
+    # The positions of the most selective filter on an indexed column and the filters left to apply to them,
+    # if they are few enough for gathering them to beat comparing the whole column
+    best = None
+    for column, values in filters:
+        if column in indexes:
+            positions = indexes[column].positions(values)
+            if best is None or len(positions) < len(best[0]):
+                best = (positions, column)
+    if best is None or len(best[0]) > len(df) * INDEX_SELECTIVITY:
+        return None
+    return best[0], tuple((column, values) for column, values in filters if column != best[1])
+
+
+def result_columns(query: AggregateQuery) -> list[str]:
+    return list(dict.fromkeys([*query.group_by, *(column for _, column in query.metrics if column)]))
+
+
+def query_columns(query: AggregateQuery) -> list[str]:
+    # Every column the query reads, its filters' included
+    return list(dict.fromkeys([*result_columns(query), *(column for column, _ in query.filters)]))
+
+
+def _select(df: pd.DataFrame, query: AggregateQuery, masks: Optional[dict], indexes: Optional[dict]) -> pd.DataFrame:
+    # The filtered rows of the columns the query reads
+    columns = result_columns(query)
+    selected = _indexed_rows(df, query.filters, indexes) if indexes else None
+    if selected is not None:
+        positions, filters = selected
+        # Only the matching rows of the columns the query and its other filters read are gathered
+        df = df[list(dict.fromkeys([*columns, *(column for column, _ in filters)]))].take(positions)
+        mask = _filter_mask(df, filters, None)
+    else:
+        mask = _filter_mask(df, query.filters, masks)
+    # Only the columns the query reads are filtered, not the whole frame
+    df = df[columns]
+    if mask is not None:
+        df = df[mask]
+    return df
+
+
+def _finish(result: pd.DataFrame, query: AggregateQuery) -> list[dict]:
+    if query.sort:
+        name, descending = query.sort
+        result = result.sort_values(name, ascending=not descending, kind='stable')
+    if query.limit:
+        result = result.head(query.limit)
+    return result.to_dict('records')
+
+
+def aggregate(df: pd.DataFrame, query: AggregateQuery, masks: Optional[dict] = None,
+              indexes: Optional[dict] = None) -> list[dict]:
+    # masks, when given, keeps the filter masks for the next queries over the same frame, e.g. of one batch of reports.
+    # indexes are the dataset.index.RowIndex of the frame's columns. The period is not applied here, the frame is
+    # expected to hold the rows of it (see dataset.periods).
+    df = _select(df, query, masks, indexes)
+
+    names = query.metric_names
+    if query.group_by:
+        grouped = df.groupby(list(query.group_by), observed=True)
+        result = pd.DataFrame({
+            name: grouped.size() if func == 'count' else grouped[column].agg(func)
+            for name, (func, column) in zip(names, query.metrics)
+        }).reset_index()
+    else:
+        result = pd.DataFrame([{
+            name: len(df) if func == 'count' else df[column].agg(func)
+            for name, (func, column) in zip(names, query.metrics)
+        }])
+    return _finish(result, query)
+
+
+# Partial aggregates are the parts of the metrics that merge across disjoint sets of rows: counts, sums, minimums
+# and maximums, a mean is kept as its sum and its count of values. The parts are named like the metrics.
+MERGE = {'size': 'sum', 'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'}
+
+
+def _parts(query: AggregateQuery) -> dict[str, tuple[str, Optional[str]]]:
+    parts = {}
+    for func, column in query.metrics:
+        if func == 'count':
+            parts['count'] = ('size', None)
+        elif func == 'mean':
+            parts[f'sum_{column}'] = ('sum', column)
+            parts[f'count_{column}'] = ('count', column)
+        else:
+            parts[f'{func}_{column}'] = (func, column)
+    return parts
+
+
+def partial_aggregate(df: pd.DataFrame, query: AggregateQuery, indexes: Optional[dict] = None) -> pd.DataFrame:
+    # One row per group, indexed by the group columns; a single row without them
+    df = _select(df, query, None, indexes)
+    parts = _parts(query)
+    if query.group_by:
+        grouped = df.groupby(list(query.group_by), observed=True)
+        return pd.DataFrame({name: grouped.size() if func == 'size' else grouped[column].agg(func)
+                             for name, (func, column) in parts.items()})
+    return pd.DataFrame([{name: len(df) if func == 'size' else df[column].agg(func)
+                          for name, (func, column) in parts.items()}])
+
+
+def combine_partials(partials: list[pd.DataFrame], query: AggregateQuery) -> pd.DataFrame:
+    # The partial aggregate of all the rows, it can be combined again
+    how = {name: MERGE[func] for name, (func, _) in _parts(query).items()}
+    combined = pd.concat(partials)
+    if query.group_by:
+        return combined.groupby(level=list(range(len(query.group_by))), observed=True).agg(how)
+    return pd.DataFrame([combined.agg(how)])
+
+
+def merge_partials(partials: list[pd.DataFrame], query: AggregateQuery) -> list[dict]:
+    combined = combine_partials(partials, query)
+
+    result = pd.DataFrame({
+        name: combined[f'sum_{column}'] / combined[f'count_{column}'] if func == 'mean' else
+        combined['count' if func == 'count' else name]
+        for name, (func, column) in zip(query.metric_names, query.metrics)
+    })
+    return _finish(result.reset_index() if query.group_by else result, query)
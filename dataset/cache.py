@@ -0,0 +1,228 @@
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from functools import cached_property, partial
+from typing import Callable, Optional
+
+import pandas as pd
+
+from config import DATASET_PATH, DATASET_SNAPSHOT, FACTS_CHECK_INTERVAL
+from dataset.aggregate import AggregateQuery, aggregate
+from dataset.enrich import PII_COLUMNS, load_bookings, load_pii
+from dataset.index import INDEXED_COLUMNS, RowIndex, after, build_indexes
+from dataset.live import FIRST_APPENDED_ID, AppendedRows
+from dataset.periods import DATE_COLUMN, DateIndex, PartialCache, aggregate_period
+from dataset.reports import Run
+from dataset.snapshot import read_lazy_columns, read_snapshot, snapshot_version
+
+
+@dataclass(frozen=True)
+class Dataset:
+    frame: pd.DataFrame
+    # The file's digest, plus the id of the last appended booking once there are any
+    version: str
+    mtime: float
+    # Returns the personal columns (dataset.enrich.PII_COLUMNS), anything with take(row positions) -> DataFrame
+    load_pii: Optional[Callable[[], object]] = None
+    # Row positions per value of the selective columns, built at load (see dataset.index)
+    indexes: dict[str, RowIndex] = field(default_factory=dict)
+    # Row positions in booking date order and the partial aggregates of whole months, for the queries of a period
+    dates: Optional[DateIndex] = None
+    partials: PartialCache = field(default_factory=PartialCache)
+    # The file's digest alone
+    digest: Optional[str] = None
+    # Bookings added after the file (see dataset.live), the first appended_rows of them belong to this snapshot
+    appended: Optional[AppendedRows] = None
+    appended_rows: int = 0
+
+    def aggregate(self, query: AggregateQuery) -> list[dict]:
+        if self.appended_rows:
+            return self.appended.aggregate(query, self.appended_rows, self.frame, self.indexes, self.dates,
+                                           self.partials)
+        if query.period is not None:
+            return aggregate_period(self.frame, query, self.dates or DateIndex(self.frame[DATE_COLUMN]),
+                                    self.partials)
+        return aggregate(self.frame, query, indexes=self.indexes)
+
+    def rows(self, column: str, value: str, cursor: Optional[int] = None, limit: Optional[int] = None) -> pd.DataFrame:
+        # The first rows with the value in an indexed column after the cursor, without scanning the column
+        rows = self.frame.take(after(self.indexes[column].positions([value]), cursor)[:limit])
+        if self.appended_rows and (limit is None or len(rows) < limit):
+            # The appended bookings come after every row of the file
+            appended = self.appended.matching(column, value, self.appended_rows, cursor)
+            rows = pd.concat([rows, appended[self.frame.columns]])[:limit]
+        return rows
+
+    def compute_reports(self, reports: dict[str, Callable[[Run], list[dict]]]) -> dict[str, list[dict]]:
+        if self.appended_rows:
+            # Each query brings its maintained partial aggregate up to date instead
+            return {name: report(self.aggregate) for name, report in reports.items()}
+        # One pass for the whole set: the filters the reports have in common (is_canceled:0 mostly) are evaluated once
+        masks = {}
+        return {name: report(lambda query: aggregate(self.frame, query, masks, self.indexes))
+                for name, report in reports.items()}
+
+    @cached_property
+    def pii(self):
+        return self.load_pii()
+
+    def with_pii(self, rows: pd.DataFrame) -> pd.DataFrame:
+        # rows are a selection of the frame, their index is their position in it, or appended rows after it
+        ids = rows.index.to_numpy()
+        in_frame = ids < len(self.frame)
+        pii = self.pii.take(ids[in_frame])
+        if not in_frame.all():
+            appended = self.appended.rows(0, self.appended_rows)
+            pii = pd.concat([pii, appended.loc[ids[~in_frame], PII_COLUMNS]])
+        return rows.join(pii)
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    def __init__(self, path: str, loader: Callable[[str, str], pd.DataFrame],
+                 pii_loader: Optional[Callable[[str, str], object]] = None, indexed: tuple[str, ...] = (),
+                 dated: bool = False, appended: Optional[Callable[[int], Optional[pd.DataFrame]]] = None,
+                 check_interval: float = FACTS_CHECK_INTERVAL):
+        self.path = path
+        self.loader = loader
+        self.pii_loader = pii_loader
+        self.indexed = indexed
+        # Whether the rows are indexed by booking date at load, for the queries of a period
+        self.dated = dated
+        # Returns the bookings appended after an id (see read_appended), looked for at most every check_interval
+        self.appended = appended
+        self.check_interval = check_interval
+        self._dataset: Optional[Dataset] = None
+        self._pinned = False
+        self._checked = float('-inf')
+        self._lock = threading.Lock()
+
+    def pin(self):
+        # Keeps serving the loaded dataset whatever happens to the file, for processes that are replaced instead
+        # of reloading (see serve.py). Appended bookings are still followed.
+        self._pinned = self._dataset is not None
+
+    def get(self) -> Dataset:
+        dataset = self._dataset
+        if not self._pinned:
+            # A stat per call is all the hot path pays while the file is unchanged
+            mtime = os.stat(self.path).st_mtime
+            if dataset is None or dataset.mtime != mtime:
+                dataset = self._load(mtime)
+        if self._appended_due():
+            dataset = self._catch_up()
+        return dataset
+
+    def _load(self, mtime: float) -> Dataset:
+        with self._lock:
+            dataset = self._dataset
+            if dataset is not None and dataset.mtime == mtime:
+                return dataset
+
+            version = file_digest(self.path)
+            load_pii = partial(self.pii_loader, self.path, version) if self.pii_loader else None
+            if dataset is not None and dataset.digest == version:
+                # The file was touched but its content is the same
+                self._dataset = replace(dataset, mtime=mtime, load_pii=load_pii)
+            else:
+                frame = self.loader(self.path, version)
+                indexes = build_indexes(frame, self.indexed) if self.indexed else {}
+                dates = DateIndex(frame[DATE_COLUMN]) if self.dated else None
+                self._dataset = Dataset(frame=frame, version=version, mtime=mtime, load_pii=load_pii,
+                                        indexes=indexes, dates=dates, digest=version)
+                # The bookings appended after the rows of this file are read again
+                self._checked = float('-inf')
+            return self._dataset
+
+    def _appended_due(self) -> bool:
+        return self.appended is not None and time.monotonic() - self._checked >= self.check_interval
+
+    def _catch_up(self) -> Dataset:
+        # Bookings appended to the database since the last look, by this process or any other
+        with self._lock:
+            dataset = self._dataset
+            if not self._appended_due():
+                return dataset
+            appended = dataset.appended
+            rows = self.appended(appended.last_id if appended is not None else FIRST_APPENDED_ID - 1)
+            self._checked = time.monotonic()
+            if rows is not None and len(rows):
+                appended = appended or AppendedRows()
+                appended.append(rows)
+                self._dataset = replace(dataset, appended=appended, appended_rows=len(appended),
+                                        version=f'{dataset.digest}+{appended.last_id}')
+            return self._dataset
+
+    def invalidate(self):
+        # Bookings were appended, the next get() reads them
+        self._checked = float('-inf')
+
+    def caught_up(self, last_id: Optional[int]) -> Dataset:
+        # The dataset with the bookings appended up to last_id at least, e.g. ones another process just added
+        dataset = self.get()
+        known = dataset.appended.last_id if dataset.appended is not None else FIRST_APPENDED_ID - 1
+        if last_id is not None and known < last_id:
+            self.invalidate()
+            dataset = self.get()
+        return dataset
+
+    def stale(self) -> bool:
+        dataset = self._dataset
+        return self._appended_due() or (not self._pinned and (
+            dataset is None or os.stat(self.path).st_mtime != dataset.mtime))
+
+
+def load_bookings_dataset(path: str, version: str) -> pd.DataFrame:
+    # Prefer the memory-mapped snapshot when it was converted from this exact CSV content
+    if snapshot_version(DATASET_SNAPSHOT) == version:
+        return read_snapshot(DATASET_SNAPSHOT)
+    return load_bookings(path)
+
+
+def load_bookings_pii(path: str, version: str):
+    if snapshot_version(DATASET_SNAPSHOT) == version:
+        lazy = read_lazy_columns(DATASET_SNAPSHOT)
+        if lazy is not None:
+            return lazy
+    return load_pii(path)
+
+
+def read_appended(after: int) -> Optional[pd.DataFrame]:
+    # db.ingest imports this module
+    from sqlalchemy.exc import OperationalError
+
+    from db.database import engine
+    from db.ingest import appended_bookings
+
+    try:
+        with engine.connect() as connection:
+            return appended_bookings(connection, after)
+    except OperationalError:
+        # The database is down or not created yet, the bookings known so far are served meanwhile
+        return None
+
+
+def read_last_appended_id() -> Optional[int]:
+    from sqlalchemy.exc import OperationalError
+
+    from db.database import engine
+    from db.ingest import last_appended_id
+
+    try:
+        with engine.connect() as connection:
+            return last_appended_id(connection)
+    except OperationalError:
+        return None
+
+
+bookings_dataset = DatasetCache(DATASET_PATH, loader=load_bookings_dataset, pii_loader=load_bookings_pii,
+                                indexed=INDEXED_COLUMNS, dated=True, appended=read_appended)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+MONTH_NUMBERS = {name: number for number, name in enumerate(MONTH_NAMES, start=1)}
+
+# Strings with few distinct values are read as categoricals: one small integer code per row and each value once
+CATEGORY_COLUMNS = ['hotel', 'arrival_date_month', 'meal', 'country', 'market_segment', 'distribution_channel',
+                    'reserved_room_type', 'assigned_room_type', 'deposit_type', 'customer_type', 'reservation_status',
+                    'reservation_status_date']
+# Wide personal columns only the nationality listing returns, loaded on its first request (see dataset.cache)
+PII_COLUMNS = ['name', 'email', 'phone-number', 'credit_card']
+
+
+def arrive_dates(df: pd.DataFrame) -> pd.Series:
+    # Months since epoch -> first day of the month -> plus the day offset, no string parsing involved
+    month_numbers = np.asarray(df['arrival_date_month'].map(MONTH_NUMBERS), dtype=np.int64)
+    months = (df['arrival_date_year'].to_numpy() - 1970) * 12 + month_numbers - 1
+    days = months.astype('datetime64[M]').astype('datetime64[D]') + (df['arrival_date_day_of_month'].to_numpy() - 1)
+    return pd.Series(days.astype('datetime64[ns]'), index=df.index)
+
+
+def month_names(dates: pd.Series) -> pd.Categorical:
+    return pd.Categorical.from_codes(dates.dt.month.to_numpy() - 1, categories=MONTH_NAMES, ordered=True)
+
+
+def day_names(dates: pd.Series) -> pd.Categorical:
+    return pd.Categorical.from_codes(dates.dt.dayofweek.to_numpy(), categories=DAY_NAMES, ordered=True)
+
+
+def enrich_bookings(df: pd.DataFrame) -> pd.DataFrame:
+    arrive_date = arrive_dates(df)
+    booking_date = arrive_date - pd.to_timedelta(df['lead_time'], unit='D')
+    length_of_stay = df['stays_in_weekend_nights'] + df['stays_in_week_nights']
+    return df.assign(
+        arrive_date=arrive_date,
+        arrival_day_name=day_names(arrive_date),
+        booking_date=booking_date,
+        booking_date_month=month_names(booking_date),
+        booking_date_year=booking_date.dt.year,
+        length_of_stay=length_of_stay,
+        revenue=length_of_stay * df['adr'],
+        total_guest=df['adults'] + df['children'] + df['babies'],
+    )
+
+
+def downcast_integers(df: pd.DataFrame) -> pd.DataFrame:
+    # After the enrichment, so the derived columns are computed before the narrower types could overflow.
+    # Aggregations still sum and average them in 64 bits.
+    return df.astype({name: pd.to_numeric(df[name], downcast='integer').dtype
+                      for name in df.select_dtypes('integer').columns})
+
+
+def load_bookings(path: str) -> pd.DataFrame:
+    df = pd.read_csv(path, usecols=lambda name: name not in PII_COLUMNS,
+                     dtype={name: 'category' for name in CATEGORY_COLUMNS})
+    # Groups come out in the order of the categories, which the chunked parser leaves in order of appearance
+    df = df.assign(**{name: df[name].cat.reorder_categories(sorted(df[name].cat.categories))
+                      for name in CATEGORY_COLUMNS})
+    return downcast_integers(enrich_bookings(df))
+
+
+def load_pii(path: str) -> pd.DataFrame:
+    return pd.read_csv(path, usecols=PII_COLUMNS)[PII_COLUMNS]
@@ -0,0 +1,41 @@
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# Row positions per value of the categorical columns that filters select few rows of. A lookup returns the positions
+# of a value as a slice of one array, ascending, so a filter costs O(matches) instead of a comparison over the whole
+# column, and a page after a cursor is a binary search away.
+
+INDEXED_COLUMNS = ('country', 'hotel', 'market_segment', 'customer_type')
+# An index is used for a filter when it keeps at most this share of the rows, a gather of more rows than that costs
+# more than the vectorized comparison over the column
+INDEX_SELECTIVITY = 0.1
+
+
+class RowIndex:
+    def __init__(self, series: pd.Series):
+        codes = series.cat.codes.to_numpy()
+        # Stable, so the positions of every value stay ascending; on the int8/int16 codes numpy sorts by radix
+        self._positions = np.argsort(codes, kind='stable')
+        # Missing values (code -1) sort first and get a bucket of their own, which is never looked up
+        counts = np.bincount(codes.astype(np.intp) + 1, minlength=len(series.cat.categories) + 1)
+        self._bounds = np.concatenate([[0], np.cumsum(counts)])
+        self._codes = {value: code for code, value in enumerate(series.cat.categories, start=1)}
+
+    def positions(self, values: Iterable) -> np.ndarray:
+        slices = [self._positions[self._bounds[code]:self._bounds[code + 1]]
+                  for code in (self._codes.get(value) for value in values) if code is not None]
+        if len(slices) == 1:
+            return slices[0]
+        return np.sort(np.concatenate(slices)) if slices else np.empty(0, dtype=np.intp)
+
+
+def build_indexes(df: pd.DataFrame, columns: Iterable[str] = INDEXED_COLUMNS) -> dict[str, RowIndex]:
+    return {column: RowIndex(df[column]) for column in columns
+            if column in df and isinstance(df[column].dtype, pd.CategoricalDtype)}
+
+
+def after(positions: np.ndarray, cursor: Optional[int]) -> np.ndarray:
+    # The positions past a keyset cursor, which is the position of the last row of the previous page
+    return positions if cursor is None else positions[np.searchsorted(positions, cursor, side='right'):]
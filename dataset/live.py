@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Optional
+
+import pandas as pd
+
+from dataset.aggregate import AggregateQuery, combine_partials, merge_partials, partial_aggregate
+from dataset.enrich import enrich_bookings
+from dataset.periods import DATE_COLUMN, DateIndex, PartialCache, period_partials
+
+# Bookings added through POST /bookings after the frame was loaded. The frame is never rewritten, the new rows are
+# kept next to it in the order of their ids and queries are answered from both. The partial aggregates (see
+# dataset.aggregate) of the queries asked so far are kept over the frame and the rows appended up to then, and are
+# brought up to date with the rows appended since when asked again: counts, sums and means of a report after an
+# insert aggregate the new rows, not the whole frame again. booking_facts is the store of record, every process
+# reads the appended rows from it (see dataset.cache.DatasetCache).
+
+# Appended bookings take ids from here on, apart from the row numbers the file's rows are stored under: a file that
+# grows and is ingested again never reaches them
+FIRST_APPENDED_ID = 1_000_000_000
+MAINTAINED_QUERIES = 1024
+# Single inserts arrive as one-row batches, they are concatenated once there are this many
+COMPACT_BATCHES = 64
+
+
+class AppendedRows:
+    def __init__(self):
+        # The enriched rows, indexed by booking id, in batches with the row count at the end of each.
+        # Swapped as a whole: readers take the first rows of their snapshot while batches are appended.
+        self._batches: tuple[tuple[pd.DataFrame, ...], tuple[int, ...]] = ((), ())
+        # Per query without sort, limit and period: the count of appended rows its partial aggregate covers
+        self._partials: OrderedDict[AggregateQuery, tuple[int, pd.DataFrame]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        ends = self._batches[1]
+        return ends[-1] if ends else 0
+
+    @property
+    def last_id(self) -> int:
+        return int(self._batches[0][-1].index[-1])
+
+    def append(self, rows: pd.DataFrame):
+        # rows have the fields of the file, indexed by ids after the ones appended so far
+        rows = enrich_bookings(rows)
+        with self._lock:
+            batches, ends = self._batches
+            batches, ends = (*batches, rows), (*ends, len(self) + len(rows))
+            if len(batches) > COMPACT_BATCHES:
+                batches, ends = (pd.concat(batches),), (ends[-1],)
+            self._batches = batches, ends
+
+    def rows(self, start: int, stop: int) -> pd.DataFrame:
+        selected, begin = [], 0
+        for batch, end in zip(*self._batches):
+            if begin < stop and end > start:
+                selected.append(batch.iloc[max(start - begin, 0):stop - begin])
+            begin = end
+        return pd.concat(selected) if len(selected) > 1 else selected[0]
+
+    def partial(self, query: AggregateQuery, count: int, frame: pd.DataFrame, indexes: dict) -> pd.DataFrame:
+        # The partial aggregate of the frame and the first count appended rows
+        with self._lock:
+            covered, partial = self._partials.get(query, (0, None))
+        if partial is None or covered > count:
+            # Not asked before, or kept past the rows of this (older) snapshot: once over the frame
+            covered, partial = 0, partial_aggregate(frame, query, indexes)
+        if covered < count:
+            partial = combine_partials([partial, partial_aggregate(self.rows(covered, count), query)], query)
+        with self._lock:
+            if self._partials.get(query, (0, None))[0] <= count:
+                self._partials[query] = (count, partial)
+                self._partials.move_to_end(query)
+                if len(self._partials) > MAINTAINED_QUERIES:
+                    self._partials.popitem(last=False)
+        return partial
+
+    def aggregate(self, query: AggregateQuery, count: int, frame: pd.DataFrame, indexes: dict,
+                  dates: Optional[DateIndex], partials: PartialCache) -> list[dict]:
+        core = replace(query, sort=None, limit=None, period=None)
+        if query.period is None:
+            return merge_partials([self.partial(core, count, frame, indexes)], query)
+
+        # The months of the frame come from their cache, the appended rows of the window are aggregated as they are
+        rows = self.rows(0, count)
+        start, end = query.period
+        in_period = pd.Series(True, index=rows.index)
+        if start is not None:
+            in_period &= rows[DATE_COLUMN] >= pd.Timestamp(start)
+        if end is not None:
+            in_period &= rows[DATE_COLUMN] <= pd.Timestamp(end)
+        parts = period_partials(frame, query, dates or DateIndex(frame[DATE_COLUMN]), partials)
+        return merge_partials([*parts, partial_aggregate(rows[in_period], core)], query)
+
+    def matching(self, column: str, value: str, count: int, after: Optional[int]) -> pd.DataFrame:
+        # The first count appended rows with the value in a column, after the given id
+        rows = self.rows(0, count)
+        match = rows[column] == value
+        if after is not None:
+            match &= rows.index > after
+        return rows[match]
@@ -0,0 +1,152 @@
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Callable, Optional
+
+from config import AGGREGATE_CACHE_SIZE, ANALYTICS_BACKEND, ANALYTICS_WORKERS, DATASET_PATH
+from dataset.aggregate import AggregateQuery
+from dataset.cache import DatasetCache, bookings_dataset
+from dataset.reports import REPORTS, Run
+from dataset.workers import WorkerPool
+from db.analytics import bookings_facts
+from monitoring.metrics import phase
+
+# Reports and aggregations are answered by the configured backend: the in-memory frame (DatasetCache), the frame
+# held by worker processes (dataset.workers.WorkerPool, with ANALYTICS_WORKERS > 0) or the booking_facts table
+# (db.analytics.FactsSource). All have get(), returning a versioned snapshot with aggregate(), and stale().
+analytics_workers = WorkerPool(DATASET_PATH, ANALYTICS_WORKERS) if ANALYTICS_WORKERS and ANALYTICS_BACKEND != 'sql' \
+    else None
+analytics_source = bookings_facts if ANALYTICS_BACKEND == 'sql' else analytics_workers or bookings_dataset
+
+
+class ReportStore:
+    def __init__(self, dataset: DatasetCache, reports: dict[str, Callable[[Run], list[dict]]]):
+        self.dataset = dataset
+        self.reports = reports
+        self.version: Optional[str] = None
+        # The snapshot and the payloads computed from it, swapped together
+        self._state: Optional[tuple[object, dict[str, list[dict]]]] = None
+        self._encoded: dict[tuple[str, str], tuple[list[dict], bytes]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def get(self, name: str) -> list[dict]:
+        return self._current()[1][name]
+
+    def snapshot(self):
+        # The dataset snapshot the served payloads were computed from, for the HTTP cache validators
+        return self._current()[0]
+
+    @property
+    def ready(self) -> bool:
+        return self._state is not None
+
+    def _current(self) -> tuple:
+        current = self._state
+        if current is None:
+            # Nothing to serve yet, the first caller computes and the others wait for it
+            with self._lock:
+                if self._state is None:
+                    self._materialize()
+                current = self._state
+        elif self._stale(current[0]):
+            # Keep answering from the previous version while the new one is computed
+            self._refresh_in_background()
+        return current
+
+    def _stale(self, snapshot) -> bool:
+        # The source's stale() only tells what its own get() has not taken in yet: once another caller (the
+        # aggregations, the HTTP validators, POST /bookings) did, the version the payloads were built from is older
+        # than the source's snapshot without the source saying so
+        return self.dataset.stale() or self.dataset.get().version != snapshot.version
+
+    def get_encoded(self, name: str, media_type: str, encode: Callable[[list[dict]], bytes]) -> bytes:
+        # The encoded bytes are kept next to the payload they were made from and redone once it is replaced
+        payload = self.get(name)
+        encoded = self._encoded.get((name, media_type))
+        if encoded is None or encoded[0] is not payload:
+            encoded = self._encoded[name, media_type] = (payload, encode(payload))
+        return encoded[1]
+
+    def refresh(self):
+        # Computes the payloads of the current version right away, e.g. to warm the store before serving
+        with self._lock:
+            self._materialize()
+
+    def _materialize(self):
+        with phase('dataset'):
+            dataset = self.dataset.get()
+        if dataset.version == self.version:
+            return
+        with phase('compute'):
+            # A worker pool computes the reports side by side, the frame in one pass sharing the filter masks,
+            # the database one query after the other
+            compute_reports = getattr(dataset, 'compute_reports', None)
+            payloads = compute_reports(self.reports) if compute_reports else {
+                name: report(dataset.aggregate) for name, report in self.reports.items()}
+        self._state, self.version = (dataset, payloads), dataset.version
+
+    def _refresh(self):
+        try:
+            with self._lock:
+                self._materialize()
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh_in_background(self):
+        # At most one refresh runs at a time, requests never wait for it
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        threading.Thread(target=self._refresh, name='report-refresh', daemon=True).start()
+
+
+class AggregateCache:
+    def __init__(self, dataset: DatasetCache, maxsize: int):
+        self.dataset = dataset
+        self.maxsize = maxsize
+        self._results: OrderedDict[tuple[str, AggregateQuery], list[dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, query: AggregateQuery) -> Optional[list[dict]]:
+        with phase('dataset'):
+            dataset = self.dataset.get()
+        return self._cached((dataset.version, query))
+
+    def _cached(self, key: tuple) -> Optional[list[dict]]:
+        with self._lock:
+            rows = self._results.get(key)
+            if rows is not None:
+                self._results.move_to_end(key)
+            return rows
+
+    def get(self, query: AggregateQuery) -> list[dict]:
+        # Results of an older dataset version are never hit again and age out of the LRU
+        with phase('dataset'):
+            dataset = self.dataset.get()
+        key = (dataset.version, query)
+        rows = self._cached(key)
+        if rows is not None:
+            return rows
+
+        with phase('compute'):
+            rows = dataset.aggregate(query)
+        with self._lock:
+            self._results[key] = rows
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return rows
+
+
+bookings_reports = ReportStore(analytics_source, REPORTS)
+bookings_aggregates = AggregateCache(analytics_source, AGGREGATE_CACHE_SIZE)
+
+
+def period_report(name: str, period: tuple) -> Optional[list[dict]]:
+    # Reports of a booking date window are not materialized, their queries go through the aggregation cache and,
+    # on the frame, reuse the partial aggregates of the months they cover. None when the window has no bookings.
+    def run(query: AggregateQuery) -> list[dict]:
+        return bookings_aggregates.get(replace(query, period=period))
+
+    if not run(AggregateQuery())[0]['count']:
+        return None
+    return REPORTS[name](run)
@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from dataset.aggregate import AggregateQuery, merge_partials, partial_aggregate, query_columns
+
+# Booking date windows over the frame. The frame keeps its row order (the position is the booking id), a DateIndex
+# holds the row positions sorted by booking date instead, so the rows of any window are one slice found by binary
+# search. Windows are cut into calendar months: the partial aggregates of every whole month are cached per query and
+# reused by all the windows that cover that month, only the months cut by the bounds are aggregated from their rows.
+
+DATE_COLUMN = 'booking_date'
+PARTIAL_CACHE_SIZE = 4096
+
+
+class DateIndex:
+    def __init__(self, dates: pd.Series):
+        values = dates.to_numpy().astype('datetime64[D]')
+        self.order = np.argsort(values, kind='stable')
+        self.dates = values[self.order]
+
+    @property
+    def first(self) -> Optional[date]:
+        return self.dates[0].item() if len(self.dates) else None
+
+    @property
+    def last(self) -> Optional[date]:
+        return self.dates[-1].item() if len(self.dates) else None
+
+    def positions(self, start: date, end: date) -> np.ndarray:
+        # Row positions of the bookings from start to end inclusive, in booking date order
+        lo = np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left')
+        hi = np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right')
+        return self.order[lo:hi]
+
+
+def _month_end(day: date) -> date:
+    following = day.replace(day=28) + timedelta(days=4)
+    return following - timedelta(days=following.day)
+
+
+def month_pieces(start: date, end: date) -> list[tuple[date, date, bool]]:
+    # The window split at month boundaries: (first day, last day, whether the piece is the whole month)
+    pieces = []
+    while start <= end:
+        month_end = _month_end(start)
+        pieces.append((start, min(month_end, end), start.day == 1 and month_end <= end))
+        start = month_end + timedelta(days=1)
+    return pieces
+
+
+class PartialCache:
+    # Partial aggregates of whole months, keyed by the month and the query without its period, sort and limit
+    def __init__(self, maxsize: int = PARTIAL_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._partials: OrderedDict[tuple, pd.DataFrame] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[pd.DataFrame]:
+        with self._lock:
+            partial = self._partials.get(key)
+            if partial is not None:
+                self._partials.move_to_end(key)
+            return partial
+
+    def put(self, key: tuple, partial: pd.DataFrame):
+        with self._lock:
+            self._partials[key] = partial
+            if len(self._partials) > self.maxsize:
+                self._partials.popitem(last=False)
+
+
+def period_partials(df: pd.DataFrame, query: AggregateQuery, dates: DateIndex,
+                    partials: PartialCache) -> list[pd.DataFrame]:
+    # The partial aggregates of the pieces of the window, see dataset.aggregate.merge_partials
+    core = replace(query, sort=None, limit=None, period=None)
+    df = df[query_columns(query)]
+    if dates.first is None:
+        return [partial_aggregate(df, core)]
+    # Open or wider bounds are narrowed to the months that have bookings, whole months stay whole
+    start, end = query.period
+    start = max(start or dates.first, dates.first.replace(day=1))
+    end = min(end or dates.last, _month_end(dates.last))
+
+    parts = []
+    for first, last, whole in month_pieces(start, end):
+        partial = partials.get((first, core)) if whole else None
+        if partial is None:
+            partial = partial_aggregate(df.take(dates.positions(first, last)), core)
+            if whole:
+                partials.put((first, core), partial)
+        parts.append(partial)
+    if not parts:
+        parts.append(partial_aggregate(df.iloc[:0], core))
+    return parts
+
+
+def aggregate_period(df: pd.DataFrame, query: AggregateQuery, dates: DateIndex, partials: PartialCache) -> list[dict]:
+    return merge_partials(period_partials(df, query, dates, partials), query)
@@ -0,0 +1,144 @@
+from typing import Callable
+
+import numpy as np
+
+from dataset.aggregate import AggregateQuery, parse_query
+
+# Each report returns the finished response payload as plain rows. Reports are written as queries of the generic
+# aggregation (see dataset.aggregate) and take the function that runs them, so the same definitions are answered
+# from the pandas frame or from SQL (see dataset.materialized). Groups come out in the order of their columns and
+# rows with equal sort keys keep that order, the same for every backend.
+
+Run = Callable[[AggregateQuery], list[dict]]
+
+
+def _query(run: Run, **query) -> list[dict]:
+    return run(parse_query(**query))
+
+
+def _query_report(run: Run, names: dict[str, str], digits: int = None, **query) -> list[dict]:
+    return [{names.get(key, key): value if digits is None or not isinstance(value, float) else round(value, digits)
+             for key, value in row.items()} for row in _query(run, **query)]
+
+
+def _ranking(run: Run, column: str, **query) -> dict:
+    # What value_counts() gives: the values of a column from the most to the least frequent
+    return {row[column]: row['count'] for row in _query(run, group_by=column, sort='-count', **query)}
+
+
+def _positive_count(run: Run, column: str, **query) -> int:
+    # Counts rows with column > 0 from the (few) distinct values of the column, missing values never match
+    return sum(row['count'] for row in _query(run, group_by=column, **query) if row[column] > 0)
+
+
+def stats_report(run: Run) -> list[dict]:
+    totals = _query(run, metric='count,sum:is_canceled,mean:length_of_stay,mean:adr')[0]
+    segments = _query(run, group_by='market_segment', sort='-count', limit=1)
+    return [{
+        'total_number_of_bookings': totals['count'],
+        'average_length_of_stay': round(totals['mean_length_of_stay'], 2),
+        'average_daily_rate': round(totals['mean_adr'], 2),
+        'number_of_cancelled_bookings': totals['sum_is_canceled'],
+        'number_of_non_cancelled_bookings': totals['count'] - totals['sum_is_canceled'],
+        'the_most_popular_market_segment': segments[0]['market_segment'],
+    }]
+
+
+def analysis_report(run: Run) -> list[dict]:
+    # A period can cover less than twelve months
+    arrive_months = list(_ranking(run, 'arrival_date_month'))
+    booking_months = list(_ranking(run, 'booking_date_month'))
+
+    no_kids = 'is_canceled:0,babies:0,children:0'
+    with_babies = _positive_count(run, 'babies', filter_by='is_canceled:0')
+    with_children_only = _positive_count(run, 'children', filter_by='is_canceled:0,babies:0')
+    total = _query(run)[0]['count']
+    return [{
+        'most_popular_arrive_month': arrive_months[0],
+        'least_popular_arrive_month': arrive_months[-1],
+        'most_popular_booking_month': booking_months[0],
+        'least_popular_booking_month': booking_months[-1],
+        'all_guest_without_children': _query(run, filter_by=no_kids)[0]['count'],
+        'all_guest_with_children_or_babyes': with_babies + with_children_only,
+        'couple_without_children_and_babyes': _query(run, filter_by=no_kids + ',adults:2')[0]['count'],
+        'lonely_guest': _query(run, filter_by=no_kids + ',adults:1')[0]['count'],
+        'percentage_of_people_with_a_parking_space': round(
+            _positive_count(run, 'required_car_parking_spaces') / total * 100, 2),
+        'most_popular_countries_by_order': _ranking(run, 'country', limit=5),
+        'meal_packages': _ranking(run, 'meal'),
+    }]
+
+
+def popular_meal_package_report(run: Run) -> list[dict]:
+    return [{'the_most_popular_meal_package': row['meal']}
+            for row in _query(run, group_by='meal', sort='-count', limit=1)]
+
+
+def avg_length_of_stay_report(run: Run) -> list[dict]:
+    return _query_report(run, {'booking_date_year': 'year', 'mean_length_of_stay': 'avg_length_of_stay'}, digits=2,
+                         group_by='booking_year,hotel', metric='mean:length_of_stay', filter_by='is_canceled:0')
+
+
+def total_revenue_report(run: Run) -> list[dict]:
+    return _query_report(run, {'booking_date_month': 'month', 'sum_revenue': 'total_revenue'},
+                         group_by='booking_month,hotel', metric='sum:revenue', filter_by='is_canceled:0')
+
+
+def top_countries_report(run: Run) -> list[dict]:
+    return _query_report(run, {'count': 'count_of_bookings'},
+                         group_by='country', filter_by='is_canceled:0', sort='-count', limit=5)
+
+
+def repeated_guests_percentage_report(run: Run) -> list[dict]:
+    totals = _query(run, metric='count,sum:is_repeated_guest')[0]
+    # Rounded by numpy like the original endpoint, which rounds 3.175 up where round() gives 3.17
+    share = np.float64(totals['sum_is_repeated_guest'] / totals['count'] * 100)
+    return [{'repeated_guests_percentage': float(share.round(2))}]
+
+
+def total_guests_by_year_report(run: Run) -> list[dict]:
+    return _query_report(run, {'booking_date_year': 'year', 'sum_total_guest': 'count_guests'},
+                         group_by='booking_year', metric='sum:total_guest', filter_by='is_canceled:0')
+
+
+def avg_daily_rate_resort_report(run: Run) -> list[dict]:
+    # booking_date_month groups come out in calendar order
+    return _query_report(run, {'booking_date_month': 'month', 'mean_adr': 'avg_daily'}, digits=2,
+                         group_by='booking_month', metric='mean:adr', filter_by=['hotel:Resort Hotel', 'is_canceled:0'])
+
+
+def most_common_arrival_day_city_report(run: Run) -> list[dict]:
+    return _query_report(run, {'arrival_day_name': 'day_of_the_week', 'count': 'counts_of_arrivals'},
+                         group_by='arrival_day', filter_by=['hotel:City Hotel', 'is_canceled:0'],
+                         sort='-count', limit=1)
+
+
+def count_by_hotel_meal_report(run: Run) -> list[dict]:
+    return _query_report(run, {'count': 'counts'}, group_by='meal,hotel', filter_by='is_canceled:0')
+
+
+def total_revenue_resort_by_country_report(run: Run) -> list[dict]:
+    return _query_report(run, {'sum_revenue': 'total_revenue'}, group_by='country', metric='sum:revenue',
+                         filter_by=['is_canceled:0', 'hotel:Resort Hotel'], sort='-sum_revenue')
+
+
+def count_by_hotel_repeated_guest_report(run: Run) -> list[dict]:
+    return _query_report(run, {'is_repeated_guest': 'is_repeat', 'count': 'count_guests'},
+                         group_by='hotel,is_repeated_guest', filter_by='is_canceled:0')
+
+
+REPORTS = {
+    'stats': stats_report,
+    'analysis': analysis_report,
+    'popular_meal_package': popular_meal_package_report,
+    'avg_length_of_stay': avg_length_of_stay_report,
+    'total_revenue': total_revenue_report,
+    'top_countries': top_countries_report,
+    'repeated_guests_percentage': repeated_guests_percentage_report,
+    'total_guests_by_year': total_guests_by_year_report,
+    'avg_daily_rate_resort': avg_daily_rate_resort_report,
+    'most_common_arrival_day_city': most_common_arrival_day_city_report,
+    'count_by_hotel_meal': count_by_hotel_meal_report,
+    'total_revenue_resort_by_country': total_revenue_resort_by_country_report,
+    'count_by_hotel_repeated_guest': count_by_hotel_repeated_guest_report,
+}
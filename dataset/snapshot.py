@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import shutil
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from dataset.enrich import load_bookings, load_pii
+
+# A snapshot is a directory holding one .npy file per column of the enriched frame and a manifest.
+# Numeric and datetime columns are loaded with mmap_mode='r', so every process on the host maps the
+# same page cache pages instead of parsing and keeping its own copy. String columns are stored as
+# categorical codes, only their (small) category lists are materialized per process.
+# Lazy columns (the personal data) are fixed-width UTF-8 bytes, also mapped: only the pages of the rows
+# a listing returns are ever read.
+
+MANIFEST = 'manifest.json'
+# Snapshots of another format are ignored, the CSV is loaded instead until the snapshot is converted again
+FORMAT = 2
+
+
+def _write_lazy_column(tmp_path: str, number: int, name: str, series: pd.Series) -> dict:
+    values = series.to_numpy(dtype=object)
+    nulls = pd.isna(values)
+    column = {'name': name, 'file': f'{number:03d}.npy', 'lazy': True}
+    np.save(os.path.join(tmp_path, column['file']), np.char.encode(np.where(nulls, '', values).astype(str), 'utf-8'))
+    if nulls.any():
+        column['nulls'] = f'{number:03d}.nulls.npy'
+        np.save(os.path.join(tmp_path, column['nulls']), nulls)
+    return column
+
+
+def write_snapshot(df: pd.DataFrame, path: str, version: str, lazy: Optional[pd.DataFrame] = None):
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    columns = []
+    for number, name in enumerate(df.columns):
+        series = df[name]
+        if series.dtype == object:
+            series = series.astype('category')
+        column = {'name': name, 'file': f'{number:03d}.npy'}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            column['categories'] = f'{number:03d}.categories.npy'
+            column['ordered'] = bool(series.cat.ordered)
+            np.save(os.path.join(tmp_path, column['categories']), series.cat.categories.to_numpy().astype(str))
+            values = series.cat.codes.to_numpy()
+        else:
+            values = series.to_numpy()
+        column['dtype'] = str(series.dtype)
+        np.save(os.path.join(tmp_path, column['file']), values)
+        columns.append(column)
+    if lazy is not None:
+        for number, name in enumerate(lazy.columns, start=len(columns)):
+            columns.append(_write_lazy_column(tmp_path, number, name, lazy[name]))
+
+    with open(os.path.join(tmp_path, MANIFEST), 'w') as f:
+        json.dump({'format': FORMAT, 'version': version, 'rows': len(df), 'columns': columns}, f, indent=1)
+
+    # Swap the finished directory in, so readers never see a half-written snapshot
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+
+
+def _manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def snapshot_version(path: str) -> Optional[str]:
+    try:
+        manifest = _manifest(path)
+    except (OSError, ValueError):
+        return None
+    return manifest.get('version') if manifest.get('format') == FORMAT else None
+
+
+class LazyColumns:
+    def __init__(self, path: str, columns: list[dict]):
+        self.names = [column['name'] for column in columns]
+        self._values = [np.load(os.path.join(path, column['file']), mmap_mode='r') for column in columns]
+        self._nulls = [np.load(os.path.join(path, column['nulls']), mmap_mode='r') if 'nulls' in column else None
+                       for column in columns]
+
+    def take(self, positions: np.ndarray) -> pd.DataFrame:
+        data = {}
+        for name, values, nulls in zip(self.names, self._values, self._nulls):
+            column = np.char.decode(values[positions], 'utf-8').astype(object)
+            if nulls is not None:
+                column[nulls[positions]] = np.nan
+            data[name] = column
+        return pd.DataFrame(data, index=positions)
+
+
+def read_lazy_columns(path: str) -> Optional[LazyColumns]:
+    columns = [column for column in _manifest(path)['columns'] if column.get('lazy')]
+    return LazyColumns(path, columns) if columns else None
+
+
+def read_snapshot(path: str) -> pd.DataFrame:
+    manifest = _manifest(path)
+
+    columns = {}
+    for column in manifest['columns']:
+        if column.get('lazy'):
+            continue
+        values = np.load(os.path.join(path, column['file']), mmap_mode='r')
+        if 'categories' in column:
+            categories = np.load(os.path.join(path, column['categories']))
+            # The codes were saved in the dtype pandas picked for them, skipping validation keeps them mapped
+            values = pd.Categorical.from_codes(values, categories=categories, ordered=column['ordered'],
+                                               validate=False)
+        columns[column['name']] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+if __name__ == '__main__':
+    from config import DATASET_PATH, DATASET_SNAPSHOT
+    from dataset.cache import file_digest
+
+    parser = argparse.ArgumentParser(description='Convert the bookings CSV into a memory-mappable snapshot')
+    parser.add_argument('csv', nargs='?', default=DATASET_PATH)
+    parser.add_argument('snapshot', nargs='?', default=DATASET_SNAPSHOT)
+    args = parser.parse_args()
+    version = file_digest(args.csv)
+    write_snapshot(load_bookings(args.csv), args.snapshot, version, lazy=load_pii(args.csv))
+    print(f'{args.csv} -> {args.snapshot} (version {version[:12]})')
@@ -0,0 +1,53 @@
+import logging
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+
+# Readiness of the data. The ingestion of the CSV, the dataset load and the reports run once after startup, in a
+# background thread while the server already answers (the ORM lookups need none of it) or, under serve.py, in the
+# parent before the workers are forked. /health/ready answers 503 until they are done.
+
+PENDING = 'pending'
+WARMING = 'warming'
+READY = 'ready'
+FAILED = 'failed'
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    def __init__(self):
+        self.state = PENDING
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def started(self) -> bool:
+        return self.state != PENDING
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def run(self, warm: Callable[[], None]):
+        self.state = WARMING
+        start = time.perf_counter()
+        try:
+            warm()
+        except Exception as e:
+            # Requests still load the data on demand, readiness stays down so the instance gets replaced.
+            # The traceback goes to the log, /health shows the error itself.
+            self.error = ''.join(traceback.format_exception_only(e)).strip()
+            self.state = FAILED
+            logger.exception('Warming the data failed')
+        else:
+            self.state = READY
+        self.seconds = round(time.perf_counter() - start, 2)
+
+    def start(self, warm: Callable[[], None]):
+        self.state = WARMING
+        threading.Thread(target=self.run, args=(warm,), name='data-warmup', daemon=True).start()
+
+
+data_warmup = Warmup()
@@ -0,0 +1,137 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from config import FACTS_CHECK_INTERVAL
+from dataset.aggregate import AggregateQuery
+from dataset.cache import DatasetCache, load_bookings_dataset, read_appended, read_last_appended_id
+from dataset.index import INDEXED_COLUMNS
+from dataset.reports import Run
+
+# Worker-pool execution of the pandas analytics. Every worker process loads the dataset once when it starts
+# (from the memory-mapped snapshot when there is one, so the processes share its pages) and answers aggregations
+# and whole reports from it, in parallel and without taking the GIL of the API process. The API process only
+# tracks the file's version and never loads the frame for the analytics.
+#
+# Workers notice a changed file on their own, like the in-process cache. A report computed right after a change
+# can come from the new file under the old version; the next staleness check recomputes it.
+# Bookings appended through the API are read from the database by every worker. The API process follows the id of
+# the last one, tasks carry it so that no worker answers without the bookings the snapshot's version counts.
+
+_worker_dataset: Optional[DatasetCache] = None
+
+
+def _start_worker(path: str):
+    global _worker_dataset
+    _worker_dataset = DatasetCache(path, loader=load_bookings_dataset, indexed=INDEXED_COLUMNS, dated=True,
+                                   appended=read_appended)
+    _worker_dataset.get()
+
+
+def _ready():
+    pass
+
+
+def _aggregate(query: AggregateQuery, last_id: Optional[int]) -> list[dict]:
+    return _worker_dataset.caught_up(last_id).aggregate(query)
+
+
+def _report(report: Callable[[Run], list[dict]], last_id: Optional[int]) -> list[dict]:
+    # Reports are module-level functions, pickled by reference
+    return report(_worker_dataset.caught_up(last_id).aggregate)
+
+
+@dataclass(frozen=True)
+class PoolSnapshot:
+    pool: 'WorkerPool'
+    version: str
+    mtime: float
+    last_id: Optional[int]
+
+    def aggregate(self, query: AggregateQuery) -> list[dict]:
+        return self.pool.submit(_aggregate, query, self.last_id).result()
+
+    def compute_reports(self, reports: dict[str, Callable[[Run], list[dict]]]) -> dict[str, list[dict]]:
+        # All reports are submitted at once, they are computed on as many cores as there are workers
+        futures = {name: self.pool.submit(_report, report, self.last_id) for name, report in reports.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+class WorkerPool:
+    def __init__(self, path: str, workers: int):
+        self.path = path
+        self.workers = workers
+        # Only follows the file's version and mtime, the loader keeps no frame in this process
+        self._file = DatasetCache(path, loader=lambda path, version: None)
+        self._snapshot: Optional[PoolSnapshot] = None
+        # Id of the last booking appended through the API, None while there is none
+        self._last_id: Optional[int] = None
+        self._checked = float('-inf')
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> ProcessPoolExecutor:
+        # Spawned, not forked: the API process runs threads (event loop, database executor) that a fork would
+        # copy in the middle of whatever they hold
+        executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_start_worker, initargs=(self.path,))
+        # Workers start on demand, one task each brings them all up and loading at once
+        for _ in range(self.workers):
+            executor.submit(_ready)
+        return executor
+
+    def _running(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._start()
+            return self._executor
+
+    def submit(self, func: Callable, *args) -> Future:
+        executor = self._running()
+        try:
+            return executor.submit(func, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory), the tasks it had fail and the pool is replaced
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            return self._running().submit(func, *args)
+
+    def _appended_due(self) -> bool:
+        return time.monotonic() - self._checked >= FACTS_CHECK_INTERVAL
+
+    def get(self) -> PoolSnapshot:
+        dataset = self._file.get()
+        if self._appended_due():
+            # Looked up again at most every FACTS_CHECK_INTERVAL seconds, kept while the database is down
+            last_id = read_last_appended_id()
+            self._checked = time.monotonic()
+            if last_id is not None:
+                self._last_id = last_id
+        version = dataset.version if self._last_id is None else f'{dataset.version}+{self._last_id}'
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != version or snapshot.mtime != dataset.mtime:
+            snapshot = self._snapshot = PoolSnapshot(self, version, dataset.mtime, self._last_id)
+        return snapshot
+
+    def invalidate(self):
+        # Bookings were appended, the next get() looks up the last id
+        self._checked = float('-inf')
+
+    def stale(self) -> bool:
+        return self._appended_due() or self._file.stale()
+
+    def start(self):
+        self.submit(_ready)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            # Waiting lets the workers exit with the server instead of staying behind on their queue
+            executor.shutdown(wait=True, cancel_futures=True)
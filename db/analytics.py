@@ -0,0 +1,134 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import Float, Select, func, literal, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from config import FACTS_CHECK_INTERVAL
+from dataset.aggregate import AggregateQuery
+from db.database import engine as default_engine
+from db.ingest import last_appended_id, source_mtime, source_version
+from db.models import DERIVED_FACT_COLUMNS, BookingFacts
+
+# SQL backend of the analytics: dataset.aggregate queries compiled to aggregates over booking_facts, which
+# db.ingest fills with every booking field and the derived report columns. The results match the pandas backend,
+# float sums may differ in the last digits.
+
+facts = BookingFacts.__table__
+
+# Groups of these columns are ordered by the calendar instead of by name, like the ordered categoricals in pandas
+ORDER_COLUMNS = {'booking_date_month': facts.c.booking_month_number, 'arrival_day_name': facts.c.arrival_weekday}
+FUNCTIONS = {'sum': func.sum, 'mean': func.avg, 'min': func.min, 'max': func.max}
+# The fields of a booking as the nationality listing returns them, missing numbers are 0 like in the pandas one
+BOOKING_FIELDS = [func.coalesce(column, literal(0.0)).label(column.name) if column.nullable and isinstance(
+    column.type, Float) else column for column in facts.columns if column.name not in ('id', *DERIVED_FACT_COLUMNS)]
+
+
+def aggregate_statement(query: AggregateQuery) -> Select:
+    metrics = []
+    for name, (function, column) in zip(query.metric_names, query.metrics):
+        if function == 'count':
+            metrics.append(func.count().label(name))
+        elif function == 'sum':
+            # pandas sums an empty selection to 0, SQL to NULL
+            metrics.append(func.coalesce(func.sum(facts.c[column]), 0).label(name))
+        else:
+            metrics.append(FUNCTIONS[function](facts.c[column]).label(name))
+
+    groups = [facts.c[column] for column in query.group_by]
+    order = [ORDER_COLUMNS.get(column, facts.c[column]) for column in query.group_by]
+    statement = select(*groups, *metrics).select_from(facts)
+
+    for column, values in query.filters:
+        statement = statement.where(facts.c[column].in_(values))
+    if query.period is not None:
+        start, end = query.period
+        if start is not None:
+            statement = statement.where(facts.c.booking_date >= start)
+        if end is not None:
+            statement = statement.where(facts.c.booking_date <= end)
+    if groups:
+        # pandas leaves out the groups of missing values
+        statement = statement.where(*[group.is_not(None) for group in groups])
+        statement = statement.group_by(*groups, *[ORDER_COLUMNS[column] for column in query.group_by
+                                                  if column in ORDER_COLUMNS])
+
+    if query.sort:
+        name, descending = query.sort
+        key = ORDER_COLUMNS.get(name, facts.c[name]) if name in query.group_by else dict(
+            zip(query.metric_names, metrics))[name]
+        key = key.desc() if descending else key.asc()
+        # Equal keys keep the group order, as with the stable sort in pandas
+        order = [key, *order]
+    statement = statement.order_by(*order)
+
+    if query.limit:
+        statement = statement.limit(query.limit)
+    return statement
+
+
+@dataclass(frozen=True)
+class FactsSnapshot:
+    engine: Engine
+    version: Optional[str]
+    mtime: Optional[float]
+
+    def aggregate(self, query: AggregateQuery) -> list[dict]:
+        with self.engine.connect() as connection:
+            return [dict(row) for row in connection.execute(aggregate_statement(query)).mappings()]
+
+
+class FactsSource:
+    def __init__(self, engine: Engine, check_interval: float):
+        self.engine = engine
+        self.check_interval = check_interval
+        self._snapshot: Optional[FactsSnapshot] = None
+        self._checked = float('-inf')
+        self._lock = threading.Lock()
+
+    def get(self) -> FactsSnapshot:
+        # The version is the ingested file's digest and the id of the last booking appended through the API,
+        # they are looked up again at most every check_interval seconds
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked < self.check_interval:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._checked >= self.check_interval:
+                with self.engine.connect() as connection:
+                    version, mtime = source_version(connection), source_mtime(connection)
+                    last_id = last_appended_id(connection)
+                    if version is not None and last_id is not None:
+                        version = f'{version}+{last_id}'
+                self._checked = time.monotonic()
+                if self._snapshot is None or self._snapshot.version != version:
+                    self._snapshot = FactsSnapshot(self.engine, version, mtime)
+            return self._snapshot
+
+    def invalidate(self):
+        # Bookings were appended, the next get() looks up the version again
+        self._checked = float('-inf')
+
+    def stale(self) -> bool:
+        snapshot = self._snapshot
+        return snapshot is None or self.get() is not snapshot
+
+
+def nationality_statement(country: str, after: Optional[int] = None) -> Select:
+    statement = select(*BOOKING_FIELDS).where(facts.c.country == country).order_by(facts.c.id)
+    if after is not None:
+        statement = statement.where(facts.c.id > after)
+    return statement
+
+
+def nationality_bookings(db: Session, country: str, limit: int,
+                         after: Optional[int] = None) -> list[tuple[int, dict]]:
+    # Pairs of the booking id, for the cursor, and the booking fields
+    statement = nationality_statement(country, after).add_columns(facts.c.id).limit(limit)
+    return [(row[-1], dict(zip(statement.selected_columns.keys()[:-1], row[:-1])))
+            for row in db.execute(statement)]
+
+
+bookings_facts = FactsSource(default_engine, FACTS_CHECK_INTERVAL)
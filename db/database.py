@@ -1,12 +1,26 @@
-from typing import Generator
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Generator, TypeVar
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from config import DB_URI
+from config import DB_URI, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_STREAM_CONCURRENCY
 
-engine = create_engine(DB_URI, connect_args={"check_same_thread": False})
+T = TypeVar('T')
+
+# One executor thread per pooled connection: a query never waits for a connection inside a thread,
+# and requests beyond the pool size queue in the executor instead of blocking the event loop.
+engine = create_engine(DB_URI, connect_args={"check_same_thread": False},
+                       pool_size=DB_POOL_SIZE, max_overflow=0, pool_timeout=DB_POOL_TIMEOUT)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix='db')
+# NDJSON exports hold their connection for the whole stream, they take theirs from a pool of their own so the
+# queries above never wait for one (see endpoints.pagination)
+stream_engine = create_engine(DB_URI, connect_args={"check_same_thread": False},
+                              pool_size=DB_STREAM_CONCURRENCY, max_overflow=0, pool_timeout=DB_POOL_TIMEOUT)
+StreamSession = sessionmaker(autocommit=False, autoflush=False, bind=stream_engine)
 
 
 def get_db() -> Generator:
@@ -15,3 +29,16 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+def _call_with_session(func: Callable[..., T], args: tuple) -> T:
+    # The session lives only for this call: a connection is never held by a request that is awaiting something
+    # else, which would let waiting requests take every executor thread while the connections sit idle.
+    with SessionLocal() as db:
+        return func(db, *args)
+
+
+async def run_in_db(func: Callable[..., T], *args) -> T:
+    # The call runs in the request's context, for the query metrics of monitoring.metrics
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(db_executor, context.run, _call_with_session, func, args)
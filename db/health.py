@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from config import DB_FAILURE_THRESHOLD, DB_HEALTH_INTERVAL, DB_RESET_TIMEOUT
+from db import queries
+from db.database import run_in_db
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_probe: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # Let traffic through again, the next outcome decides whether the circuit closes or reopens
+            return HALF_OPEN
+        return OPEN
+
+    def allow_request(self) -> bool:
+        return self.state != OPEN
+
+    def retry_after(self) -> int:
+        if self.opened_at is None:
+            return 0
+        return max(1, round(self.opened_at + self.reset_timeout - time.monotonic()))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+database_breaker = CircuitBreaker(DB_FAILURE_THRESHOLD, DB_RESET_TIMEOUT)
+
+
+async def probe_database(breaker: CircuitBreaker = database_breaker, interval: float = DB_HEALTH_INTERVAL):
+    while True:
+        try:
+            await run_in_db(queries.ping)
+        except Exception:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        breaker.last_probe = time.time()
+        await asyncio.sleep(interval)
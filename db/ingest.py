@@ -0,0 +1,218 @@
+import argparse
+import os
+import time
+from typing import Callable, Optional
+
+import pandas as pd
+from sqlalchemy import Float, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from config import DATASET_PATH, INGEST_CHUNKSIZE
+from dataset.cache import file_digest
+from dataset.enrich import arrive_dates, enrich_bookings
+from dataset.live import FIRST_APPENDED_ID
+from db.database import engine as default_engine
+from db.models import DERIVED_FACT_COLUMNS, Base, BookingFacts, Bookings, DatasetMeta
+from db.search import create_search_indexes, drop_search_indexes
+
+COLUMNS = ['id', 'booking_date', 'length_of_stay', 'guest_name', 'daily_rate']
+FACT_COLUMNS = list(BookingFacts.__table__.columns.keys())
+# booking_facts holds every field of the file, the bookings table is filled from the same chunks
+CSV_COLUMNS = [{'phone_number': 'phone-number'}.get(name, name) for name in FACT_COLUMNS
+               if name != 'id' and name not in DERIVED_FACT_COLUMNS]
+
+
+def upsert_statement(table: str, columns: list[str]) -> str:
+    # Rows that did not change are skipped, so re-ingesting the same file does not rewrite pages
+    # or fire the search triggers
+    return f"""
+        INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+        ON CONFLICT(id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns[1:])}
+        WHERE {' OR '.join(f'{table}.{c} IS NOT excluded.{c}' for c in columns[1:])}
+    """
+
+
+UPSERT = upsert_statement('bookings', COLUMNS)
+FACTS_UPSERT = upsert_statement('booking_facts', FACT_COLUMNS)
+
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+]
+
+
+def booking_rows(df: pd.DataFrame) -> list[tuple]:
+    booking_date = arrive_dates(df) - pd.to_timedelta(df['lead_time'], unit='D')
+    columns = [
+        # read_csv keeps counting the index across chunks, so it is the row number in the file
+        df.index.tolist(),
+        booking_date.to_numpy().astype('datetime64[D]').astype(str).tolist(),
+        (df['stays_in_weekend_nights'] + df['stays_in_week_nights']).tolist(),
+        df['name'].tolist(),
+        df['adr'].tolist(),
+    ]
+    return list(zip(*columns))
+
+
+def _values(column) -> list:
+    # sqlite3 takes None for NULL, not NaN
+    column = pd.Series(column)
+    if column.hasnans:
+        return column.astype(object).where(column.notna(), None).tolist()
+    return column.tolist()
+
+
+def fact_rows(df: pd.DataFrame) -> list[tuple]:
+    df = enrich_bookings(df).rename(columns={'phone-number': 'phone_number'})
+    derived = {
+        'booking_date': df['booking_date'].to_numpy().astype('datetime64[D]').astype(str),
+        'booking_date_month': df['booking_date_month'].astype(str),
+        'booking_month_number': df['booking_date_month'].cat.codes + 1,
+        'arrival_day_name': df['arrival_day_name'].astype(str),
+        'arrival_weekday': df['arrival_day_name'].cat.codes,
+    }
+    columns = [df.index.tolist()] + [_values(derived[name] if name in derived else df[name])
+                                     for name in FACT_COLUMNS[1:]]
+    return list(zip(*columns))
+
+
+def source_version(connection: Connection) -> str:
+    return connection.scalar(select(DatasetMeta.value).where(DatasetMeta.key == 'source_version'))
+
+
+def source_mtime(connection: Connection) -> Optional[float]:
+    # Modification time of the ingested file, the Last-Modified of everything answered from the database
+    value = connection.scalar(select(DatasetMeta.value).where(DatasetMeta.key == 'source_mtime'))
+    return float(value) if value is not None else None
+
+
+def set_meta(connection: Connection, key: str, value: str):
+    connection.execute(text("INSERT INTO dataset_meta (key, value) VALUES (:key, :value) "
+                            "ON CONFLICT(key) DO UPDATE SET value = excluded.value"), {'key': key, 'value': value})
+
+
+def set_source_version(connection: Connection, version: str, mtime: float):
+    set_meta(connection, 'source_version', version)
+    set_meta(connection, 'source_mtime', repr(mtime))
+
+
+def last_appended_id(connection: Connection) -> Optional[int]:
+    # Id of the last booking added through the API, None while there is none
+    value = connection.scalar(select(DatasetMeta.value).where(DatasetMeta.key == 'last_appended_id'))
+    return int(value) if value is not None else None
+
+
+def append_bookings(db: Session, bookings: list[dict]) -> list[int]:
+    # Bookings added through the API take the ids after the last appended one, from FIRST_APPENDED_ID on, the rows
+    # of the file keep their row number. The write lock is taken before the last id is read, so concurrent writers
+    # never pick the same ids and the ids are committed in order, which lets readers follow the appended rows by id
+    # (see dataset.live).
+    df = pd.DataFrame(bookings).rename(columns={'phone_number': 'phone-number'})[CSV_COLUMNS]
+    connection = db.connection()
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+    first = max(last_appended_id(connection) or 0, FIRST_APPENDED_ID - 1) + 1
+    df.index = pd.RangeIndex(first, first + len(df))
+    connection.exec_driver_sql(UPSERT, booking_rows(df))
+    connection.exec_driver_sql(FACTS_UPSERT, fact_rows(df))
+    set_meta(connection, 'last_appended_id', str(df.index[-1]))
+    db.commit()
+    return df.index.tolist()
+
+
+def appended_bookings(connection: Connection, after: int) -> pd.DataFrame:
+    # The bookings after the given id with the fields of the file, indexed by id
+    columns = ['id', *(name for name in FACT_COLUMNS[1:] if name not in DERIVED_FACT_COLUMNS)]
+    statement = text(f"SELECT {', '.join(columns)} FROM booking_facts WHERE id > :after ORDER BY id")
+    # Columns without a value in any of the rows would come back as objects
+    floats = {column.name: 'float64' for column in BookingFacts.__table__.columns
+              if isinstance(column.type, Float) and column.name in columns}
+    df = pd.read_sql(statement, connection, params={'after': after}, index_col='id', dtype=floats)
+    return df.rename(columns={'phone_number': 'phone-number'})
+
+
+def prepare_table(connection: Connection, replace: bool) -> bool:
+    # Tables written by pandas' to_sql have no primary key to upsert on, those are rebuilt like --replace
+    if inspect(connection).get_pk_constraint('bookings')['constrained_columns'] != ['id']:
+        replace = True
+    empty = replace or connection.scalar(text("SELECT NOT EXISTS (SELECT 1 FROM bookings)"))
+    if replace:
+        drop_search_indexes(connection)
+        Bookings.__table__.drop(connection, checkfirst=True)
+        Bookings.__table__.create(connection)
+    if empty:
+        # Filling an empty table is faster without per-row index maintenance and search triggers,
+        # create_search_indexes() builds all of them in one pass at the end
+        drop_search_indexes(connection)
+        for index in Bookings.__table__.indexes:
+            index.drop(connection, checkfirst=True)
+    return empty
+
+
+def prepare_facts(connection: Connection, replace: bool) -> bool:
+    facts = BookingFacts.__table__
+    if replace:
+        facts.drop(connection, checkfirst=True)
+        facts.create(connection)
+    empty = replace or connection.scalar(text("SELECT NOT EXISTS (SELECT 1 FROM booking_facts)"))
+    if empty:
+        for index in facts.indexes:
+            index.drop(connection, checkfirst=True)
+    return empty
+
+
+def ingest_csv(path: str = DATASET_PATH, engine: Engine = default_engine, chunksize: int = INGEST_CHUNKSIZE,
+               replace: bool = False, force: bool = False,
+               progress: Optional[Callable[[int, float], None]] = None) -> dict:
+    # progress is called after every chunk with the rows ingested so far and the seconds since the start
+    Base.metadata.create_all(bind=engine)
+    mtime = os.stat(path).st_mtime
+    version = file_digest(path)
+
+    start = time.perf_counter()
+    with engine.connect() as connection:
+        with connection.begin():
+            for pragma in PRAGMAS:
+                connection.exec_driver_sql(pragma)
+            # Databases ingested before booking_facts existed have the version but no facts yet
+            facts_missing = connection.scalar(text("SELECT NOT EXISTS (SELECT 1 FROM booking_facts)"))
+            if not (replace or force or facts_missing) and source_version(connection) == version:
+                return {'rows': 0, 'seconds': 0.0, 'rows_per_second': 0.0, 'skipped': True}
+            rebuild_indexes = prepare_table(connection, replace)
+            rebuild_fact_indexes = prepare_facts(connection, replace)
+
+        rows = 0
+        for chunk in pd.read_csv(path, usecols=CSV_COLUMNS, chunksize=chunksize):
+            # One transaction per chunk: large batches without holding the whole file in a single transaction
+            with connection.begin():
+                batch = booking_rows(chunk)
+                connection.exec_driver_sql(UPSERT, batch)
+                connection.exec_driver_sql(FACTS_UPSERT, fact_rows(chunk))
+            rows += len(batch)
+            if progress is not None:
+                progress(rows, time.perf_counter() - start)
+
+        with connection.begin():
+            if rebuild_indexes:
+                create_search_indexes(connection)
+            if rebuild_fact_indexes:
+                for index in BookingFacts.__table__.indexes:
+                    index.create(connection, checkfirst=True)
+            set_source_version(connection, version, mtime)
+
+    elapsed = time.perf_counter() - start
+    return {'rows': rows, 'seconds': round(elapsed, 2), 'rows_per_second': round(rows / elapsed), 'skipped': False}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load the bookings CSV into the database')
+    parser.add_argument('csv', nargs='?', default=DATASET_PATH)
+    parser.add_argument('--chunksize', type=int, default=INGEST_CHUNKSIZE)
+    parser.add_argument('--replace', action='store_true',
+                        help='drop and rebuild the tables instead of upserting, bookings added through the API too')
+    parser.add_argument('--force', action='store_true', help='ingest even if this file was already ingested')
+    args = parser.parse_args()
+    print(ingest_csv(args.csv, chunksize=args.chunksize, replace=args.replace, force=args.force,
+                     progress=lambda rows, elapsed: print(f'ingested {rows} rows, {rows / elapsed:.0f} rows/s')))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date
+from sqlalchemy import Column, Integer, String, Float, Date, Index
 from sqlalchemy.orm import DeclarativeBase
 
 
@@ -11,6 +11,83 @@ class Bookings(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     booking_date = Column(Date)
-    length_of_stay = Column(Integer)
+    length_of_stay = Column(Integer, index=True)
     guest_name = Column(String)
     daily_rate = Column(Float)
+
+    # Serves booking_date alone through its leftmost column and booking_date + length_of_stay together
+    __table_args__ = (Index('ix_bookings_booking_date_length_of_stay', 'booking_date', 'length_of_stay'),)
+
+
+# Columns of booking_facts computed from the booking fields, see dataset.enrich
+DERIVED_FACT_COLUMNS = ('booking_date', 'booking_date_year', 'booking_date_month', 'booking_month_number',
+                        'arrival_day_name', 'arrival_weekday', 'length_of_stay', 'revenue', 'total_guest')
+
+
+class BookingFacts(Base):
+    # Every field of a booking plus the derived columns the reports group by, for the SQL analytics backend.
+    # Month and weekday names come with their number so groups can be ordered by the calendar.
+    __tablename__ = 'booking_facts'
+
+    id = Column(Integer, primary_key=True)
+    hotel = Column(String)
+    is_canceled = Column(Integer)
+    lead_time = Column(Integer)
+    arrival_date_year = Column(Integer)
+    arrival_date_month = Column(String)
+    arrival_date_week_number = Column(Integer)
+    arrival_date_day_of_month = Column(Integer)
+    stays_in_weekend_nights = Column(Integer)
+    stays_in_week_nights = Column(Integer)
+    adults = Column(Integer)
+    children = Column(Float)
+    babies = Column(Integer)
+    meal = Column(String)
+    country = Column(String)
+    market_segment = Column(String)
+    distribution_channel = Column(String)
+    is_repeated_guest = Column(Integer)
+    previous_cancellations = Column(Integer)
+    previous_bookings_not_canceled = Column(Integer)
+    reserved_room_type = Column(String)
+    assigned_room_type = Column(String)
+    booking_changes = Column(Integer)
+    deposit_type = Column(String)
+    agent = Column(Float)
+    company = Column(Float)
+    days_in_waiting_list = Column(Integer)
+    customer_type = Column(String)
+    adr = Column(Float)
+    required_car_parking_spaces = Column(Integer)
+    total_of_special_requests = Column(Integer)
+    reservation_status = Column(String)
+    reservation_status_date = Column(String)
+    name = Column(String)
+    email = Column(String)
+    phone_number = Column(String)
+    credit_card = Column(String)
+
+    booking_date = Column(Date)
+    booking_date_year = Column(Integer)
+    booking_date_month = Column(String)
+    booking_month_number = Column(Integer)
+    arrival_day_name = Column(String)
+    arrival_weekday = Column(Integer)
+    length_of_stay = Column(Integer)
+    revenue = Column(Float)
+    total_guest = Column(Float)
+
+    # country serves the nationality listing (the index ends with the rowid, so rows come in id order) and
+    # the per-country reports, the next two the reports filtered by hotel or by cancellation, booking_date
+    # the reports of a period
+    __table_args__ = (Index('ix_booking_facts_country', 'country'),
+                      Index('ix_booking_facts_hotel_is_canceled', 'hotel', 'is_canceled'),
+                      Index('ix_booking_facts_is_canceled_booking_date_year', 'is_canceled', 'booking_date_year'),
+                      Index('ix_booking_facts_booking_date', 'booking_date'))
+
+
+class DatasetMeta(Base):
+    __tablename__ = 'dataset_meta'
+
+    key = Column(String, primary_key=True)
+    value = Column(String)
@@ -0,0 +1,74 @@
+from typing import Optional
+
+from sqlalchemy import RowMapping, Select, select, text
+from sqlalchemy.orm import Session
+
+from db.models import Bookings
+from db.search import bookings_fts
+
+# Blocking query helpers, the endpoints run them on db.database.db_executor via run_in_db,
+# which opens the session passed as the first argument.
+# Listings are keyset paginated: rows come ordered by id and `after` is the last id of the previous page.
+# They select plain columns instead of ORM entities, the rows are encoded to JSON as they are.
+
+BOOKING_COLUMNS = tuple(Bookings.__table__.columns)
+
+
+def ping(db: Session):
+    db.execute(text("SELECT 1"))
+
+
+def list_statement(after: Optional[int] = None, columns: tuple = (Bookings,)) -> Select:
+    statement = select(*columns).order_by(Bookings.id)
+    if after is not None:
+        statement = statement.where(Bookings.id > after)
+    return statement
+
+
+def list_bookings(db: Session, limit: int, after: Optional[int] = None) -> list[RowMapping]:
+    return db.execute(list_statement(after, BOOKING_COLUMNS).limit(limit)).mappings().all()
+
+
+def search_statement(guest_name: Optional[str], booking_date: Optional[str], length_of_stay: Optional[int],
+                     after: Optional[int] = None, columns: tuple = (Bookings,)) -> Select:
+    statement = select(*columns)
+    order = Bookings.id
+
+    if guest_name and len(guest_name) >= 3:
+        # A quoted phrase of trigrams matches exactly the rows containing the substring. Driving the join from the
+        # index in rowid order lets LIMIT stop after the first matches instead of collecting all of them.
+        phrase = '"' + guest_name.replace('"', '""') + '"'
+        statement = statement.join(bookings_fts, bookings_fts.c.rowid == Bookings.id).where(
+            bookings_fts.c.guest_name.match(phrase))
+        order = bookings_fts.c.rowid
+    elif guest_name:
+        # Shorter strings have no trigram to look up
+        statement = statement.where(Bookings.guest_name.contains(guest_name))
+
+    if booking_date:
+        statement = statement.where(Bookings.booking_date == booking_date)
+
+    if length_of_stay:
+        statement = statement.where(Bookings.length_of_stay == length_of_stay)
+
+    if after is not None:
+        statement = statement.where(order > after)
+
+    return statement.order_by(order)
+
+
+def search_bookings(db: Session, guest_name: Optional[str], booking_date: Optional[str],
+                    length_of_stay: Optional[int], limit: int, after: Optional[int] = None) -> list[RowMapping]:
+    statement = search_statement(guest_name, booking_date, length_of_stay, after, BOOKING_COLUMNS)
+    return db.execute(statement.limit(limit)).mappings().all()
+
+
+def get_booking(db: Session, booking_id: int) -> Optional[RowMapping]:
+    return db.execute(select(*BOOKING_COLUMNS).where(Bookings.id == booking_id)).mappings().first()
+
+
+def get_bookings_by_ids(db: Session, booking_ids: list[int]) -> list[RowMapping]:
+    # One IN query for the whole batch, the rows come back in the order of the requested ids
+    rows = db.execute(select(*BOOKING_COLUMNS).where(Bookings.id.in_(booking_ids))).mappings().all()
+    by_id = {row['id']: row for row in rows}
+    return [by_id[booking_id] for booking_id in booking_ids if booking_id in by_id]
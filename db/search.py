@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, MetaData, String, Table, inspect, text
+
+from db.models import Bookings
+
+# Trigram full-text index over bookings.guest_name. An FTS5 trigram table answers LIKE '%...%' from its
+# index for patterns of three or more characters, so substring search keeps the semantics of
+# Bookings.guest_name.contains() without scanning the bookings table. It is an external-content table:
+# it stores only the index and the triggers below keep it in sync with bookings.
+bookings_fts = Table('bookings_fts', MetaData(), Column('rowid', Integer), Column('guest_name', String))
+
+CREATE_STATEMENTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS bookings_fts
+       USING fts5(guest_name, content='bookings', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS bookings_fts_insert AFTER INSERT ON bookings BEGIN
+         INSERT INTO bookings_fts(rowid, guest_name) VALUES (new.id, new.guest_name);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS bookings_fts_delete AFTER DELETE ON bookings BEGIN
+         INSERT INTO bookings_fts(bookings_fts, rowid, guest_name) VALUES ('delete', old.id, old.guest_name);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS bookings_fts_update AFTER UPDATE OF guest_name ON bookings BEGIN
+         INSERT INTO bookings_fts(bookings_fts, rowid, guest_name) VALUES ('delete', old.id, old.guest_name);
+         INSERT INTO bookings_fts(rowid, guest_name) VALUES (new.id, new.guest_name);
+       END""",
+]
+
+DROP_STATEMENTS = [
+    "DROP TRIGGER IF EXISTS bookings_fts_insert",
+    "DROP TRIGGER IF EXISTS bookings_fts_delete",
+    "DROP TRIGGER IF EXISTS bookings_fts_update",
+    "DROP TABLE IF EXISTS bookings_fts",
+]
+
+
+def create_search_indexes(connection):
+    # Covers databases created before the indexes existed: create_all() skips tables that are already there
+    for index in Bookings.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+    exists = inspect(connection).has_table('bookings_fts')
+    for statement in CREATE_STATEMENTS:
+        connection.execute(text(statement))
+    if not exists:
+        connection.execute(text("INSERT INTO bookings_fts(bookings_fts) VALUES ('rebuild')"))
+
+
+def drop_search_indexes(connection):
+    for statement in DROP_STATEMENTS:
+        connection.execute(text(statement))
@@ -0,0 +1,130 @@
+import inspect
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+from sqlalchemy.exc import OperationalError
+from starlette.concurrency import run_in_threadpool
+
+from config import HTTP_CACHE_MAX_AGE
+from dataset.materialized import analytics_source, bookings_reports
+from db.analytics import bookings_facts
+from db.health import CLOSED, database_breaker
+from endpoints.coalescing import report_flights
+
+# Conditional GETs for the read endpoints. Everything they return changes only with the dataset, so its version
+# is the ETag and its file's modification time the Last-Modified (until bookings are appended through the API).
+# A dependency answers revalidations with 304 before the endpoint runs; the validators of a full response are added
+# by CacheHeadersMiddleware, as endpoints return their Response directly.
+
+STATE_KEY = 'cache_headers'
+
+
+def _etag(version: str, request: Request) -> str:
+    # Weak: the same data can go out in several encodings. The Accept header selects the representation
+    # (JSON, NDJSON, CSV or Arrow), so it is part of the tag.
+    variant = zlib.crc32(request.headers.get('accept', '').encode('latin-1'))
+    # The file's digest is shortened, the id of the last appended booking kept
+    digest, separator, last_id = version.partition('+')
+    return f'W/"{digest[:32]}{separator}{last_id}-{variant:08x}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison, as If-None-Match requires
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag.removeprefix('W/') in tags
+
+
+def _not_modified_since(if_modified_since: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def conditional(snapshot_of: Callable[[], object], private: bool = False):
+    # snapshot_of returns what the endpoint answers from, anything with version and mtime. Plain functions run in
+    # the thread pool: they wait for the dataset while it loads and look up appended bookings in the database.
+    cache_control = f"{'private' if private else 'public'}, max-age={HTTP_CACHE_MAX_AGE}"
+
+    async def dependency(request: Request):
+        try:
+            if inspect.iscoroutinefunction(snapshot_of):
+                snapshot = await snapshot_of()
+            else:
+                snapshot = await run_in_threadpool(snapshot_of)
+        except OperationalError:
+            # The endpoint reports the database error itself
+            return
+        version: Optional[str] = getattr(snapshot, 'version', None)
+        if version is None:
+            return
+
+        headers = {'ETag': _etag(version, request), 'Cache-Control': cache_control, 'Vary': 'Accept'}
+        mtime = getattr(snapshot, 'mtime', None)
+        if '+' in version:
+            # Bookings were appended since the file, they are not dated by it and only the ETag validates them
+            mtime = None
+        if mtime is not None:
+            headers['Last-Modified'] = formatdate(mtime, usegmt=True)
+
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None:
+            not_modified = _matches(if_none_match, headers['ETag'])
+        else:
+            if_modified_since = request.headers.get('if-modified-since')
+            not_modified = if_modified_since is not None and mtime is not None and _not_modified_since(
+                if_modified_since, mtime)
+        if not_modified:
+            raise HTTPException(status_code=304, headers=headers)
+        setattr(request.state, STATE_KEY, headers)
+
+    return dependency
+
+
+async def report_snapshot():
+    # The first request computes every report, off the event loop so the other requests are served meanwhile.
+    # Requests arriving before it is done wait for the same computation instead of blocking a thread each.
+    if not bookings_reports.ready:
+        return await report_flights.run('reports', bookings_reports.snapshot)
+    # Checking the source for a new version can ask the database
+    return await run_in_threadpool(bookings_reports.snapshot)
+
+
+# Reports are validated against the snapshot their payloads were computed from, which lags the dataset while
+# a refresh runs. Listings from the database against the ingested file, aggregations against the current dataset.
+# Responses with personal data (guest names, the contact and card fields) are private: no shared cache stores them.
+report_cache = conditional(report_snapshot)
+private_report_cache = conditional(report_snapshot, private=True)
+dataset_cache = conditional(analytics_source.get)
+private_dataset_cache = conditional(analytics_source.get, private=True)
+
+
+def database_snapshot():
+    # While the circuit is open the database is not asked for its version, the responses just go without validators
+    return bookings_facts.get() if database_breaker.state == CLOSED else None
+
+
+private_database_cache = conditional(database_snapshot, private=True)
+
+
+class CacheHeadersMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_validators(message):
+            if message['type'] == 'http.response.start' and message['status'] == 200:
+                headers = scope.get('state', {}).get(STATE_KEY)
+                if headers:
+                    message['headers'] = [*message.get('headers', []),
+                                          *[(k.lower().encode('latin-1'), v.encode('latin-1'))
+                                            for k, v in headers.items()]]
+            await send(message)
+
+        await self.app(scope, receive, send_with_validators)
@@ -0,0 +1,122 @@
+import asyncio
+import math
+import time
+from collections import Counter
+from typing import Callable, Hashable, Optional, TypeVar
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from config import ANALYTICS_CONCURRENCY, ANALYTICS_KEY_CONCURRENCY, ANALYTICS_KEY_QUEUE_SIZE, ANALYTICS_QUEUE_SIZE
+from monitoring.metrics import COALESCED_REQUESTS, SHED_REQUESTS
+
+# Single-flight execution of the expensive analytics. Concurrent requests for the same key share one in-flight
+# computation instead of each running it, e.g. the burst of identical report requests of a dashboard refresh.
+# Distinct computations of a group run at most `concurrency` at a time in the thread pool; once `queue_size` of
+# them wait for a slot new ones are refused with 503 and a Retry-After, rather than piling up threads.
+# The same holds per limit key, the computation the request asks for without its parameters (a report over any
+# period, an aggregation with any filters): at most `key_concurrency` of its flights run and `key_queue_size` wait,
+# so one hot report cannot take every slot and queue place of its group. A flight holds its key's slot while it
+# waits for a slot of the group.
+# The phases of a computation are attributed to the request that started it.
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    def __init__(self, group: str, concurrency: int, queue_size: int, key_concurrency: int, key_queue_size: int):
+        self.group = group
+        self.queue_size = queue_size
+        self.key_concurrency = key_concurrency
+        self.key_queue_size = key_queue_size
+        self._slots = asyncio.Semaphore(concurrency)
+        self._concurrency = concurrency
+        self._flights: dict[Hashable, asyncio.Future] = {}
+        # Flights are counted as waiting from the moment they are admitted, until they hold their slots and run
+        self._waiting = 0
+        self._running = 0
+        # Per limit key with flights: its slots, its flights and how many of them wait for a slot or run
+        self._key_slots: dict[Hashable, asyncio.Semaphore] = {}
+        self._key_flights: Counter = Counter()
+        self._key_waiting: Counter = Counter()
+        self._key_running: Counter = Counter()
+        # Moving average of the computation time, for the Retry-After of refused requests
+        self._duration = 1.0
+
+    async def run(self, key: Hashable, func: Callable[..., T], *args, limit_key: Optional[Hashable] = None) -> T:
+        # limit_key defaults to the key itself
+        limit_key = key if limit_key is None else limit_key
+        flight = self._flights.get(key)
+        if flight is not None:
+            COALESCED_REQUESTS.inc(self.group)
+        else:
+            if self._queued() >= self.queue_size or self._key_queued(limit_key) >= self.key_queue_size:
+                SHED_REQUESTS.inc(self.group)
+                raise HTTPException(status_code=503, detail="Server is busy, retry later",
+                                    headers={"Retry-After": str(self.retry_after(limit_key))})
+            if not self._key_flights[limit_key]:
+                self._key_slots[limit_key] = asyncio.Semaphore(self.key_concurrency)
+            self._key_flights[limit_key] += 1
+            self._waiting += 1
+            self._key_waiting[limit_key] += 1
+            flight = self._flights[key] = asyncio.ensure_future(self._compute(limit_key, func, *args))
+            flight.add_done_callback(lambda done: self._finished(key, limit_key, done))
+        # A client that disconnects cancels its own wait, not the computation the others share
+        return await asyncio.shield(flight)
+
+    async def _compute(self, limit_key: Hashable, func: Callable[..., T], *args) -> T:
+        key_slots = self._key_slots[limit_key]
+        try:
+            await key_slots.acquire()
+            try:
+                await self._slots.acquire()
+            except BaseException:
+                key_slots.release()
+                raise
+        finally:
+            self._waiting -= 1
+            self._key_waiting[limit_key] -= 1
+            if not self._key_waiting[limit_key]:
+                del self._key_waiting[limit_key]
+        self._running += 1
+        self._key_running[limit_key] += 1
+        try:
+            start = time.perf_counter()
+            result = await run_in_threadpool(func, *args)
+            self._duration = 0.8 * self._duration + 0.2 * (time.perf_counter() - start)
+            return result
+        finally:
+            self._running -= 1
+            self._key_running[limit_key] -= 1
+            if not self._key_running[limit_key]:
+                del self._key_running[limit_key]
+            self._slots.release()
+            key_slots.release()
+
+    def _finished(self, key: Hashable, limit_key: Hashable, flight: asyncio.Future):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        self._key_flights[limit_key] -= 1
+        if not self._key_flights[limit_key]:
+            del self._key_flights[limit_key], self._key_slots[limit_key]
+        if not flight.cancelled():
+            # Marks the error as retrieved when every waiter went away before it was raised
+            flight.exception()
+
+    def _queued(self) -> int:
+        # The waiting flights beyond the free slots, those are taken by flights admitted but not started yet
+        return max(0, self._waiting - (self._concurrency - self._running))
+
+    def _key_queued(self, limit_key: Hashable) -> int:
+        return max(0, self._key_waiting[limit_key] - (self.key_concurrency - self._key_running[limit_key]))
+
+    def retry_after(self, limit_key: Optional[Hashable] = None) -> int:
+        # Seconds until the queue ahead, of the group or of the key if longer, has drained at the current pace
+        queued = max(self._queued() / self._concurrency, self._key_queued(limit_key) / self.key_concurrency)
+        return max(1, math.ceil(self._duration * (queued + 1)))
+
+
+report_flights = SingleFlight('reports', ANALYTICS_CONCURRENCY, ANALYTICS_QUEUE_SIZE, ANALYTICS_KEY_CONCURRENCY,
+                              ANALYTICS_KEY_QUEUE_SIZE)
+aggregate_flights = SingleFlight('aggregate', ANALYTICS_CONCURRENCY, ANALYTICS_QUEUE_SIZE, ANALYTICS_KEY_CONCURRENCY,
+                                 ANALYTICS_KEY_QUEUE_SIZE)
@@ -0,0 +1,96 @@
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional, clients are answered with gzip then
+    brotli = None
+
+# Response compression, preferring brotli over gzip when the client takes both. Bodies sent in one piece are
+# compressed when they reach the minimum size; streamed ones (the NDJSON exports) always, flushing every chunk
+# so the client still gets the rows as they are produced.
+
+GZIP_LEVEL = 6
+# The default quality 11 is meant for static files, 4 is about as fast as gzip and still smaller
+BROTLI_QUALITY = 4
+
+
+def _encoding(accept_encoding: str) -> Optional[str]:
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        name, _, value = params.partition('=')
+        if name.strip() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    # The highest quality wins, brotli on a tie
+    offered = [(qualities.get(coding, qualities.get('*', 0.0)), coding) for coding in ('br', 'gzip')
+               if coding != 'br' or brotli is not None]
+    quality, coding = max(offered, key=lambda offer: offer[0])
+    return coding if quality > 0 else None
+
+
+class _Compressor:
+    def __init__(self, coding: str):
+        if coding == 'br':
+            compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress, self.flush, self.finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.compress, self.finish = compressor.compress, compressor.flush
+            self.flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        coding = _encoding(Headers(scope=scope).get('accept-encoding', '')) if scope['type'] == 'http' else None
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        # The start message waits for the first body chunk, which decides whether the response is compressed
+        start = None
+        compressor: Optional[_Compressor] = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message['type'] == 'http.response.start':
+                start = message
+                return
+            if message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body, more_body = message.get('body', b''), message.get('more_body', False)
+            if start is not None:
+                headers = MutableHeaders(raw=start['headers'])
+                if 'content-encoding' not in headers and (more_body or len(body) >= self.minimum_size):
+                    compressor = _Compressor(coding)
+                    headers['Content-Encoding'] = coding
+                    headers.add_vary_header('Accept-Encoding')
+                    if 'content-length' in headers:
+                        del headers['Content-Length']
+                    if not more_body:
+                        body = compressor.compress(body) + compressor.finish()
+                        headers['Content-Length'] = str(len(body))
+                        compressor = None
+                        message = {**message, 'body': body}
+                await send(start)
+                start = None
+
+            if compressor is not None:
+                body = compressor.compress(body) + (compressor.flush() if more_body else compressor.finish())
+                message = {**message, 'body': body}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -1,29 +1,50 @@
-import pandas as pd
+from datetime import date
+from typing import Callable, Optional, TypeVar
 
-from sqlalchemy import create_engine
+from fastapi import HTTPException, Query
+from sqlalchemy.exc import OperationalError
+from starlette.concurrency import run_in_threadpool
 
+from dataset.aggregate import parse_period
+from dataset.cache import Dataset, bookings_dataset
+from db.database import run_in_db
+from db.health import database_breaker
+from monitoring.metrics import phase
 
-async def read_csv_bookings():
-    df = pd.read_csv('hotel_booking_data.csv')
-    return df
+T = TypeVar('T')
 
 
-def create_db_data():
-    df = pd.read_csv('hotel_booking_data.csv')
+async def read_bookings_dataset() -> Dataset:
+    # The frame is parsed once per process and shared, requests only select from it. Off the event loop: the first
+    # requests wait for the load and later ones may read appended bookings from the database.
+    with phase('dataset'):
+        return await run_in_threadpool(bookings_dataset.get)
 
-    df['guest_name'] = df['name']
-    df['daily_rate'] = df['adr']
-    df['length_of_stay'] = df['stays_in_weekend_nights'].astype(int) + df['stays_in_week_nights'].astype(int)
-    df['arrive_date'] = pd.to_datetime(
-        df['arrival_date_year'].astype(str) + '-' + df['arrival_date_month'].astype(str) + '-' + df[
-            'arrival_date_day_of_month'].astype(
-            str))
-    df['booking_date'] = df['arrive_date'].dt.date - pd.to_timedelta(df['lead_time'], unit='day')
 
-    df['id'] = df.index
+def report_period(date_from: date = Query(None, alias='from', description='First booking date, YYYY-MM-DD'),
+                  date_to: date = Query(None, alias='to', description='Last booking date, YYYY-MM-DD')
+                  ) -> Optional[tuple]:
+    # The booking date window of a report or an aggregation, both bounds included
+    try:
+        return parse_period(date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    df = df[['id', 'booking_date', 'length_of_stay', 'guest_name', 'daily_rate']]
 
-    engine = create_engine('sqlite:///hotel.db', echo=True)
+def ensure_database_available():
+    # While the circuit is open requests fail fast instead of waiting on a database that is down
+    if not database_breaker.allow_request():
+        raise HTTPException(status_code=503, detail="Database is unavailable",
+                            headers={"Retry-After": str(database_breaker.retry_after())})
+
+
+async def query_db(func: Callable[..., T], *args) -> T:
+    ensure_database_available()
+    try:
+        result = await run_in_db(func, *args)
+    except OperationalError:
+        database_breaker.record_failure()
+        raise HTTPException(status_code=503, detail="Database connection error")
+    database_breaker.record_success()
+    return result
 
-    df.to_sql('bookings', con=engine, if_exists='replace', index=False)
@@ -1,56 +1,136 @@
 from datetime import datetime
 
-import pandas as pd
-from pandas import DataFrame, to_datetime
+from pandas import DataFrame
 
-from typing import Annotated, List
+from typing import Annotated, List, Optional, Union
 
-from fastapi import Query, APIRouter, Depends, HTTPException
+from fastapi import Body, Query, APIRouter, Depends, HTTPException, Request, Response
+from fastapi.security import HTTPBasicCredentials
+from starlette.concurrency import run_in_threadpool
 
-from sqlalchemy import select, text
-from sqlalchemy.exc import OperationalError
-from sqlalchemy.orm import Session
+from config import ANALYTICS_BACKEND
 
-from endpoints.depends import read_csv_bookings
-from endpoints.shemas import GetBookings, AllBookings, GetStats, PopularMealPackage, AvgDailyRateResort, GetAnalysis, \
-    RepGuestPrecent, Country, RepeatGuest, TotalRevenue, CountMeal, MostCommonArrivalDayCity, TotalGuestByYear, \
-    TotalRevenueByCountry, AvgLengthOfStay
+from dataset.aggregate import parse_query
+from dataset.materialized import analytics_source, bookings_aggregates, bookings_reports, period_report
+from endpoints.caching import dataset_cache, private_database_cache, private_dataset_cache, private_report_cache, \
+    report_cache
+from endpoints.coalescing import aggregate_flights, report_flights
+from endpoints.depends import ensure_database_available, query_db, read_bookings_dataset, report_period
+from endpoints.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, next_page, stream_frame, stream_query, \
+    wants_ndjson
+from endpoints.responses import JSON, dumps, encode_rows, encoded_response, frame_response, model_encoder, negotiate, \
+    rows_response
+from endpoints.shemas import BookingIds, NewBooking, NewBookings, GetBookings, AllBookings, GetStats, \
+    PopularMealPackage, AvgDailyRateResort, GetAnalysis, RepGuestPrecent, Country, RepeatGuest, TotalRevenue, \
+    CountMeal, MostCommonArrivalDayCity, TotalGuestByYear, TotalRevenueByCountry, AvgLengthOfStay
 
-from security.security import verify_credentials
+from security.security import optional_security, verify_credentials
 
-from db import models
-from db.models import Bookings
-from db.database import engine, get_db
+from db import analytics, ingest, queries
+from db.analytics import bookings_facts
+from monitoring.metrics import phase
 
 router = APIRouter()
 
-models.Base.metadata.create_all(bind=engine)
+FORMATS_DESCRIPTION = ('`Accept: text/csv` returns the rows as CSV, `Accept: application/vnd.apache.arrow.stream` as an '
+                       'Arrow IPC stream.')
+PAGINATION_DESCRIPTION = ('Results are paged by booking id: pass the X-Next-Cursor response header back as `cursor` '
+                          'to get the next page. With `Accept: application/x-ndjson` all matching rows from `cursor` on '
+                          'are streamed as newline-delimited JSON instead, up to `limit` when it is given. '
+                          + FORMATS_DESCRIPTION)
+CURSOR_DESCRIPTION = 'The X-Next-Cursor header of the previous page'
+ALL_BOOKINGS_COLUMNS = list(AllBookings.model_fields)
+
+
+def all_bookings_rows(df: DataFrame) -> DataFrame:
+    # Missing values are filled on the returned rows only, categoricals cannot take the 0 filler
+    df = df.rename(columns={'phone-number': 'phone_number'})[ALL_BOOKINGS_COLUMNS]
+    return df.astype({name: object for name in df.select_dtypes('category')}).fillna(value=0)
+
+
+REPORT_MODELS = {
+    'stats': GetStats,
+    'analysis': GetAnalysis,
+    'popular_meal_package': PopularMealPackage,
+    'avg_length_of_stay': AvgLengthOfStay,
+    'total_revenue': TotalRevenue,
+    'top_countries': Country,
+    'repeated_guests_percentage': RepGuestPrecent,
+    'total_guests_by_year': TotalGuestByYear,
+    'avg_daily_rate_resort': AvgDailyRateResort,
+    'most_common_arrival_day_city': MostCommonArrivalDayCity,
+    'count_by_hotel_meal': CountMeal,
+    'total_revenue_resort_by_country': TotalRevenueByCountry,
+    'count_by_hotel_repeated_guest': RepeatGuest,
+}
+# Served by their own endpoints only with the credentials
+PRIVATE_REPORTS = {'avg_daily_rate_resort', 'most_common_arrival_day_city', 'count_by_hotel_meal',
+                   'total_revenue_resort_by_country', 'count_by_hotel_repeated_guest'}
+
+
+def report_encoder(model: type):
+    def encode(rows: list[dict]) -> bytes:
+        with phase('serialize'):
+            return model_encoder(model)(rows)
+
+    return encode
+
+
+async def period_reports(names: list[str], period: tuple) -> dict[str, list[dict]]:
+    reports = await report_flights.run((tuple(names), period),
+                                       lambda: {name: period_report(name, period) for name in names},
+                                       limit_key=tuple(names))
+    if any(rows is None for rows in reports.values()):
+        raise HTTPException(status_code=404, detail="No bookings found in the given period")
+    return reports
+
+
+async def report_response(request: Request, name: str, model: type, period: Optional[tuple] = None) -> Response:
+    media_type = negotiate(request)
+
+    def encode(rows: list[dict]) -> bytes:
+        if media_type == JSON:
+            return report_encoder(model)(rows)
+        with phase('serialize'):
+            return encode_rows(rows, media_type)
+
+    if period is not None:
+        return encoded_response(encode((await period_reports([name], period))[name]), media_type)
+    # Report payloads only change with the dataset, they are encoded once per version and media type
+    return encoded_response(bookings_reports.get_encoded(name, media_type, encode), media_type)
 
 
 @router.get('/bookings',
             response_model=List[GetBookings],
             tags=['Main functionalities'],
-            description='Endpoint retrieves a list of all bookings in the dataset.')
-async def get_bookings(db: Session = Depends(get_db)) -> List[GetBookings]:
-    try:
-        # Checking the connection to the database
-        db.execute(text("SELECT 1"))
-    except OperationalError:
-        raise HTTPException(status_code=500, detail="Database connection error")
-
-    result = db.scalars(select(Bookings).limit(50)).all()
-    return [GetBookings(**r.__dict__) for r in result]
+            dependencies=[Depends(private_database_cache)],
+            description='Endpoint retrieves a list of all bookings in the dataset. ' + PAGINATION_DESCRIPTION)
+async def get_bookings(request: Request,
+                       cursor: int = Query(None, description=CURSOR_DESCRIPTION),
+                       limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE)) -> List[GetBookings]:
+    if wants_ndjson(request):
+        ensure_database_available()
+        return stream_query(queries.list_statement(cursor, queries.BOOKING_COLUMNS), limit)
+
+    media_type = negotiate(request)
+    limit = limit or 50
+    result = await query_db(queries.list_bookings, limit + 1, cursor)
+    result, headers = next_page(result, limit, lambda r: r['id'])
+    return rows_response(result, headers, media_type)
 
 
 @router.get('/bookings/search',
             response_model=List[GetBookings],
             tags=['Main functionalities'],
+            dependencies=[Depends(private_database_cache)],
             description='Endpoint allows searching for bookings based on various parameters such as guest name, booking'
-                        ' dates, length of stay.')
-async def search_bookings(guest_name: str = Query(None),
+                        ' dates, length of stay. ' + PAGINATION_DESCRIPTION)
+async def search_bookings(request: Request,
+                          guest_name: str = Query(None),
                           booking_date: str = Query(None),
                           length_of_stay: int = Query(None),
-                          db: Session = Depends(get_db)) -> List[GetBookings]:
+                          cursor: int = Query(None, description=CURSOR_DESCRIPTION),
+                          limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE)) -> List[GetBookings]:
     if guest_name:
         if not guest_name.replace(" ", "").isalpha():
             raise HTTPException(status_code=400, detail='Guest name must contain only letters')
@@ -64,346 +144,324 @@ async def search_bookings(guest_name: str = Query(None),
     if length_of_stay is not None and length_of_stay <= 0:
         raise HTTPException(status_code=400, detail='Length of stay cannot be less then 1')
 
-    try:
-        # Checking the connection to the database
-        db.execute(text("SELECT 1"))
-    except OperationalError:
-        raise HTTPException(status_code=500, detail="Database connection error")
-
-    query = db.query(Bookings)
-
-    if guest_name or booking_date or length_of_stay:
-        if guest_name:
-            query = query.filter(Bookings.guest_name.contains(guest_name))
-
-        if booking_date:
-            query = query.filter(Bookings.booking_date == booking_date)
-
-        if length_of_stay:
-            query = query.filter(Bookings.length_of_stay == length_of_stay)
-    else:
+    if not (guest_name or booking_date or length_of_stay):
         raise HTTPException(status_code=400, detail="Nothing was found. Specify the search criteria.")
 
-    bookings = query.limit(50).all()
+    if wants_ndjson(request):
+        ensure_database_available()
+        return stream_query(queries.search_statement(guest_name, booking_date, length_of_stay, cursor,
+                                                     queries.BOOKING_COLUMNS), limit)
+
+    media_type = negotiate(request)
+    limit = limit or 50
+    bookings = await query_db(queries.search_bookings, guest_name, booking_date, length_of_stay, limit + 1, cursor)
 
     if not bookings:
         raise HTTPException(status_code=404, detail="Nothing was found according to the specified criteria.")
 
-    return [GetBookings(**b.__dict__) for b in bookings]
+    bookings, headers = next_page(bookings, limit, lambda b: b['id'])
+    return rows_response(bookings, headers, media_type)
+
+
+@router.post('/bookings/batch',
+             response_model=List[GetBookings],
+             tags=['Main functionalities'],
+             description='Endpoint retrieves the bookings of up to 1000 IDs at once. They are returned in the order of '
+                         'the request, IDs without a booking are left out. ' + FORMATS_DESCRIPTION)
+async def batch_bookings(request: Request, body: BookingIds) -> List[GetBookings]:
+    media_type = negotiate(request)
+    result = await query_db(queries.get_bookings_by_ids, list(dict.fromkeys(body.ids)))
+    return rows_response(result, media_type=media_type)
+
+
+@router.post('/bookings',
+             response_model=List[GetBookings],
+             status_code=201,
+             tags=['Main functionalities'],
+             dependencies=[Depends(verify_credentials)],
+             description='Endpoint adds a booking, or a list of up to 1000, with the fields of a line of the dataset '
+                         'file. The new bookings get the ids after the last one and are returned as stored. '
+                         'Aggregations of this server process include them right away, its reports once recomputed '
+                         'in the background and other processes within FACTS_CHECK_INTERVAL seconds. '
+                         + FORMATS_DESCRIPTION)
+async def add_bookings(request: Request, body: Union[NewBooking, NewBookings] = Body()) -> List[GetBookings]:
+    media_type = negotiate(request)
+    bookings = body if isinstance(body, list) else [body]
+    ids = await query_db(ingest.append_bookings, [booking.model_dump() for booking in bookings])
+    # The analytics look for the new bookings on their next use instead of after the check interval
+    analytics_source.invalidate()
+    bookings_facts.invalidate()
+    response = rows_response(await query_db(queries.get_bookings_by_ids, ids), media_type=media_type)
+    response.status_code = 201
+    return response
+
+
+@router.get('/bookings/reports',
+            response_model=dict[str, list[dict]],
+            tags=['Main functionalities'],
+            dependencies=[Depends(private_report_cache)],
+            description='Endpoint returns several reports in one response, keyed by name, e.g. '
+                        '`name=stats,analysis,total_revenue`. The names are the paths of the report endpoints; the '
+                        'reports of endpoints that need credentials need them here too. All reports are computed '
+                        'together in one pass over the dataset.')
+async def multiple_reports(request: Request,
+                           name: List[str] = Query(description='Comma-separated report names'),
+                           credentials: Optional[HTTPBasicCredentials] = Depends(optional_security),
+                           period: Optional[tuple] = Depends(report_period)) -> Response:
+    names = list(dict.fromkeys(part.strip() for value in name for part in value.split(',') if part.strip()))
+    unknown = [report for report in names if report not in REPORT_MODELS]
+    if unknown or not names:
+        raise HTTPException(status_code=400, detail=f'Unknown reports: {", ".join(unknown) or "none given"}, '
+                                                    f'expected any of {", ".join(REPORT_MODELS)}')
+    if PRIVATE_REPORTS.intersection(names):
+        if credentials is None:
+            raise HTTPException(status_code=401, detail="Incorrect login or password.")
+        verify_credentials(credentials)
+
+    if period is not None:
+        reports = await period_reports(names, period)
+        parts = [dumps(report) + b':' + report_encoder(REPORT_MODELS[report])(reports[report]) for report in names]
+    else:
+        # The encoded payload of every report is shared with its own endpoint, the response only joins them
+        parts = [dumps(report) + b':' + bookings_reports.get_encoded(report, JSON,
+                                                                     report_encoder(REPORT_MODELS[report]))
+                 for report in names]
+    return encoded_response(b'{' + b','.join(parts) + b'}', JSON)
 
 
 @router.get('/bookings/stats',
             response_model=list[GetStats],
             tags=['Main functionalities'],
+            dependencies=[Depends(report_cache)],
             description='Endpoint provides statistical information about the dataset, such as the total number of'
                         ' bookings, average length of stay, average daily rate, etc.')
-async def stats_bookings(df: DataFrame = Depends(read_csv_bookings)) -> list[GetStats]:
-    total_number_of_bookings = len(df)
-
-    df['length_of_stay'] = df['stays_in_weekend_nights'].astype(int) + df['stays_in_week_nights'].astype(int)
-    sum_length_of_stay = df['length_of_stay'].sum()
-
-    sum_daily_rate = df['adr'].sum()
-
-    average_length_of_stay = sum_length_of_stay / total_number_of_bookings
-    average_daily_rate = sum_daily_rate / total_number_of_bookings
-
-    number_of_cancelled_bookings = df['is_canceled'].sum() / 1
-    number_of_non_cancelled_bookings = int(len(df) - number_of_cancelled_bookings)
-
-    the_most_popular_market_segment = df['market_segment'].value_counts().index[0]
-
-    return [
-        GetStats(total_number_of_bookings=total_number_of_bookings,
-                 average_length_of_stay=average_length_of_stay.__round__(2),
-                 average_daily_rate=average_daily_rate.__round__(2),
-                 number_of_cancelled_bookings=number_of_cancelled_bookings,
-                 number_of_non_cancelled_bookings=number_of_non_cancelled_bookings,
-                 the_most_popular_market_segment=the_most_popular_market_segment)
-    ]
+async def stats_bookings(request: Request,
+                         period: Optional[tuple] = Depends(report_period)) -> list[GetStats]:
+    return await report_response(request, 'stats', GetStats, period)
 
 
 @router.get('/bookings/analysis',
             response_model=List[GetAnalysis],
             tags=['Main functionalities'],
+            dependencies=[Depends(report_cache)],
             description='Endpoint performs advanced analysis on the dataset, generating insights and trends based on speci'
                         'fic criteria, such as booking trends by month, guest demographics, popular meal packages, etc.')
-async def analysis_bookings(df: DataFrame = Depends(read_csv_bookings)) -> List[GetAnalysis]:
-    most_popular_arrive_month = df['arrival_date_month'].value_counts().index[0]
-    least_popular_arrive_month = df['arrival_date_month'].value_counts().index[11]
-
-    df['arrive_date'] = pd.to_datetime(df['arrival_date_year'].astype(str) + '-' + df['arrival_date_month'] + '-' + df[
-        'arrival_date_day_of_month'].astype(str))
-    df['booking_date_month'] = (df['arrive_date'] - pd.to_timedelta(df['lead_time'], unit='D')).dt.month_name()
-    most_popular_booking_month = df['booking_date_month'].value_counts().index[0]
-    least_popular_booking_month = df['booking_date_month'].value_counts().index[11]
-
-    all_guest_without_children = len(df[(df['is_canceled'] == 0) & (df['babies'] == 0) & (df['children'] == 0.0)])
-    all_guest_with_children_or_babyes = len(
-        df[(df['is_canceled'] == 0) & ((df['babies'] > 0) | (df['children'] > 0.0))])
-    lonely_guest = len(
-        df[(df['is_canceled'] == 0) & (df['adults'] == 1) & (df['babies'] == 0) & (df['children'] == 0.0)])
-    couple_without_children_and_babyes = len(
-        df[(df['is_canceled'] == 0) & (df['adults'] == 2) & (df['babies'] == 0) & (df['children'] == 0.0)])
-
-    df['revenue'] = (df['stays_in_weekend_nights'] + df['stays_in_week_nights']) * df['adr']
-    percentage_of_people_with_a_parking_space = (
-            len(df[df['required_car_parking_spaces'] > 0]) / len(df) * 100).__round__(2)
-    countries_by_order = df['country'].value_counts().head().to_dict()
-    meal_packages = df['meal'].value_counts().to_dict()
-    return [
-        GetAnalysis(most_popular_arrive_month=most_popular_arrive_month,
-                    least_popular_arrive_month=least_popular_arrive_month,
-                    most_popular_booking_month=most_popular_booking_month,
-                    least_popular_booking_month=least_popular_booking_month,
-                    all_guest_without_children=all_guest_without_children,
-                    all_guest_with_children_or_babyes=all_guest_with_children_or_babyes,
-                    couple_without_children_and_babyes=couple_without_children_and_babyes,
-                    lonely_guest=lonely_guest,
-                    percentage_of_people_with_a_parking_space=percentage_of_people_with_a_parking_space,
-                    most_popular_countries_by_order=countries_by_order,
-                    meal_packages=meal_packages)
-    ]
+async def analysis_bookings(request: Request,
+                            period: Optional[tuple] = Depends(report_period)) -> List[GetAnalysis]:
+    return await report_response(request, 'analysis', GetAnalysis, period)
+
+
+@router.get('/bookings/aggregate',
+            response_model=List[dict[str, Optional[Union[int, float, str]]]],
+            tags=['Advanced functionalities'],
+            dependencies=[Depends(dataset_cache)],
+            description='Endpoint groups the bookings by the `group_by` columns and computes the requested metrics '
+                        'for every group, e.g. `group_by=hotel,booking_month&metric=sum:revenue&filter=is_canceled:0`. '
+                        'Metrics are `count` or `sum`, `mean`, `min`, `max` of a numeric column, named like '
+                        '`sum_revenue`. Filters are `column:value` pairs, all of them have to match and a column '
+                        'repeated matches any of its values. `sort` takes a group column or a metric name, prefixed '
+                        'with `-` for descending order. Results are cached per query and dataset version. '
+                        + FORMATS_DESCRIPTION)
+async def aggregate_bookings(request: Request,
+                             group_by: str = Query(None, description='Comma-separated columns'),
+                             metric: List[str] = Query(None, description='function:column, e.g. sum:revenue'),
+                             filter_by: List[str] = Query(None, alias='filter', description='column:value'),
+                             sort: str = Query(None),
+                             limit: int = Query(None, ge=1),
+                             period: Optional[tuple] = Depends(report_period)
+                             ) -> List[dict[str, Optional[Union[int, float, str]]]]:
+    try:
+        query = parse_query(group_by, metric, filter_by, sort, limit, period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    media_type = negotiate(request)
+    rows = bookings_aggregates.cached(query)
+    if rows is None:
+        # Uncached queries scan the frame or the table off the event loop, once for all identical requests
+        rows = await aggregate_flights.run(query, bookings_aggregates.get, query,
+                                           limit_key=(query.group_by, query.metrics))
+    return rows_response(rows, media_type=media_type)
+
+
+async def nationality_from_facts(request: Request, country: str, cursor: Optional[int], limit: Optional[int]):
+    # The SQL analytics backend answers from booking_facts, the frame is never loaded
+    if wants_ndjson(request):
+        ensure_database_available()
+        return stream_query(analytics.nationality_statement(country, cursor), limit)
+
+    media_type = negotiate(request)
+    limit = limit or 5
+    result = await query_db(analytics.nationality_bookings, country, limit + 1, cursor)
+    if not result:
+        raise HTTPException(status_code=404, detail="No bookings found for provided country")
+    result, headers = next_page(result, limit, lambda r: r[0])
+    return rows_response([row for _, row in result], headers, media_type)
 
 
 @router.get('/bookings/nationality',
             response_model=List[AllBookings],
             tags=['Advanced functionalities'],
+            dependencies=[Depends(private_dataset_cache)],
             description='Endpoint retrieves bookings based on the provided nationality. (Categories are represented in '
-                        'the ISO 3155–3:2013 format)')
-async def nationality_bookings(country: Annotated[str, Query(min_length=2, max_length=3)],
-                               df: DataFrame = Depends(read_csv_bookings)) -> List[AllBookings]:
-    df = df.fillna(value=0)
-
+                        'the ISO 3155–3:2013 format) ' + PAGINATION_DESCRIPTION)
+async def nationality_bookings(request: Request,
+                               country: Annotated[str, Query(min_length=2, max_length=3)],
+                               cursor: int = Query(None, description=CURSOR_DESCRIPTION),
+                               limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE)) -> List[AllBookings]:
     if country is None:
         raise HTTPException(status_code=400, detail="Country parameter is required")
 
     if not country.isalpha():
         raise HTTPException(status_code=400, detail="Country must contain only letters")
-    result = df[df['country'] == country.upper()].rename(columns={'phone-number': 'phone_number'}).head(5)
+
+    if ANALYTICS_BACKEND == 'sql':
+        return await nationality_from_facts(request, country.upper(), cursor, limit)
+
+    dataset = await read_bookings_dataset()
+    if wants_ndjson(request):
+        with phase('compute'):
+            matches = dataset.rows('country', country.upper(), cursor, limit)
+        return stream_frame(matches, lambda rows: all_bookings_rows(dataset.with_pii(rows)))
+
+    media_type = negotiate(request)
+    limit = limit or 5
+    with phase('compute'):
+        # A lookup in the country index, rows keep their position in the dataset as index, which is the booking id
+        result = dataset.rows('country', country.upper(), cursor, limit + 1)
     if result.empty:
         raise HTTPException(status_code=404, detail="No bookings found for provided country")
+    headers = {NEXT_CURSOR_HEADER: str(result.index[limit - 1])} if len(result) > limit else {}
+    result = result.head(limit)
 
-    return [
-        AllBookings(hotel=row.hotel,
-                    is_canceled=row.is_canceled,
-                    lead_time=row.lead_time,
-                    arrival_date_year=row.arrival_date_year,
-                    arrival_date_month=row.arrival_date_month,
-                    arrival_date_week_number=row.arrival_date_week_number,
-                    arrival_date_day_of_month=row.arrival_date_day_of_month,
-                    stays_in_weekend_nights=row.stays_in_weekend_nights,
-                    stays_in_week_nights=row.stays_in_week_nights,
-                    adults=row.adults, children=row.children, babies=row.babies, meal=row.meal, country=row.country,
-                    market_segment=row.market_segment, distribution_channel=row.distribution_channel,
-                    is_repeated_guest=row.is_repeated_guest, previous_cancellations=row.previous_cancellations,
-                    previous_bookings_not_canceled=row.previous_bookings_not_canceled,
-                    reserved_room_type=row.reserved_room_type, assigned_room_type=row.assigned_room_type,
-                    booking_changes=row.booking_changes, deposit_type=row.deposit_type, agent=row.agent,
-                    company=row.company, days_in_waiting_list=row.days_in_waiting_list, customer_type=row.customer_type,
-                    adr=row.adr, required_car_parking_spaces=row.required_car_parking_spaces,
-                    total_of_special_requests=row.total_of_special_requests, reservation_status=row.reservation_status,
-                    reservation_status_date=row.reservation_status_date, name=row.name, email=row.email,
-                    phone_number=row.phone_number, credit_card=row.credit_card)
-        for row in result.itertuples(index=False)
-    ]
+    # The personal columns are read on the first call, from the CSV or the snapshot
+    result = await run_in_threadpool(dataset.with_pii, result)
+    return frame_response(all_bookings_rows(result), headers, media_type)
 
 
 @router.get('/bookings/popular_meal_package',
             response_model=List[PopularMealPackage],
             tags=['Advanced functionalities'],
+            dependencies=[Depends(report_cache)],
             description='Endpoint retrieves the most popular meal package.')
-async def popular_meal_package_bookings(df: DataFrame = Depends(read_csv_bookings)) -> List[PopularMealPackage]:
-    result = df['meal'].value_counts().index[0]
-    return [
-        PopularMealPackage(the_most_popular_meal_package=result)
-    ]
+async def popular_meal_package_bookings(request: Request,
+                                        period: Optional[tuple] = Depends(report_period)) -> List[PopularMealPackage]:
+    return await report_response(request, 'popular_meal_package', PopularMealPackage, period)
 
 
 @router.get('/bookings/avg_length_of_stay',
             response_model=List[AvgLengthOfStay],
             tags=['Advanced functionalities'],
+            dependencies=[Depends(report_cache)],
             description='Endpoint retrieves the average length of stay for each combination of booking year and hotel type.')
-async def avg_length_of_stay_bookings(df: DataFrame = Depends(read_csv_bookings)) -> List[AvgLengthOfStay]:
-    df['avg_length_of_stay'] = df['stays_in_weekend_nights'] + df['stays_in_week_nights']
-    df['arrive_date'] = pd.to_datetime(df['arrival_date_year'].astype(str) + '-' + df['arrival_date_month'] + '-' + df[
-        'arrival_date_day_of_month'].astype(str))
-    df['booking_date_year'] = (df['arrive_date'] - pd.to_timedelta(df['lead_time'], unit='D')).dt.year
-    result = df[df['is_canceled'] == 0].groupby(['booking_date_year', 'hotel'])['avg_length_of_stay'].mean().round(
-        2).reset_index(name='avg_length_of_stay')
-    return [
-        AvgLengthOfStay(year=row.booking_date_year, hotel=row.hotel, avg_length_of_stay=row.avg_length_of_stay)
-        for row in result.itertuples(index=False)
-    ]
+async def avg_length_of_stay_bookings(request: Request,
+                                      period: Optional[tuple] = Depends(report_period)) -> List[AvgLengthOfStay]:
+    return await report_response(request, 'avg_length_of_stay', AvgLengthOfStay, period)
 
 
 @router.get('/bookings/total_revenue',
             response_model=List[TotalRevenue],
             tags=['Advanced functionalities'],
+            dependencies=[Depends(report_cache)],
             description='Endpoint retrieves the total revenue for each combination of booking month and hotel type.')
-async def total_revenue_bookings(df: DataFrame = Depends(read_csv_bookings)) -> List[TotalRevenue]:
-    df['revenue'] = (df['stays_in_weekend_nights'] + df['stays_in_week_nights']) * df['adr']
-    df['arrive_date'] = pd.to_datetime(df['arrival_date_year'].astype(str) + '-' + df['arrival_date_month'] + '-' + df[
-        'arrival_date_day_of_month'].astype(str))
-    df['booking_date_month'] = (df['arrive_date'] - pd.to_timedelta(df['lead_time'], unit='D')).dt.month_name()
-
-    month_order = ['January', 'February', 'March', 'April', 'May', 'June',
-                   'July', 'August', 'September', 'October', 'November', 'December']
-
-    df['booking_date_month'] = pd.Categorical(df['booking_date_month'], categories=month_order, ordered=True)
-
-    result = df[df['is_canceled'] == 0].groupby(['booking_date_month', 'hotel'], observed=True)[
-        'revenue'].sum().reset_index(name='total_revenue')
-
-    return [
-        TotalRevenue(month=row.booking_date_month, hotel=row.hotel, total_revenue=row.total_revenue)
-        for row in result.itertuples(index=False)
-    ]
+async def total_revenue_bookings(request: Request,
+                                 period: Optional[tuple] = Depends(report_period)) -> List[TotalRevenue]:
+    return await report_response(request, 'total_revenue', TotalRevenue, period)
 
 
 @router.get('/bookings/top_countries',
             response_model=List[Country],
             tags=['Advanced functionalities'],
+            dependencies=[Depends(report_cache)],
             description='Endpoint retrieves the top 5 countries with the most bookings.')
-async def top_countries_bookings(df: DataFrame = Depends(read_csv_bookings)) -> List[Country]:
-    result = df[df['is_canceled'] == 0]['country'].value_counts().head(5).reset_index(name='counts')
-    return [
-        Country(country=row.country, count_of_bookings=row.counts)
-        for row in result.itertuples(index=False)
-    ]
+async def top_countries_bookings(request: Request,
+                                 period: Optional[tuple] = Depends(report_period)) -> List[Country]:
+    return await report_response(request, 'top_countries', Country, period)
 
 
 @router.get('/bookings/repeated_guests_percentage',
             response_model=List[RepGuestPrecent],
             tags=['Advanced functionalities'],
+            dependencies=[Depends(report_cache)],
             description='Endpoint retrieves the percentage of repeated guests.')
-async def repeated_guests_percentage_bookings(df: DataFrame = Depends(read_csv_bookings)) -> List[RepGuestPrecent]:
-    result = (df['is_repeated_guest'].sum() / len(df) * 100).__round__(2)
-    return [
-        RepGuestPrecent(repeated_guests_percentage=result)
-    ]
+async def repeated_guests_percentage_bookings(request: Request,
+                                              period: Optional[tuple] = Depends(report_period)) -> List[RepGuestPrecent]:
+    return await report_response(request, 'repeated_guests_percentage', RepGuestPrecent, period)
 
 
 @router.get('/bookings/total_guests_by_year',
             response_model=List[TotalGuestByYear],
             tags=['Advanced functionalities'],
+            dependencies=[Depends(report_cache)],
             description='Endpoint retrieves the total number of guests by booking year.')
-async def total_guests_by_year_bookings(df: DataFrame = Depends(read_csv_bookings)) -> List[TotalGuestByYear]:
-    df['arrive_date'] = pd.to_datetime(df['arrival_date_year'].astype(str) + '-' + df['arrival_date_month'] + '-' + df[
-        'arrival_date_day_of_month'].astype(str))
-    df['booking_date_year'] = (df['arrive_date'] - pd.to_timedelta(df['lead_time'], unit='D')).dt.year
-    df['total_guest'] = df['adults'] + df['children'] + df['babies']
-    result = df[df['is_canceled'] == 0].groupby(['booking_date_year'])['total_guest'].sum().reset_index(
-        name='count_guests')
-    return [
-        TotalGuestByYear(year=row.booking_date_year, count_guests=row.count_guests)
-        for row in result.itertuples(index=False)
-    ]
+async def total_guests_by_year_bookings(request: Request,
+                                        period: Optional[tuple] = Depends(report_period)) -> List[TotalGuestByYear]:
+    return await report_response(request, 'total_guests_by_year', TotalGuestByYear, period)
 
 
 @router.get('/bookings/avg_daily_rate_resort',
             response_model=List[AvgDailyRateResort],
             tags=['Advanced functionalities'],
-            dependencies=[Depends(verify_credentials)],
+            dependencies=[Depends(verify_credentials), Depends(private_report_cache)],
             description='Endpoint retrieves the average daily rate by month for resort hotel bookings.')
-async def avg_daily_rate_resort_bookings(df: DataFrame = Depends(read_csv_bookings)) -> List[AvgDailyRateResort]:
-    df['arrive_date'] = pd.to_datetime(df['arrival_date_year'].astype(str) + '-' + df['arrival_date_month'] + '-' + df[
-        'arrival_date_day_of_month'].astype(str))
-    df['booking_date_month'] = (df['arrive_date'] - pd.to_timedelta(df['lead_time'], unit='D')).dt.month_name()
-    grouped = df[(df['hotel'] == 'Resort Hotel') & (df['is_canceled'] == 0)].groupby(['booking_date_month'])[
-        'adr'].mean().__round__(2)
-
-    month_order = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
-                   'November', 'December']
-    result = grouped.reindex(sorted(grouped.index, key=month_order.index)).reset_index(name='avg_daily')
-    return [
-        AvgDailyRateResort(month=row.booking_date_month, avg_daily=row.avg_daily)
-        for row in result.itertuples(index=False)
-    ]
+async def avg_daily_rate_resort_bookings(request: Request,
+                                         period: Optional[tuple] = Depends(report_period)) -> List[AvgDailyRateResort]:
+    return await report_response(request, 'avg_daily_rate_resort', AvgDailyRateResort, period)
 
 
 @router.get('/bookings/most_common_arrival_day_city',
             response_model=List[MostCommonArrivalDayCity],
             tags=['Advanced functionalities'],
-            dependencies=[Depends(verify_credentials)],
+            dependencies=[Depends(verify_credentials), Depends(private_report_cache)],
             description='Endpoint retrieves the most common arrival date day of the week for city hotel bookings.')
-async def most_common_arrival_day_city_bookings(df: DataFrame = Depends(read_csv_bookings)) -> List[
-    MostCommonArrivalDayCity]:
-    df['arrive_date'] = pd.to_datetime(df['arrival_date_year'].astype(str) + '-' + df['arrival_date_month'] + '-' + df[
-        'arrival_date_day_of_month'].astype(str))
-    df['most_common_arrival_day'] = to_datetime(df['arrive_date']).dt.day_name()
-    result = (df[(df['hotel'] == 'City Hotel') & (df['is_canceled'] == 0)][
-                  'most_common_arrival_day'].value_counts().sort_values(ascending=False).head(1)).reset_index(
-        name='counts')
-    return [
-        MostCommonArrivalDayCity(day_of_the_week=row.most_common_arrival_day, counts_of_arrivals=row.counts)
-        for row in result.itertuples(index=False)
-    ]
+async def most_common_arrival_day_city_bookings(request: Request,
+                                                period: Optional[tuple] = Depends(report_period)) -> List[MostCommonArrivalDayCity]:
+    return await report_response(request, 'most_common_arrival_day_city', MostCommonArrivalDayCity, period)
 
 
 @router.get('/bookings/count_by_hotel_meal',
             response_model=List[CountMeal],
             tags=['Advanced functionalities'],
-            dependencies=[Depends(verify_credentials)],
+            dependencies=[Depends(verify_credentials), Depends(private_report_cache)],
             description='Endpoint retrieves the count of bookings by hotel type and meal package.')
-async def count_by_hotel_meal_bookings(df: DataFrame = Depends(read_csv_bookings)) -> List[CountMeal]:
-    result = df[df['is_canceled'] == 0].groupby(['meal', 'hotel']).size().reset_index(name='counts_meal')
-    return [
-        CountMeal(hotel=row.hotel, meal=row.meal, counts=row.counts_meal)
-        for row in result.itertuples(index=False)
-    ]
+async def count_by_hotel_meal_bookings(request: Request,
+                                       period: Optional[tuple] = Depends(report_period)) -> List[CountMeal]:
+    return await report_response(request, 'count_by_hotel_meal', CountMeal, period)
 
 
 @router.get('/bookings/total_revenue_resort_by_country',
             response_model=List[TotalRevenueByCountry],
             tags=['Advanced functionalities'],
-            dependencies=[Depends(verify_credentials)],
+            dependencies=[Depends(verify_credentials), Depends(private_report_cache)],
             description='Endpoint retrieves the total revenue by country for resort hotel bookings.')
-async def total_revenue_resort_by_country_bookings(
-        df: DataFrame = Depends(read_csv_bookings)) -> List[TotalRevenueByCountry]:
-    df['revenue'] = (df['stays_in_weekend_nights'] + df['stays_in_week_nights']) * df['adr']
-    revenue = df[(df['is_canceled'] == 0) & (df['hotel'] == 'Resort Hotel')].groupby(['country'])['revenue'].sum()
-    result = revenue.sort_values(ascending=False).reset_index(name='total_revenue')
-    return [
-        TotalRevenueByCountry(country=row.country, total_revenue=row.total_revenue)
-        for row in result.itertuples(index=False)
-    ]
+async def total_revenue_resort_by_country_bookings(request: Request,
+                                                   period: Optional[tuple] = Depends(report_period)) -> List[TotalRevenueByCountry]:
+    return await report_response(request, 'total_revenue_resort_by_country', TotalRevenueByCountry, period)
 
 
 @router.get('/bookings/count_by_hotel_repeated_guest',
             response_model=List[RepeatGuest],
             tags=['Advanced functionalities'],
-            dependencies=[Depends(verify_credentials)],
+            dependencies=[Depends(verify_credentials), Depends(private_report_cache)],
             description='Endpoint retrieves the count of bookings grouped by hotel type and repeated guest status.'
                         ' Returns: The count of bookings by hotel type and repeated guest status.')
-async def count_by_hotel_repeated_guest_bookings(
-        df: DataFrame = Depends(read_csv_bookings)) -> List[RepeatGuest]:
-    repeat_guest = df[df['is_canceled'] == 0].groupby(['hotel', 'is_repeated_guest']).size().reset_index(
-        name='counts')
-    return [
-        RepeatGuest(hotel=row.hotel, is_repeat=row.is_repeated_guest, count_guests=row.counts)
-        for row in repeat_guest.itertuples(index=False)
-    ]
+async def count_by_hotel_repeated_guest_bookings(request: Request,
+                                                 period: Optional[tuple] = Depends(report_period)) -> List[RepeatGuest]:
+    return await report_response(request, 'count_by_hotel_repeated_guest', RepeatGuest, period)
 
 
 @router.get('/bookings/{booking_id}',
             response_model=List[GetBookings],
             tags=['Main functionalities'],
+            dependencies=[Depends(private_database_cache)],
             description='Endpoint retrieves details of a specific booking by its unique ID.')
-async def get_bookings_id(booking_id: int,
-                          db: Session = Depends(get_db)) -> List[GetBookings]:
+async def get_bookings_id(request: Request, booking_id: int) -> List[GetBookings]:
     if not isinstance(booking_id, int):
         raise HTTPException(status_code=400, detail="booking_id must be an integer")
 
-    try:
-        # Checking the connection to the database
-        db.execute(text("SELECT 1"))
-    except OperationalError:
-        raise HTTPException(status_code=500, detail="Database connection error")
-
-    result = db.scalars(select(Bookings).where(Bookings.id == booking_id)).first()
+    media_type = negotiate(request)
+    result = await query_db(queries.get_booking, booking_id)
 
     if not result:
         raise HTTPException(status_code=404, detail="Booking not found")
 
-    return [GetBookings(**result.__dict__)]
+    return rows_response([result], media_type=media_type)
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from dataset.warmup import WARMING, data_warmup
+from db.health import CLOSED, database_breaker
+from endpoints.shemas import HealthStatus
+
+router = APIRouter()
+
+
+def health_status(status: str) -> HealthStatus:
+    last_probe = database_breaker.last_probe
+    return HealthStatus(status=status,
+                        database=database_breaker.state,
+                        last_probe=datetime.fromtimestamp(last_probe) if last_probe else None,
+                        data=data_warmup.state,
+                        data_error=data_warmup.error)
+
+
+@router.get('/health/live',
+            response_model=HealthStatus,
+            tags=['Health'],
+            description='Liveness probe: the process is up and serving requests.')
+async def liveness() -> HealthStatus:
+    return health_status('alive')
+
+
+@router.get('/health/ready',
+            response_model=HealthStatus,
+            tags=['Health'],
+            responses={503: {'model': HealthStatus}},
+            description='Readiness probe: answers 503 while the background database probe reports the database as down '
+                        'or the data is still being loaded after startup.')
+async def readiness():
+    if database_breaker.state != CLOSED or not data_warmup.ready:
+        status = 'warming' if data_warmup.state == WARMING else 'unavailable'
+        return JSONResponse(status_code=503, content=health_status(status).model_dump(mode='json'))
+    return health_status('ready')
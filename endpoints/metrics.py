@@ -0,0 +1,76 @@
+import os
+import random
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from monitoring.metrics import REQUEST_DURATION, RequestTimings, current_timings, render_metrics
+from monitoring.profiler import StackSampler
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+
+@router.get('/metrics',
+            response_class=PlainTextResponse,
+            tags=['Health'],
+            description='Request durations per route, their phases and the database statements they ran, as '
+                        'Prometheus histograms, and the counts of coalesced and refused analytics requests.')
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def _route(scope) -> str:
+    # The path template keeps the label values bounded, /bookings/{booking_id} instead of every id
+    endpoint, router = scope.get('endpoint'), scope.get('router')
+    if endpoint is not None and router is not None:
+        for route in router.routes:
+            if getattr(route, 'endpoint', None) is endpoint:
+                return route.path
+    return 'unmatched'
+
+
+class MetricsMiddleware:
+    def __init__(self, app, profile_rate: float = 0.0, profile_interval: float = 0.005, profile_dir: str = 'profiles'):
+        self.app = app
+        self.profile_rate = profile_rate
+        self.profile_interval = profile_interval
+        self.profile_dir = profile_dir
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        profiler = None
+        if self.profile_rate and random.random() < self.profile_rate:
+            profiler = StackSampler(self.profile_interval).start()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_timings.reset(token)
+            route = _route(scope)
+            REQUEST_DURATION.observe(elapsed, scope['method'], route, str(status))
+            timings.observe(route)
+            if profiler is not None:
+                profiler.stop()
+                self._write_profile(profiler, route, elapsed)
+
+    def _write_profile(self, profiler: StackSampler, route: str, elapsed: float):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = route.strip('/').replace('/', '_').replace('{', '').replace('}', '') or 'root'
+        profiler.write(os.path.join(self.profile_dir, f'{time.time():.6f}-{name}-{elapsed * 1000:.0f}ms.folded'))
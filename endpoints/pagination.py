@@ -0,0 +1,83 @@
+import json
+import threading
+import weakref
+from typing import Callable, Iterator, Optional
+
+import pandas as pd
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.exc import OperationalError
+
+from config import DB_STREAM_CONCURRENCY
+from db.database import StreamSession
+from db.health import database_breaker
+from endpoints.responses import ARROW, CSV, JSON, preferred
+
+NDJSON = 'application/x-ndjson'
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH = 1000
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+# One per connection of the stream pool: exports beyond that are refused instead of waiting for a connection
+_stream_slots = threading.BoundedSemaphore(DB_STREAM_CONCURRENCY)
+
+
+def wants_ndjson(request: Request) -> bool:
+    return preferred(request, (JSON, NDJSON, CSV, ARROW)) == NDJSON
+
+
+def next_page(rows: list, limit: int, cursor_of) -> tuple[list, dict]:
+    # Pages are fetched with one extra row, its presence means there is a next page
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, {NEXT_CURSOR_HEADER: str(cursor_of(rows[-1]))}
+    return rows, {}
+
+
+def _query_lines(statement: Select) -> Iterator[str]:
+    # Starlette pulls a sync iterator from a worker thread, the rows arrive in batches from the open cursor
+    try:
+        with StreamSession() as db:
+            result = db.execute(statement.execution_options(yield_per=STREAM_BATCH))
+            for partition in result.mappings().partitions():
+                yield ''.join(json.dumps(dict(row), default=str) + '\n' for row in partition)
+    except OperationalError:
+        database_breaker.record_failure()
+        raise
+    database_breaker.record_success()
+
+
+def _frame_lines(df: pd.DataFrame, prepare: Callable[[pd.DataFrame], pd.DataFrame]) -> Iterator[str]:
+    for start in range(0, len(df), STREAM_BATCH):
+        yield prepare(df.iloc[start:start + STREAM_BATCH]).to_json(orient='records', lines=True, double_precision=15)
+
+
+class _SlotLines:
+    # The lines of a query holding one of the stream slots: given back at the end of the stream or on an error,
+    # and once the iterator is collected when the client left before that
+    def __init__(self, statement: Select):
+        self._lines = _query_lines(statement)
+        self._release = weakref.finalize(self, _stream_slots.release)
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        try:
+            return next(self._lines)
+        except BaseException:
+            self._release()
+            raise
+
+
+def stream_query(statement: Select, limit: Optional[int] = None) -> StreamingResponse:
+    if not _stream_slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Too many exports running, retry later",
+                            headers={"Retry-After": "1"})
+    if limit is not None:
+        statement = statement.limit(limit)
+    return StreamingResponse(_SlotLines(statement), media_type=NDJSON)
+
+
+def stream_frame(df: pd.DataFrame, prepare: Callable[[pd.DataFrame], pd.DataFrame]) -> StreamingResponse:
+    return StreamingResponse(_frame_lines(df, prepare), media_type=NDJSON)
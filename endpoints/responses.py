@@ -0,0 +1,139 @@
+import importlib.util
+import json
+from datetime import date
+from functools import lru_cache
+from typing import Any, Iterable, Mapping, Optional
+
+import pandas as pd
+from fastapi import HTTPException, Request, Response
+from pydantic import TypeAdapter
+
+from monitoring.metrics import phase
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional, the standard library encoder is the fallback
+    orjson = None
+
+# pyarrow is optional, Arrow IPC is not offered without it. Only looked up here, importing it takes longer than
+# starting the rest of the app and is left to the first Arrow response.
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# List endpoints return these responses directly, so FastAPI skips building and validating a Pydantic model per row.
+# The response_model of the route still documents the schema, the rows must already have its field names and types.
+# The Accept header can ask for the same rows as CSV or as an Arrow IPC stream instead of JSON.
+
+JSON = 'application/json'
+CSV = 'text/csv'
+ARROW = 'application/vnd.apache.arrow.stream'
+
+
+def _default(value: Any):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONResponse(Response):
+    media_type = JSON
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def _media_ranges(accept: str) -> dict[str, float]:
+    qualities = {}
+    for item in accept.split(','):
+        media_range, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_range.strip().lower()] = quality
+    return qualities
+
+
+def _quality(qualities: dict[str, float], media_type: str) -> tuple[float, int]:
+    # The most specific range matching the type decides its quality
+    for specificity, media_range in ((2, media_type), (1, media_type.split('/')[0] + '/*'), (0, '*/*')):
+        if media_range in qualities:
+            return qualities[media_range], specificity
+    return 0.0, 0
+
+
+def preferred(request: Request, offered: tuple[str, ...]) -> Optional[str]:
+    # The highest quality wins, then a type named explicitly over one matched by a wildcard, then the first offered
+    qualities = _media_ranges(request.headers.get('accept') or '*/*')
+    quality, _, _, media_type = max((*_quality(qualities, media_type), -index, media_type)
+                                    for index, media_type in enumerate(offered))
+    return media_type if quality > 0 else None
+
+
+def negotiate(request: Request) -> str:
+    media_type = preferred(request, (JSON, CSV, ARROW) if HAS_PYARROW else (JSON, CSV))
+    if media_type is None and not HAS_PYARROW and preferred(request, (ARROW,)):
+        raise HTTPException(status_code=406, detail='Arrow IPC is not available on this server')
+    # Clients accepting none of them, e.g. asking for HTML only, still get JSON
+    return media_type or JSON
+
+
+def encode_frame(df: pd.DataFrame, media_type: str) -> bytes:
+    if media_type == CSV:
+        return df.to_csv(index=False).encode('utf-8')
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_rows(rows: Iterable[Mapping], media_type: str) -> bytes:
+    # Nested objects such as the counts of the analysis report become dotted columns
+    return encode_frame(pd.json_normalize([dict(row) for row in rows]), media_type)
+
+
+def encoded_response(content: bytes, media_type: str, headers: Optional[dict] = None) -> Response:
+    if media_type == JSON:
+        return FastJSONResponse(content, headers=headers)
+    return Response(content, media_type=media_type, headers=headers)
+
+
+def rows_response(rows: Iterable[Mapping], headers: Optional[dict] = None, media_type: str = JSON) -> Response:
+    with phase('serialize'):
+        if media_type != JSON:
+            return encoded_response(encode_rows(rows, media_type), media_type, headers)
+        return FastJSONResponse([dict(row) for row in rows], headers=headers)
+
+
+def frame_response(df: pd.DataFrame, headers: Optional[dict] = None, media_type: str = JSON) -> Response:
+    with phase('serialize'):
+        if media_type != JSON:
+            return encoded_response(encode_frame(df, media_type), media_type, headers)
+        # pandas encodes whole columns in C without going through Python objects per cell
+        return FastJSONResponse(df.to_json(orient='records', date_format='iso', double_precision=15).encode('utf-8'),
+                                headers=headers)
+
+
+@lru_cache
+def _adapter(model: type) -> TypeAdapter:
+    return TypeAdapter(list[model])
+
+
+def model_encoder(model: type):
+    # Small payloads such as the reports still go through their model once, for the exact same output as FastAPI
+    adapter = _adapter(model)
+    return lambda rows: adapter.dump_json(adapter.validate_python(rows))
@@ -1,7 +1,9 @@
-from datetime import date
-from typing import Optional
+from datetime import date, datetime
+from typing import Annotated, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
+
+from dataset.enrich import MONTH_NAMES
 
 
 class GetBookings(BaseModel):
@@ -12,6 +14,21 @@ class GetBookings(BaseModel):
     daily_rate: float
 
 
+MAX_BATCH_SIZE = 1000
+
+
+class BookingIds(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class HealthStatus(BaseModel):
+    status: str
+    database: str
+    last_probe: Optional[datetime]
+    data: str
+    data_error: Optional[str] = None
+
+
 class GetStats(BaseModel):
     total_number_of_bookings: int
     average_length_of_stay: float
@@ -129,3 +146,16 @@ class AllBookings(BaseModel):
     email: str
     phone_number: str
     credit_card: str
+
+
+class NewBooking(AllBookings):
+    # A line of the dataset file, the derived fields are computed from it
+    @field_validator('arrival_date_month')
+    @classmethod
+    def month_name(cls, value: str) -> str:
+        if value not in MONTH_NAMES:
+            raise ValueError(f'expected a month name, one of {", ".join(MONTH_NAMES)}')
+        return value
+
+
+NewBookings = Annotated[list[NewBooking], Field(min_length=1, max_length=MAX_BATCH_SIZE)]
@@ -1,23 +1,92 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 import uvicorn
 
 from fastapi import FastAPI
 
 from config import *
 from db import database, models
-from endpoints.endpoints import router
-from endpoints.depends import create_db_data
+from db.health import probe_database
+from db.ingest import ingest_csv
+from db.search import create_search_indexes
+from dataset.cache import bookings_dataset
+from dataset.materialized import analytics_workers, bookings_reports
+from dataset.warmup import data_warmup
+from endpoints import health, metrics
+from endpoints.caching import CacheHeadersMiddleware
+from endpoints.compression import CompressionMiddleware
+from endpoints.metrics import MetricsMiddleware
+from endpoints.endpoints import REPORT_MODELS, report_encoder, router
+from endpoints.responses import JSON
+from monitoring.metrics import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+_database_prepared = False
+
+
+def prepare_database():
+    # Tables and search indexes of a new database, once per process tree (serve.py runs it before forking)
+    global _database_prepared
+    if _database_prepared:
+        return
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as connection:
+        create_search_indexes(connection)
+    _database_prepared = True
+
+
+def warm_data(reports: bool = True):
+    # New or changed CSV rows into the database, then the dataset and the encoded reports into memory
+    logger.info('Ingested %s: %s', DATASET_PATH, ingest_csv(DATASET_PATH))
+    if ANALYTICS_BACKEND != 'sql' and analytics_workers is None:
+        bookings_dataset.get()
+    if reports:
+        bookings_reports.refresh()
+        for name, model in REPORT_MODELS.items():
+            bookings_reports.get_encoded(name, JSON, report_encoder(model))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    prepare_database()
+    # The database is probed in the background instead of on every request
+    probe = asyncio.create_task(probe_database())
+    if analytics_workers is not None:
+        # The workers load the dataset while the server already answers
+        analytics_workers.start()
+    if not data_warmup.started:
+        # So does this process: the lookups are served from the database right away, the analytics once
+        # /health/ready says so (before that they load the data themselves)
+        data_warmup.start(warm_data)
+    yield
+    probe.cancel()
+    if analytics_workers is not None:
+        analytics_workers.shutdown()
+
 
 # Set up the FastAPI application
 app = FastAPI(
     title="Bookings App",
     description=API_DESCRIPTION,
-    version=API_VERSION
+    version=API_VERSION,
+    lifespan=lifespan
 )
+app.add_middleware(CacheHeadersMiddleware)
+# Middleware added later runs outside, compression sees the responses with all their headers
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+# The request duration includes compression
+app.add_middleware(MetricsMiddleware, profile_rate=PROFILE_SAMPLE_RATE, profile_interval=PROFILE_INTERVAL,
+                   profile_dir=PROFILE_DIR)
 app.include_router(router=router)
+app.include_router(router=health.router)
+app.include_router(router=metrics.router)
 
-models.Base.metadata.create_all(bind=database.engine)
+instrument_engine(database.engine)
+instrument_engine(database.stream_engine)
 
 # Run the FastAPI aplication
 if __name__ == '__main__':
-    create_db_data()
     uvicorn.run("main:app", host=SERVER_HOST, port=SERVER_PORT, reload=True)
@@ -0,0 +1,155 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request metrics in the Prometheus text format. Code on the way of a request marks its phases with phase(), the
+# durations add up in the RequestTimings of the current request, which the middleware in endpoints.metrics observes
+# once the response is sent. Work in other threads is attributed as long as it runs in a copy of the request's
+# context (run_in_threadpool and db.database.run_in_db do that); background refreshes are not attributed at all.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...], buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # Per label values: the count of each bucket (not cumulative), then the sum
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(label_values, list(counts), total) for label_values, (counts, total) in self._series.items()]
+        for label_values, counts, total in sorted(series):
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            prefix = f'{labels},' if labels else ''
+            cumulative = 0
+            for bound, count in zip([*self.buckets, '+Inf'], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Time from receiving a request to sending the response',
+                             ('method', 'route', 'status'))
+PHASE_DURATION = Histogram('http_request_phase_seconds',
+                           'Time a request spent in a phase: dataset (loading the frame), compute (pandas or SQL '
+                           'aggregation), serialize (building models and encoding), db (ORM and analytics queries)',
+                           ('route', 'phase'))
+DB_QUERY_DURATION = Histogram('db_query_duration_seconds', 'Duration of single database statements', ('route',))
+DB_QUERIES = Histogram('db_queries_per_request', 'Database statements executed per request', ('route',),
+                       buckets=COUNT_BUCKETS)
+COALESCED_REQUESTS = Counter('coalesced_requests_total',
+                             'Requests that waited for an identical computation already in flight', ('group',))
+SHED_REQUESTS = Counter('shed_requests_total', 'Requests refused with 503 because the computation queue was full',
+                        ('group',))
+METRICS = (REQUEST_DURATION, PHASE_DURATION, DB_QUERY_DURATION, DB_QUERIES, COALESCED_REQUESTS, SHED_REQUESTS)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+        self.queries: list[float] = []
+        self._lock = threading.Lock()
+
+    def add(self, phase_name: str, seconds: float):
+        # Several threads of one request can finish a phase at the same time
+        with self._lock:
+            self.phases[phase_name] = self.phases.get(phase_name, 0.0) + seconds
+
+    def add_query(self, seconds: float):
+        with self._lock:
+            self.queries.append(seconds)
+            self.phases['db'] = self.phases.get('db', 0.0) + seconds
+
+    def observe(self, route: str):
+        for phase_name, seconds in self.phases.items():
+            PHASE_DURATION.observe(seconds, route, phase_name)
+        for seconds in self.queries:
+            DB_QUERY_DURATION.observe(seconds, route)
+        DB_QUERIES.observe(len(self.queries), route)
+
+
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar('current_timings', default=None)
+
+
+@contextmanager
+def phase(name: str):
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def render_metrics() -> str:
+    return '\n'.join(line for metric in METRICS for line in metric.render()) + '\n'
+
+
+def instrument_engine(engine: Engine):
+    # Statement timings from the engine events. Statements outside of a request, such as the health probe,
+    # are counted under an empty route.
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        timings = current_timings.get()
+        if timings is None:
+            DB_QUERY_DURATION.observe(elapsed, '')
+        else:
+            timings.add_query(elapsed)
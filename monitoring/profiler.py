@@ -0,0 +1,46 @@
+import os
+import sys
+import threading
+from collections import Counter
+
+# Sampling profiler for single requests: a thread of its own records the stacks of all other threads every interval
+# seconds, so work the request hands to the thread pools is seen as well, next to that of concurrent requests.
+# The output is in the folded format flamegraph.pl and speedscope read. C code holding the GIL (pandas, the JSON
+# encoders) delays the samples, its share is undercounted.
+
+# Threads waiting for work are left out, their stacks end in one of these modules
+IDLE_MODULES = ('threading.py', 'selectors.py', 'queue.py', 'thread.py')
+
+
+class StackSampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self) -> 'StackSampler':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path: str):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
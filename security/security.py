@@ -8,6 +8,8 @@ from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from config import AUTH_LOGIN, AUTH_PASSWORD
 
 security = HTTPBasic()
+# For endpoints where only part of what can be asked for needs the credentials
+optional_security = HTTPBasic(auto_error=False)
 
 
 def verify_credentials(
@@ -0,0 +1,128 @@
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+from config import *
+
+# Production launch: a parent process ingests the CSV, loads and enriches the dataset, computes and encodes the
+# reports, then forks SERVER_WORKERS workers that accept on one shared socket. The workers inherit the warm caches
+# and share the frame's pages with the parent copy-on-write; gc.freeze() keeps the collector from touching (and so
+# copying) the objects made before the fork.
+#
+# kill -HUP <parent> reloads the data without dropping requests: the parent warms the new data and forks a new
+# generation of workers, the old ones then get SIGTERM, stop accepting and finish the requests they have.
+# Workers never reload on their own, they serve the data they were forked with.
+#
+# The parent starts no threads before forking (the analytics worker pool and the database probe start in the
+# workers' lifespan). Each worker keeps its own /metrics.
+
+SIGNALS = (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD)
+
+logger = logging.getLogger(__name__)
+
+
+def warm():
+    from db import database
+    from dataset.cache import bookings_dataset
+    from dataset.materialized import analytics_workers
+    from dataset.warmup import data_warmup
+    from main import prepare_database, warm_data
+
+    prepare_database()
+    # The analytics worker pool would start processes and threads here, it computes the reports in the workers
+    data_warmup.run(lambda: warm_data(reports=analytics_workers is None))
+    if ANALYTICS_BACKEND != 'sql':
+        # Loaded once here instead of once per worker on its first nationality request
+        _ = bookings_dataset.get().pii
+    # Connections must not be shared with the children
+    database.engine.dispose()
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(app, sock: socket.socket):
+    from db import database
+    from dataset.cache import bookings_dataset
+
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+    for signum in SIGNALS:
+        signal.signal(signum, signal.SIG_DFL)
+    database.engine.dispose(close=False)
+    bookings_dataset.pin()
+    server = uvicorn.Server(uvicorn.Config(app, lifespan='on', log_level='info'))
+    server.run(sockets=[sock])
+
+
+def spawn(app, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(app, sock)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def stop(workers: set[int], timeout: float):
+    for pid in workers:
+        os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + timeout
+    running = set(workers)
+    while running and time.monotonic() < deadline:
+        running = {pid for pid in running if not os.waitpid(pid, os.WNOHANG)[0]}
+        time.sleep(0.1)
+    for pid in running:
+        # Still busy after the grace period
+        logger.warning('Worker %s still busy after %s s, killing it', pid, timeout)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+
+def serve(workers_count: int = SERVER_WORKERS):
+    sock = socket.create_server((SERVER_HOST, SERVER_PORT), backlog=2048)
+    sock.set_inheritable(True)
+    # Signals wait for the loop below instead of interrupting it, the workers unblock them again
+    signal.pthread_sigmask(signal.SIG_BLOCK, SIGNALS)
+
+    from main import app
+
+    warm()
+    workers = {spawn(app, sock) for _ in range(workers_count)}
+    logger.info('Serving on %s:%s with %s workers, parent %s', SERVER_HOST, SERVER_PORT, workers_count, os.getpid())
+    while True:
+        info = signal.sigtimedwait(SIGNALS, 1.0)
+        # Replace workers that died, unless they are being stopped anyway
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            if pid in workers:
+                workers.discard(pid)
+                if info is None or info.si_signo == signal.SIGCHLD:
+                    workers.add(spawn(app, sock))
+
+        if info is None or info.si_signo == signal.SIGCHLD:
+            continue
+        if info.si_signo == signal.SIGHUP:
+            gc.unfreeze()
+            warm()
+            old, workers = workers, {spawn(app, sock) for _ in range(workers_count)}
+            stop(old, SERVER_GRACEFUL_TIMEOUT)
+            logger.info('Reloaded the data (dataset file %s), replaced %s workers', DATASET_PATH, len(old))
+        else:
+            stop(workers, SERVER_GRACEFUL_TIMEOUT)
+            return
+
+
+if __name__ == '__main__':
+    # The parent logs the same way as uvicorn in the workers
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:     %(message)s')
+    serve()
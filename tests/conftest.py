@@ -0,0 +1,40 @@
+import os
+import tempfile
+import time
+
+import pytest
+
+# The application reads its configuration at import: a small synthetic dataset and a database of its own,
+# set before anything from the repository is imported
+WORKDIR = tempfile.mkdtemp(prefix='bookings_tests_')
+CREDENTIALS = ('tests', 'tests')
+os.environ.update({'DB_URI': f"sqlite:///{os.path.join(WORKDIR, 'bookings.db')}",
+                   'DATASET_PATH': os.path.join(WORKDIR, 'bookings.csv'),
+                   'DATASET_SNAPSHOT': os.path.join(WORKDIR, 'bookings.snapshot'),
+                   'ANALYTICS_BACKEND': 'pandas', 'ANALYTICS_WORKERS': '0',
+                   'AUTH_LOGIN': CREDENTIALS[0], 'AUTH_PASSWORD': CREDENTIALS[1],
+                   'SERVER_HOST': '127.0.0.1', 'SERVER_PORT': '8000',
+                   'API_DESCRIPTION': 'tests', 'API_VERSION': 'tests'})
+
+from benchmarks.synthetic import write_bookings_csv  # noqa: E402
+
+write_bookings_csv(os.environ['DATASET_PATH'], 2000)
+
+
+@pytest.fixture(scope='session')
+def client():
+    from fastapi.testclient import TestClient
+
+    from dataset.warmup import WARMING, data_warmup
+    from main import app
+
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 60
+        while data_warmup.state == WARMING and time.monotonic() < deadline:
+            time.sleep(0.05)
+        yield client
+
+
+@pytest.fixture
+def auth() -> tuple[str, str]:
+    return CREDENTIALS
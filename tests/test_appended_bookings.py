@@ -0,0 +1,43 @@
+import json
+import time
+
+from benchmarks.synthetic import generate_bookings
+
+
+def new_booking() -> dict:
+    row = generate_bookings(1, seed=7).rename(columns={'phone-number': 'phone_number'})
+    return json.loads(row.to_json(orient='records'))[0]
+
+
+def wait_for(check, seconds: float = 30):
+    # Reports take in appended bookings once recomputed in the background
+    deadline = time.monotonic() + seconds
+    while not check() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return check()
+
+
+def total_bookings(client) -> int:
+    response = client.get('/bookings/stats')
+    assert response.status_code == 200
+    return response.json()[0]['total_number_of_bookings']
+
+
+def test_posted_booking_is_counted_by_the_pandas_reports(client, auth):
+    before = total_bookings(client)
+    booking = new_booking()
+
+    response = client.post('/bookings', json=booking, auth=auth)
+    assert response.status_code == 201
+    assert response.json()[0]['guest_name'] == booking['name']
+
+    assert wait_for(lambda: total_bookings(client) == before + 1)
+    count = client.get('/bookings/aggregate', params={'metric': 'count'}).json()[0]['count']
+    assert count == before + 1
+    countries = client.get('/bookings/top_countries')
+    assert countries.status_code == 200
+    assert countries.json()
+    # The bookings of the file come first, the appended one after the cursor of the last of them
+    nationality = client.get('/bookings/nationality', params={'country': booking['country'], 'cursor': before - 1})
+    assert nationality.status_code == 200
+    assert [row['name'] for row in nationality.json()] == [booking['name']]
@@ -0,0 +1,6 @@
+def test_personal_data_is_not_stored_by_shared_caches(client, auth):
+    for path in ('/bookings/nationality?country=PRT', '/bookings/0', '/bookings?limit=5'):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'].startswith('private'), path
+    assert client.get('/bookings/stats').headers['Cache-Control'].startswith('public')
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from endpoints.coalescing import SingleFlight
+
+
+def test_one_hot_key_leaves_slots_and_queue_to_the_others():
+    async def scenario():
+        flights = SingleFlight('test', concurrency=2, queue_size=8, key_concurrency=1, key_queue_size=2)
+        release = threading.Event()
+
+        def hot(period):
+            release.wait(5)
+            return period
+
+        # One computation of the hot key runs, two wait for its slot, the fourth is refused
+        hot_flights = [asyncio.ensure_future(flights.run(('hot', period), hot, period, limit_key='hot'))
+                       for period in range(3)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as refused:
+            await flights.run(('hot', 3), hot, 3, limit_key='hot')
+        assert refused.value.status_code == 503
+
+        # The hot key holds one slot of the group, other computations still run
+        assert await asyncio.wait_for(flights.run('cold', lambda: 'cold'), 1) == 'cold'
+
+        release.set()
+        assert await asyncio.gather(*hot_flights) == [0, 1, 2]
+        assert not flights._key_slots and not flights._key_flights and not flights._key_waiting
+
+    asyncio.run(scenario())
+
+
+def test_identical_requests_share_one_computation():
+    async def scenario():
+        flights = SingleFlight('test', concurrency=1, queue_size=1, key_concurrency=1, key_queue_size=1)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        assert await asyncio.gather(*[flights.run('report', compute) for _ in range(5)]) == [1] * 5
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+
+def test_a_burst_in_one_tick_is_held_to_the_limits():
+    async def burst(flights, requests):
+        release = threading.Event()
+
+        def compute(name):
+            release.wait(5)
+            return name
+
+        # None of the computations has started when the last requests arrive
+        results = [asyncio.ensure_future(flights.run(key, compute, key, limit_key=limit_key))
+                   for key, limit_key in requests]
+        await asyncio.sleep(0.05)
+        release.set()
+        outcomes = await asyncio.gather(*results, return_exceptions=True)
+        assert not flights._waiting and not flights._running and not flights._key_running
+        return [outcome.status_code if isinstance(outcome, HTTPException) else outcome for outcome in outcomes]
+
+    # One computation runs and two wait, of the group or of one limit key
+    group = SingleFlight('test', concurrency=1, queue_size=2, key_concurrency=1, key_queue_size=8)
+    assert asyncio.run(burst(group, [(name, None) for name in 'abcde'])) == ['a', 'b', 'c', 503, 503]
+    key = SingleFlight('test', concurrency=8, queue_size=8, key_concurrency=1, key_queue_size=2)
+    assert asyncio.run(burst(key, [(name, 'hot') for name in 'abcd'] + [('e', None)])) == ['a', 'b', 'c', 503, 'e']
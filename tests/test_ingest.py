@@ -0,0 +1,30 @@
+import os
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from benchmarks.synthetic import generate_bookings, write_bookings_csv
+from db.ingest import append_bookings, appended_bookings, ingest_csv
+from db.models import Bookings
+
+
+def test_ingesting_a_grown_file_keeps_the_appended_bookings(tmp_path):
+    csv_path = os.path.join(tmp_path, 'bookings.csv')
+    engine = create_engine(f"sqlite:///{os.path.join(tmp_path, 'bookings.db')}")
+    write_bookings_csv(csv_path, 200)
+    ingest_csv(csv_path, engine=engine)
+
+    booking = generate_bookings(1, seed=7).rename(columns={'phone-number': 'phone_number'}).iloc[0].to_dict()
+    booking['name'] = 'Posted Guest'
+    with Session(engine) as db:
+        [posted] = append_bookings(db, [booking])
+
+    # The file grows by rows that are not the posted booking
+    write_bookings_csv(csv_path, 300)
+    ingest_csv(csv_path, engine=engine)
+
+    with Session(engine) as db:
+        assert db.get(Bookings, posted).guest_name == 'Posted Guest'
+        assert db.query(Bookings).count() == 301
+    with engine.connect() as connection:
+        assert appended_bookings(connection, posted - 1)['name'].tolist() == ['Posted Guest']
@@ -0,0 +1,31 @@
+import gc
+
+import pytest
+from fastapi import HTTPException
+
+from config import DB_STREAM_CONCURRENCY
+from db import queries
+from endpoints import pagination
+
+NDJSON = {'Accept': pagination.NDJSON}
+
+
+def test_exports_give_their_connection_slot_back(client):
+    # More exports one after the other than the stream pool has connections
+    for _ in range(DB_STREAM_CONCURRENCY * 2):
+        response = client.get('/bookings', params={'limit': 10}, headers=NDJSON)
+        assert response.status_code == 200
+        assert len(response.text.splitlines()) == 10
+
+
+def test_exports_beyond_the_stream_pool_are_refused(client):
+    statement = queries.list_statement(None, queries.BOOKING_COLUMNS)
+    held = [pagination.stream_query(statement, 10) for _ in range(DB_STREAM_CONCURRENCY)]
+    with pytest.raises(HTTPException) as refused:
+        pagination.stream_query(statement, 10)
+    assert refused.value.status_code == 503
+
+    # Responses that were never sent give their slots back too
+    del held
+    gc.collect()
+    assert client.get('/bookings', params={'limit': 10}, headers=NDJSON).status_code == 200
@@ -0,0 +1,42 @@
+import time
+from dataclasses import dataclass
+
+from dataset.materialized import ReportStore
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    version: str
+
+    def aggregate(self, query) -> list[dict]:
+        return [{'version': self.version}]
+
+
+class Source:
+    # Like FactsSource: stale() only tells whether its own get() would take in a new version
+    def __init__(self):
+        self.version = 'a'
+        self._snapshot = Snapshot('a')
+
+    def get(self) -> Snapshot:
+        if self._snapshot.version != self.version:
+            self._snapshot = Snapshot(self.version)
+        return self._snapshot
+
+    def stale(self) -> bool:
+        return self._snapshot.version != self.version
+
+
+def test_refreshes_after_another_caller_took_in_the_new_version():
+    store = ReportStore(Source(), {'version': lambda run: run(None)})
+    assert store.get('version') == [{'version': 'a'}]
+
+    store.dataset.version = 'b'
+    # e.g. the aggregation cache or the HTTP validators
+    store.dataset.get()
+    assert not store.dataset.stale()
+
+    deadline = time.monotonic() + 5
+    while store.get('version') != [{'version': 'b'}] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.get('version') == [{'version': 'b'}]
@@ -0,0 +1,10 @@
+from dataset.reports import repeated_guests_percentage_report
+
+
+def test_repeated_guests_percentage_is_rounded_like_the_original_endpoint():
+    # 254 / 8000 * 100 is 3.175 in floating point: numpy rounds it to 3.18, round() to 3.17
+    def run(query) -> list[dict]:
+        assert query.metric_names == ['count', 'sum_is_repeated_guest']
+        return [{'count': 8000, 'sum_is_repeated_guest': 254}]
+
+    assert repeated_guests_percentage_report(run) == [{'repeated_guests_percentage': 3.18}]
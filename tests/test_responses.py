@@ -0,0 +1,32 @@
+import pytest
+from starlette.requests import Request
+
+from endpoints.pagination import NDJSON, wants_ndjson
+from endpoints.responses import CSV, JSON, negotiate
+
+
+def request(accept=None) -> Request:
+    headers = [] if accept is None else [(b'accept', accept.encode('latin-1'))]
+    return Request({'type': 'http', 'headers': headers})
+
+
+@pytest.mark.parametrize('accept, media_type', [
+    (None, JSON),
+    ('*/*', JSON),
+    ('text/html', JSON),
+    ('text/csv', CSV),
+    ('text/csv;q=0, application/json', JSON),
+    ('application/json;q=0.5, text/csv', CSV),
+    ('text/csv;charset=utf-8;q=0.9, application/json;q=0.8', CSV),
+    ('text/csv, */*;q=0.1', CSV),
+    ('text/*, */*;q=0.1', CSV),
+])
+def test_negotiate_picks_the_highest_quality(accept, media_type):
+    assert negotiate(request(accept)) == media_type
+
+
+def test_ndjson_only_when_preferred():
+    assert wants_ndjson(request(NDJSON))
+    assert not wants_ndjson(request(f'{NDJSON};q=0, application/json'))
+    assert not wants_ndjson(request(f'{NDJSON};q=0.5, application/json'))
+    assert not wants_ndjson(request())